@@ -2,20 +2,28 @@ from brainsoft_code_challenge.utils import load_environment
 
 load_environment()
 
+import asyncio  # noqa: E402
 import base64  # noqa: E402
+import contextlib  # noqa: E402
+import json  # noqa: E402
+import logging  # noqa: E402
 import os  # noqa: E402
 import tempfile  # noqa: E402
-from collections.abc import Mapping, Sequence  # noqa: E402
+import threading  # noqa: E402
+from collections.abc import AsyncIterator, Awaitable, Mapping, Sequence  # noqa: E402
+from dataclasses import dataclass  # noqa: E402
 from enum import Enum  # noqa: E402
-from typing import Any  # noqa: E402
+from typing import TYPE_CHECKING, Any  # noqa: E402
 
-from fastapi import FastAPI, HTTPException  # noqa: E402
-from langchain.agents import AgentExecutor  # noqa: E402
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage  # noqa: E402
+from fastapi import FastAPI, HTTPException, Request, Response  # noqa: E402
+from fastapi.concurrency import run_in_threadpool  # noqa: E402
+from fastapi.responses import StreamingResponse  # noqa: E402
 from pydantic import BaseModel  # noqa: E402
+from starlette.types import Receive, Scope, Send  # noqa: E402
 
-from brainsoft_code_challenge.agent import MemoryContextType, build_agent_input, get_agent_executor  # noqa: E402
+from brainsoft_code_challenge.agent import MemoryContextType, build_agent_input, create_memory, get_agent_executor  # noqa: E402
 from brainsoft_code_challenge.config import (  # noqa: E402
+    CLIENT_DISCONNECT_POLL_INTERVAL_SECONDS,
     DEFAULT_FREQUENCY_PENALTY,
     DEFAULT_MODEL,
     DEFAULT_PRESENCE_PENALTY,
@@ -30,11 +38,33 @@ from brainsoft_code_challenge.config import (  # noqa: E402
     MIN_TEMPERATURE,
     MIN_TOP_P,
     MODEL_CHOICES,
+    OVERLOADED_RETRY_AFTER_SECONDS,
 )
+from brainsoft_code_challenge.constants import WEB_SEARCH_RESULT_RUN_NAME  # noqa: E402
 from brainsoft_code_challenge.files import InputFile, UnsupportedFileTypeError, process_csv, read_pdf_file  # noqa: E402
+from brainsoft_code_challenge.http_clients import close_async_http_client  # noqa: E402
+from brainsoft_code_challenge.rate_limiting import AdmissionRejectedError, get_openai_rate_limiter  # noqa: E402
+from brainsoft_code_challenge.sessions import ConversationSession, InvalidSessionIdError, SessionBusyError, SessionStore  # noqa: E402
 from brainsoft_code_challenge.tokenizer import count_tokens, get_memory_token_limit  # noqa: E402
+from brainsoft_code_challenge.warmup import warm_up, warmup_state  # noqa: E402
+from brainsoft_code_challenge.web_cache import get_web_cache_stats  # noqa: E402
 
-app = FastAPI()
+if TYPE_CHECKING:
+    from langchain.agents import AgentExecutor
+    from langchain_core.memory import BaseMemory
+
+
+@contextlib.asynccontextmanager
+async def __lifespan(_: FastAPI) -> AsyncIterator[None]:
+    # The warm-up runs in the background, so that the server starts listening and reports its readiness at /ready
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+    session_store.spill_all()
+    await close_async_http_client()
+
+
+app = FastAPI(lifespan=__lifespan)
+session_store = SessionStore(create_memory)
 
 
 class InvalidInputError(ValueError):
@@ -66,6 +96,7 @@ class ChatRequestPayload(BaseModel):
     presence_penalty: float = DEFAULT_PRESENCE_PENALTY
     top_p: float = DEFAULT_TOP_P
     return_history: bool = False
+    session_id: str | None = None
 
     class Config:
         extra = "forbid"
@@ -155,17 +186,37 @@ def home() -> dict[str, str]:
     }
 
 
-def __get_history_from_agent_executor(agent_executor: AgentExecutor) -> list[dict[str, str]]:
+@app.get("/ready")
+def get_readiness(response: Response) -> dict[str, Any]:
+    """
+    Reports whether the warm-up has finished, with 503 until then (or if it failed), so that no traffic is routed to a cold process.
+    """
+    if not warmup_state.is_ready:
+        response.status_code = 503
+    return warmup_state.to_dict()
+
+
+@app.get("/cache-stats")
+def get_cache_stats() -> dict[str, Any]:
+    """
+    Reports the hit rates of the web search caches of this process, to tune their TTLs.
+    """
+    return get_web_cache_stats()
+
+
+def __get_history_from_memory(memory: "BaseMemory | None") -> list[dict[str, str]]:
     """
-    Retrieves the chat history from the agent executor. As ConversationSummaryBufferMemory does not support initialization with a
+    Retrieves the chat history from the memory. As ConversationSummaryBufferMemory does not support initialization with a
     system message, the (potential) system message would be converted to a regular human or AI message.
 
-    :param agent_executor: The agent executor holding the memory.
+    :param memory: The memory of the conversation.
     :return: The chat history.
     """
-    if agent_executor.memory is None:
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+    if memory is None:
         return []
-    memory_variables = agent_executor.memory.load_memory_variables({})
+    memory_variables = memory.load_memory_variables({})
     history = []
     summary = None
     for message in memory_variables["chat_history"]:
@@ -188,13 +239,99 @@ def __get_history_from_agent_executor(agent_executor: AgentExecutor) -> list[dic
     return history  # type: ignore
 
 
-@app.post("/chat")
-def get_chat_response(payload: ChatRequestPayload) -> dict[str, Any]:
+def __acquire_session(session_id: str, model: str) -> ConversationSession:
+    """
+    Gets the session and locks it for the current turn. The memory token limit is updated, as the model can change between turns.
+
+    :param session_id: The session id from the request payload.
+    :param model: The model of the current turn.
+    :return: The locked session, which must be released after the turn.
+    """
+    try:
+        session = session_store.acquire(session_id, model)
+    except InvalidSessionIdError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    except SessionBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    session.memory.max_token_limit = get_memory_token_limit(model)
+    return session
+
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str) -> dict[str, str]:
+    """
+    Deletes a server-side conversation session, both from memory and from disk.
+    """
+    try:
+        existed = session_store.delete(session_id)
+    except InvalidSessionIdError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    if not existed:
+        raise HTTPException(status_code=404, detail="The session does not exist.")
+    return {"session_id": session_id, "status": "deleted"}
+
+
+class ClientDisconnectedError(Exception):
+    pass
+
+
+@dataclass
+class ChatTurn:
+    """
+    A turn of the conversation, ready to be run by the agent executor. If the turn belongs to a session, the session is locked
+    until the turn is finished. The memory is detached from the agent executor, as the executor would save (and summarize) the
+    memory synchronously even when it is run asynchronously, which would block the event loop.
+    """
+
+    agent_executor: "AgentExecutor"
+    memory: "BaseMemory | None"
+    agent_input: dict[str, str]
+    input_was_cut_off: bool
+    return_history: bool
+    session: ConversationSession | None = None
+    is_released: bool = False
+
+    def get_inputs(self) -> dict[str, Any]:
+        if self.memory is None:
+            return dict(self.agent_input)
+        return {**self.agent_input, **self.memory.load_memory_variables(self.agent_input)}
+
+    async def save(self, output: str) -> None:
+        if self.memory is not None:
+            await self.memory.asave_context(self.agent_input, {"output": output})
+
+    def release(self) -> None:
+        if self.session is not None and not self.is_released:
+            self.is_released = True
+            self.session.lock.release()
+
+
+def __build_chat_response(turn: ChatTurn, output: str) -> dict[str, Any]:
+    response: dict[str, Any] = {"input": turn.agent_input["input"], "output": output}
+    if turn.session is not None:
+        response["session_id"] = turn.session.session_id
+    if turn.return_history:
+        response["history"] = __get_history_from_memory(turn.memory)
+    if turn.input_was_cut_off:
+        response["warning"] = "The input was too long and therefore was cut off."
+    return response
+
+
+def __get_overloaded_exception(error: AdmissionRejectedError) -> HTTPException:
+    """
+    Requests that the OpenAI rate limiter can't admit in time fail fast with 503, so that clients can retry (or back off).
+    """
+    return HTTPException(
+        status_code=503, detail=f"The server is overloaded, please retry later: {error}", headers={"Retry-After": str(OVERLOADED_RETRY_AFTER_SECONDS)}
+    )
+
+
+def __prepare_chat_turn(payload: ChatRequestPayload) -> ChatTurn:
     """
-    Get a response from the AI model using a POST request.
+    Validates the request payload and creates the agent executor with the memory of the conversation.
 
     :param payload: The request payload.
-    :return: API response.
+    :return: The chat turn, which must be released after it is run.
     """
     payload_dict = payload.model_dump()
     history = payload_dict["history"]
@@ -203,30 +340,163 @@ def get_chat_response(payload: ChatRequestPayload) -> dict[str, Any]:
 
     try:
         __validate_config(payload_dict)
+        if get_openai_rate_limiter(payload_dict["model"]).is_queue_full():
+            raise AdmissionRejectedError(f"Too many requests of {payload_dict['model']} are waiting for the rate limiter.")
+        if payload_dict["session_id"] is not None and history:
+            raise InvalidInputError("The history can't be passed together with a session id, as the session holds the history.")
         input_files = __read_attached_files(payload_dict["files"])
         contexts = __parse_history(history, payload_dict["model"])
     except InvalidInputError as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
+    except AdmissionRejectedError as e:
+        raise __get_overloaded_exception(e) from e
 
-    agent_executor = get_agent_executor(
-        payload_dict["model"],
-        payload_dict["temperature"],
-        payload_dict["frequency_penalty"],
-        payload_dict["presence_penalty"],
-        payload_dict["top_p"],
-        verbose=False,
-        memory_contexts=contexts,
-    )
-    agent_input, input_was_cut_off = build_agent_input(payload_dict["user_input"], input_files, payload_dict["model"])
+    session = None
+    if payload_dict["session_id"] is not None:
+        session = __acquire_session(payload_dict["session_id"], payload_dict["model"])
+    try:
+        agent_executor = get_agent_executor(
+            payload_dict["model"],
+            payload_dict["temperature"],
+            payload_dict["frequency_penalty"],
+            payload_dict["presence_penalty"],
+            payload_dict["top_p"],
+            verbose=False,
+            memory_contexts=contexts,
+            memory=session.memory if session is not None else None,
+            started_at=session.started_at if session is not None else None,
+        )
+        agent_input, input_was_cut_off = build_agent_input(payload_dict["user_input"], input_files, payload_dict["model"])
+    except BaseException:
+        if session is not None:
+            session.lock.release()
+        raise
+    memory, agent_executor.memory = agent_executor.memory, None
+    return ChatTurn(agent_executor, memory, agent_input, input_was_cut_off, payload_dict["return_history"], session)
+
+
+async def __run_until_disconnected(request: Request, awaitable: Awaitable[Any]) -> Any:
+    """
+    Awaits the awaitable, and cancels it if the client disconnects in the meantime (including the LLM and tool calls in flight),
+    so that no tokens are paid for a response nobody reads. Raises a ClientDisconnectedError in that case.
+
+    :param request: The request of the client.
+    :param awaitable: The awaitable to run, e.g. the agent executor invocation.
+    :return: The result of the awaitable.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=CLIENT_DISCONNECT_POLL_INTERVAL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnectedError
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.wait({task})
+
+
+@app.post("/chat")
+async def get_chat_response(payload: ChatRequestPayload, request: Request) -> dict[str, Any]:
+    """
+    Get a response from the AI model using a POST request. The agent runs on the event loop, so a request doesn't occupy a thread
+    while it waits for the LLM and the tools.
+
+    :param payload: The request payload.
+    :param request: The request, to detect a disconnected client.
+    :return: API response.
+    """
+    # Parsing the files and creating the agent executor are blocking, so they run in the threadpool
+    turn = await run_in_threadpool(__prepare_chat_turn, payload)
+    try:
+        try:
+            output = await __run_until_disconnected(request, turn.agent_executor.ainvoke(turn.get_inputs()))
+        except ClientDisconnectedError as e:
+            logging.info("The client disconnected, the agent response was cancelled")
+            raise HTTPException(status_code=499, detail="The client disconnected.") from e
+        except AdmissionRejectedError as e:
+            raise __get_overloaded_exception(e) from e
+        except Exception as e:
+            # In case of a public API, we should not expose the exception message
+            raise HTTPException(status_code=500, detail=f"An error occurred while obtaining the agent response: {e}") from e
+        await turn.save(output["output"])
+        return __build_chat_response(turn, output["output"])
+    finally:
+        turn.release()
+
+
+def __format_server_sent_event(event: str, data: Mapping[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def __stream_chat_events(turn: ChatTurn) -> AsyncIterator[str]:
+    """
+    Runs the agent and yields Server-Sent Events: "token" for each token of the response, "tool_start" and "tool_end" for each
+    tool call, "tool_progress" for each web search result as soon as it is summarized, and finally "final" with the same content
+    as the response of /chat (or "error"). The chat turn is released when the stream ends (or by the response if the stream never
+    starts). If the client disconnects, the stream is cancelled, including the LLM and tool calls in flight.
+
+    :param turn: The chat turn to run.
+    :return: The formatted events.
+    """
     try:
-        output = agent_executor.invoke(agent_input)
+        root_run_id = None
+        output = None
+        async for event in turn.agent_executor.astream_events(turn.get_inputs(), version="v1"):
+            if root_run_id is None:
+                root_run_id = event["run_id"]
+            if event["event"] == "on_chat_model_stream":
+                if content := event["data"]["chunk"].content:
+                    yield __format_server_sent_event("token", {"content": content})
+            elif event["event"] == "on_tool_start":
+                yield __format_server_sent_event("tool_start", {"tool": event["name"], "input": event["data"].get("input")})
+            elif event["event"] == "on_tool_end":
+                yield __format_server_sent_event("tool_end", {"tool": event["name"], "output": str(event["data"].get("output"))})
+            elif event["event"] == "on_chain_end" and event["name"] == WEB_SEARCH_RESULT_RUN_NAME:
+                yield __format_server_sent_event("tool_progress", {"tool": "search_google", "output": str(event["data"].get("output"))})
+            elif event["event"] == "on_chain_end" and event["run_id"] == root_run_id:
+                output = event["data"]["output"]["output"]
+        if output is None:
+            raise RuntimeError("The agent finished without an output.")
+        await turn.save(output)
+        yield __format_server_sent_event("final", __build_chat_response(turn, output))
+    except AdmissionRejectedError as e:
+        yield __format_server_sent_event("error", {"detail": f"The server is overloaded, please retry later: {e}", "status_code": 503})
     except Exception as e:
-        # In case of a public API, we should not expose the exception message
-        raise HTTPException(status_code=500, detail=f"An error occurred while obtaining the agent response: {e}") from e
+        logging.exception("An error occurred while streaming the agent response")
+        yield __format_server_sent_event("error", {"detail": f"An error occurred while obtaining the agent response: {e}"})
+    finally:
+        turn.release()
 
-    response = {"input": agent_input["input"], "output": output["output"]}
-    if payload_dict["return_history"]:
-        response["history"] = __get_history_from_agent_executor(agent_executor)
-    if input_was_cut_off:
-        response["warning"] = "The input was too long and therefore was cut off."
-    return response
+
+class _ChatTurnStreamingResponse(StreamingResponse):
+    """
+    Streams the events of a chat turn and releases the turn when the response ends. The event stream releases the turn as well,
+    but only once it has started, which it never does if the client disconnects before the first event is requested.
+    """
+
+    def __init__(self, turn: ChatTurn, content: AsyncIterator[str], **kwargs: Any) -> None:
+        super().__init__(content, **kwargs)
+        self.turn = turn
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.turn.release()
+
+
+@app.post("/chat/stream")
+async def stream_chat_response(payload: ChatRequestPayload) -> StreamingResponse:
+    """
+    Get a response from the AI model as a stream of Server-Sent Events, so that the tokens and the tool calls are shown as they
+    are generated. Invalid requests fail with the same status codes as /chat, before the stream starts.
+
+    :param payload: The request payload (the same as for /chat).
+    :return: The event stream.
+    """
+    turn = await run_in_threadpool(__prepare_chat_turn, payload)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # Proxies must not buffer the stream
+    return _ChatTurnStreamingResponse(turn, __stream_chat_events(turn), media_type="text/event-stream", headers=headers)
@@ -15,21 +15,108 @@ DEFAULT_PRESENCE_PENALTY = 0.0
 MIN_TOP_P = 0.0
 MAX_TOP_P = 1.0
 DEFAULT_TOP_P = 0.7
+AGENT_CACHE_MAX_ENTRIES = 32  # The agents (LLM client, tools and prompt) of this many most recently used model configurations are reused across requests
+SESSION_CACHE_MAX_ENTRIES = 256  # The API keeps the memories of this many most recently used sessions in memory, the rest are spilled to disk
+SESSION_TTL_SECONDS = 30 * 60  # Sessions idle for longer are spilled to disk
+SESSION_SPILL_DIR = "../sessions"  # Spilled sessions (messages and running summary as JSON)
+SESSION_SPILL_TTL_SECONDS = 7 * 24 * 60 * 60  # Spilled sessions idle for longer are deleted
+SESSION_SPILL_PURGE_INTERVAL_SECONDS = 10 * 60  # The directory of the spilled sessions is scanned for expired sessions at most this often
+CLIENT_DISCONNECT_POLL_INTERVAL_SECONDS = 0.5  # How often the API checks whether the client of a running request has disconnected
+
+# All outbound HTTP requests go through shared clients with keep-alive connection pools (HTTP/2 with the http2 extra of httpx)
+HTTP_MAX_CONNECTIONS = 100  # Maximum number of open connections of each httpx client
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20  # Maximum number of idle connections kept alive by each httpx client
+HTTP_KEEPALIVE_EXPIRY_SECONDS = 30.0  # Idle connections are closed after this time
+HTTP_TIMEOUT_SECONDS = 30.0  # Default timeout of the shared clients (OpenAI requests use the request_timeout of the model)
+DNS_CACHE_TTL_SECONDS: float | None = 300.0  # Resolved addresses are cached for this long by the shared clients (set to None to disable the cache)
+DNS_CACHE_MAX_ENTRIES = 1024  # Maximum number of cached DNS lookups
+
+VECTOR_STORE_BACKENDS = ("chromadb", "numpy")
+VECTOR_STORE_BACKEND = "chromadb"  # "chromadb" uses the HNSW index, "numpy" uses exact search over a memory-mapped snapshot
+CHROMADB_PATH = "../chromadb"
+EMBEDDING_BACKENDS = ("openai", "local", "hashing")
+EMBEDDING_BACKEND = "openai"  # "openai" calls the embedding API, "local" runs a sentence-transformers model from the EMBEDDING_MODEL directory on the CPU
+EMBEDDING_MODEL = "text-embedding-3-large"  # Model name for the "openai" backend, path to the model directory for the "local" backend
+EMBEDDING_DIMENSIONS: int | None = None  # text-embedding-3 embeddings can be shortened to this number of dimensions (None keeps all 3072)
+EMBEDDING_CACHE_PATH: str | None = "../embedding_cache.sqlite"  # Query embeddings are cached in this SQLite file (set to None to disable the cache)
+LOCAL_EMBEDDING_BATCH_SIZE = 32  # Number of texts in a single forward pass of the local embedding model
+LOCAL_EMBEDDING_MAX_WORKERS = 4  # Number of batches embedded concurrently by the local embedding model
+EMBEDDING_CACHE_MAX_ENTRIES = 5000  # Least recently used query embeddings are evicted above this number of entries
+NUMPY_INDEX_PATH = "../numpy_index.bin"
+PARENT_STORE_PATH = "../parent_store.sqlite"  # Whole document splits, which are referenced by the chunks in the vector indexes
+NUMPY_INDEX_DTYPE = "float16"  # Storage dtype of the embeddings in the NumPy snapshot ("float32", "float16" or "int8")
 
 CHROMADB_CHUNK_SIZE = 300  # Number of tokens in each chunk
 CHROMADB_CHUNK_OVERLAP = 75  # Number of tokens that each chunk overlaps with the previous one
+EMBEDDING_BATCH_SIZE = 100  # Number of chunks embedded in a single request when building the index
+EMBEDDING_MAX_CONCURRENT_REQUESTS = 4  # Number of embedding requests in flight when building the index
+EMBEDDING_REQUESTS_PER_MINUTE = 3000  # Request budget of the embedding API
+EMBEDDING_TOKENS_PER_MINUTE = 1000000  # Token budget of the embedding API
+EMBEDDING_MAX_RETRIES = 6  # Rate-limited embedding requests are retried this many times, with exponential backoff
+EMBEDDING_RETRY_BACKOFF_SECONDS = 1.0  # Backoff before the first retry of a rate-limited embedding request
+PIPELINE_QUEUE_SIZE = 8  # Maximum number of batches waiting between two stages of the index building pipeline
+PIPELINE_POLL_INTERVAL_SECONDS = 0.5  # Blocked pipeline stages check this often whether another stage has failed
 N_CHROMADB_RESULTS = 15  # This number of chunks is initially returned from ChromaDB (but the document splits may be duplicated)
-N_CHROMADB_UNIQUE_RESULTS = 3  # (Up to) this number of unique document splits is returned to the agent
+N_CHROMADB_UNIQUE_RESULTS = 3  # Number of unique document splits (k) compared in the retrieval evaluations, the agent gets as many as fit the token budget
+MAX_BATCH_SEARCH_QUERIES = 5  # Maximum number of queries in a single batched documentation search
+N_BATCH_SEARCH_UNIQUE_RESULTS = 6  # (Up to) this number of unique document splits is returned to the agent from a batched search
+N_PACKING_CANDIDATE_RESULTS = 6  # This number of unique document splits is ranked and packed into the token budget of a documentation search
+DOCUMENTATION_SEARCH_TOKEN_BUDGET = 2500  # Maximum number of tokens of a documentation search result (capped by the smallest model input limit)
+BATCH_DOCUMENTATION_SEARCH_TOKEN_BUDGET = 4000  # Maximum number of tokens of a batched documentation search result (capped likewise)
+MIN_PACKED_RESULT_TOKENS = 150  # No further document split is added to a search result if less than this number of tokens of the budget is left
+MMR_RELEVANCE_WEIGHT = 0.7  # Weight of the relevance (vs. the diversity) when ranking the document splits by maximal marginal relevance
+
+LEXICAL_INDEX_PATH = "../lexical_index.json"
+BM25_K1 = 1.5
+BM25_B = 0.75
+N_LEXICAL_RESULTS = 15  # This number of document splits is returned from the BM25 index to be fused with the vector search results
+LEXICAL_FAST_PATH_MAX_QUERY_WORDS = 4  # Only queries of up to this number of words can be answered by the BM25 index alone
+LEXICAL_FAST_PATH_MIN_SCORE = 3.0  # Minimum BM25 score of the best result for the query to be answered by the BM25 index alone (common identifiers score low)
+RRF_K = 60  # Constant of the reciprocal rank fusion of the vector search and BM25 results
 
 N_WEB_SEARCH_RESULTS = 3  # Number of web search results to return to the agent
 WEB_SEARCH_SCRAPING_TIMEOUT_SECONDS = 5  # Maximum time to wait for a web search result to be scraped
-WEB_SEARCH_SCRAPING_MAX_RESULT_LENGTH = 10000  # Web search results longer than this (in chars) are truncated
+WEB_SEARCH_DEADLINE_SECONDS = 15  # Overall time limit of an async web search; the summaries not ready by then are cancelled
+WEB_SEARCH_RESULTS_CACHE_TTL_SECONDS = 6 * 60 * 60  # Google search results are reused for this long (keyed by the normalized query)
+WEB_SEARCH_RESULTS_CACHE_MAX_ENTRIES = 1000
+WEB_PAGE_TEXT_CACHE_TTL_SECONDS = 60 * 60  # The text of scraped pages is reused for this long, then revalidated with ETag/Last-Modified
+WEB_PAGE_TEXT_CACHE_MAX_ENTRIES = 256
+WEB_SEARCH_SCRAPING_MAX_BYTES = 1024 * 1024  # The download of a web search result stops after this many bytes of the body
+WEB_SEARCH_PASSAGE_LENGTH_CHARS = 800  # The page text is split into passages of about this length, which are scored against the query with BM25
+WEB_SEARCH_SUMMARY_INPUT_TOKEN_BUDGET = 1500  # Only the best matching passages of a page up to this number of tokens are summarized
+WEB_SEARCH_EXTRACT_ANSWER_MAX_TOKENS = 300  # Extracts up to this length which contain all query terms are returned without an LLM summary
 WEB_SEARCH_MODEL = "gpt-3.5-turbo"
 WEB_SEARCH_SUMMARIZE_MAX_TOKENS = 1000  # Maximum number of tokens in the summary of a web search result
 WEB_SEARCH_TEMPERATURE = 0.7
 WEB_SEARCH_MODEL_KWARGS: Mapping[str, Any] = {}
 
+SCRAPING_CACHE_DIR = "../scraping_cache"  # Last listed repository tree and the downloaded files, unchanged files are not downloaded again
+SCRAPING_MAX_CONCURRENT_REQUESTS = 8  # Number of files downloaded concurrently when scraping the documentation
+
 SPLIT_DOCUMENTS_LONGER_THAN_N_CHARS = 8000  # Documentation pages longer than this value are not shown to the agent whole, but are split
 MIN_SPLIT_LENGTH_CHARS = 2000  # Minimum length of a document split (which is shown to the agent whole)
 
+IMPORT_TIME_BUDGETS_SECONDS: Mapping[str, float] = {  # Maximum import times of the entry points in a fresh interpreter (enforced by a test)
+    "brainsoft_code_challenge.agent": 0.5,
+    "shell_assistant": 1.0,
+    "api": 2.0,
+}
+
 CONVERSATION_SUMMARY_MODEL = "gpt-3.5-turbo"  # Model used for summarizing conversations if they exceed memory size
+
+# All OpenAI requests of a process go through a shared rate limiter per model, which admits them by priority
+OPENAI_RATE_LIMITS: Mapping[str, tuple[float, float]] = {  # Requests and tokens per minute of each model (the account's limits)
+    "gpt-3.5-turbo": (3500, 160000),
+    "gpt-4": (500, 10000),
+    "gpt-4-turbo-preview": (500, 30000),
+    EMBEDDING_MODEL: (EMBEDDING_REQUESTS_PER_MINUTE, EMBEDDING_TOKENS_PER_MINUTE),
+}
+DEFAULT_OPENAI_RATE_LIMIT = (500, 10000)  # Requests and tokens per minute of models missing above
+ADMISSION_QUEUE_MAX_SIZE = 256  # Requests waiting for the rate limiter of a model beyond this number are rejected (the API returns 503)
+ADMISSION_TIMEOUTS_SECONDS: Mapping[str, float | None] = {  # Requests that can't be admitted within the timeout of their priority are rejected
+    "interactive": 10.0,
+    "tool": 20.0,
+    "background": 30.0,  # Conversation summaries run on the request path, only offline index builds wait as long as needed
+}
+OVERLOADED_RETRY_AFTER_SECONDS = 5  # Retry-After of the 503 responses to requests rejected by the rate limiter
+COMPLETION_TOKENS_ESTIMATE = 500  # Completion tokens reserved in the token budget for chat requests without max_tokens
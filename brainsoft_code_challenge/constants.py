@@ -1,5 +1,6 @@
 ACTION_HINTS = {
     "search_documentation": "Query to documentation",
+    "search_documentation_batch": "Queries to documentation",
     "search_google": "Query to Google Search",
     "bearly_interpreter": "Request to code interpreter",
 }
@@ -12,7 +13,42 @@ CONTEXT_WINDOW_SIZE_IN_TOKENS_BY_MODEL = {
 
 TOOLS_AND_SYSTEM_PROMPT_LENGTH_TOKENS = 1000  # An upper bound estimate
 OUTPUT_TOKEN_LIMIT = 4096
+OMISSION_MARKER = "\n[...]\n"  # Separates the excerpts of a trimmed document split or web page
+SEARCH_RESULT_HEADER_LENGTH_TOKENS = 30  # An upper bound estimate of the URL line and separator of each documentation search result
+
+# Query words that don't need to appear in a web page extract for it to answer the query
+QUERY_STOPWORDS = {
+    "a",
+    "an",
+    "and",
+    "are",
+    "can",
+    "do",
+    "does",
+    "for",
+    "how",
+    "i",
+    "in",
+    "is",
+    "it",
+    "of",
+    "on",
+    "or",
+    "the",
+    "to",
+    "what",
+    "when",
+    "which",
+    "who",
+    "why",
+    "with",
+}
+WEB_SEARCH_SCRAPING_CHUNK_SIZE = 64 * 1024  # Bytes read at a time when streaming the body of a web search result
+WEB_SEARCH_RESULT_RUN_NAME = "web_search_result"  # Run name of the scraping and summarization of a single page, streamed as "tool_progress"
 
 PYTEST_USER_INPUT_ENV_VAR = "PYTEST_USER_INPUT"
 
+# Heavy modules that the entry points import only when the agent is first built (see tools/registry.py), not at startup
+LAZILY_IMPORTED_MODULES = ("langchain.agents", "langchain_community", "langchain_openai", "chromadb", "bs4")
+
 BEARLY_CODE_INTERPRETER_DESCRIPTION = """Evaluates Python code in a sandboxed environment. The environment resets on every execution. You must send the whole script every time and print your outputs. The script must be pure Python code that can be evaluated. It must be in Python format, NOT markdown. The code must NOT be wrapped in backticks. All common Python packages including requests, matplotlib, scipy, numpy, pandas, etc. are available, but the IBM Generative AI Python SDK Assistant is not available and can't be installed! Do not use features like plot.show() as you won't be able to see the output! Use print() to print any results so you can capture the output. If you get empty stdout in the response, add print() statements to your code and try again!"""  # noqa: E501
@@ -0,0 +1,143 @@
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from brainsoft_code_challenge.config import MIN_PACKED_RESULT_TOKENS, MMR_RELEVANCE_WEIGHT
+from brainsoft_code_challenge.constants import OMISSION_MARKER, SEARCH_RESULT_HEADER_LENGTH_TOKENS
+from brainsoft_code_challenge.parent_store import get_parent_key
+from brainsoft_code_challenge.tokenizer import count_tokens
+from brainsoft_code_challenge.vector_store import MetadataType
+
+
+@dataclass
+class ChunkHit:
+    """
+    A chunk returned by the vector search, with its inner product score against the query and its embedding.
+    """
+
+    metadata: MetadataType
+    score: float
+    embedding: Sequence[float] | None = None
+
+
+@dataclass
+class PackedDocument:
+    document: Mapping[str, Any]
+    content: str
+    n_tokens: int
+    is_trimmed: bool
+
+
+def get_mmr_order(query_embedding: Sequence[float], embeddings: Sequence[Sequence[float]], relevance_weight: float = MMR_RELEVANCE_WEIGHT) -> list[int]:
+    """
+    Orders the embeddings by maximal marginal relevance: each next embedding is the most relevant to the query, penalized
+    by its similarity to the already selected ones. The similarities are computed in a single matrix product.
+
+    :param query_embedding: The query embedding.
+    :param embeddings: The embeddings to order.
+    :param relevance_weight: The weight of the relevance (1 orders by relevance only).
+    :return: The indices of the embeddings in the MMR order.
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    relevance = matrix @ np.asarray(query_embedding, dtype=np.float32)
+    similarity = matrix @ matrix.T
+    max_similarity = np.zeros(len(matrix), dtype=np.float32)
+    is_selected = np.zeros(len(matrix), dtype=bool)
+    order = []
+    for _ in range(len(matrix)):
+        scores = np.where(is_selected, -np.inf, relevance_weight * relevance - (1 - relevance_weight) * max_similarity)
+        i = int(np.argmax(scores))
+        order.append(i)
+        is_selected[i] = True
+        max_similarity = np.maximum(max_similarity, similarity[i])
+    return order
+
+
+def rank_by_mmr(ranking: Sequence[MetadataType], hits: Sequence[ChunkHit], query_embedding: Sequence[float]) -> list[MetadataType]:
+    """
+    Re-ranks the document splits found by the vector search by the maximal marginal relevance of their chunks, so that
+    near-duplicate splits don't take up the token budget. Splits without chunk embeddings (e.g. BM25 results) keep their rank.
+
+    :param ranking: The unique document splits.
+    :param hits: The chunks returned by the vector search.
+    :param query_embedding: The query embedding.
+    :return: The re-ranked document splits.
+    """
+    results_by_key = {get_parent_key(result): result for result in ranking}
+    hits = [hit for hit in hits if hit.embedding is not None and get_parent_key(hit.metadata) in results_by_key]
+    if not hits:
+        return list(ranking)
+    mmr_order = get_mmr_order(query_embedding, [hit.embedding for hit in hits])  # type: ignore
+    mmr_keys = iter(dict.fromkeys(get_parent_key(hits[i].metadata) for i in mmr_order))
+    mmr_key_set = {get_parent_key(hit.metadata) for hit in hits}
+    return [results_by_key[next(mmr_keys)] if get_parent_key(result) in mmr_key_set else result for result in ranking]
+
+
+def __trim_content(content: str, n_tokens: int, hits: Sequence[ChunkHit], token_limit: int) -> tuple[str, int]:
+    """
+    Trims a document split to the windows of its best scoring chunks that fit into the token limit, or to its beginning
+    if the positions of its chunks are unknown. The number of tokens is estimated from the token count of the whole split.
+
+    :param content: The content of the document split.
+    :param n_tokens: The number of tokens of the content.
+    :param hits: The chunks of the document split returned by the vector search.
+    :param token_limit: The maximum number of tokens of the trimmed content.
+    :return: The trimmed content and its estimated number of tokens.
+    """
+    tokens_per_char = n_tokens / max(len(content), 1)
+    windows: list[tuple[int, int]] = []
+    for hit in sorted(hits, key=lambda hit: hit.score, reverse=True):
+        if "chunk_start" not in hit.metadata:
+            continue
+        start, end = int(hit.metadata["chunk_start"]), int(hit.metadata["chunk_end"])
+        merged_windows = []
+        for window_start, window_end in sorted([*windows, (start, end)]):
+            if merged_windows and window_start <= merged_windows[-1][1]:
+                merged_windows[-1] = (merged_windows[-1][0], max(merged_windows[-1][1], window_end))
+            else:
+                merged_windows.append((window_start, window_end))
+        if sum(window_end - window_start for window_start, window_end in merged_windows) * tokens_per_char <= token_limit:
+            windows = merged_windows
+    if not windows:
+        windows = [(0, int(token_limit / tokens_per_char))]
+    excerpts = [content[start:end] for start, end in windows]
+    if windows[0][0] > 0:
+        excerpts.insert(0, "")
+    if windows[-1][1] < len(content):
+        excerpts.append("")
+    n_chars = sum(end - start for start, end in windows)
+    return OMISSION_MARKER.join(excerpts).strip("\n"), int(n_chars * tokens_per_char) + 1
+
+
+def pack_documents(documents: Sequence[Mapping[str, Any]], hits: Sequence[ChunkHit], token_budget: int) -> list[PackedDocument]:
+    """
+    Adds the document splits to the search result in their order until the token budget is used up. Splits that don't fit
+    the remaining budget are trimmed to their best chunks. At least one (possibly trimmed) split is always returned.
+
+    :param documents: The document splits, best first.
+    :param hits: The chunks returned by the vector search.
+    :param token_budget: The maximum number of tokens of the search result.
+    :return: The packed document splits.
+    """
+    packed_documents: list[PackedDocument] = []
+    remaining_tokens = token_budget
+    for document in documents:
+        token_limit = remaining_tokens - SEARCH_RESULT_HEADER_LENGTH_TOKENS
+        if token_limit < MIN_PACKED_RESULT_TOKENS:
+            if packed_documents:
+                break
+            token_limit = MIN_PACKED_RESULT_TOKENS
+        content = str(document["content"])
+        # Parent stores built before the token counts were stored need the content to be tokenized
+        n_tokens = int(document["n_tokens"]) if "n_tokens" in document else count_tokens(content)
+        if n_tokens <= token_limit:
+            packed_documents.append(PackedDocument(document, content, n_tokens, is_trimmed=False))
+        else:
+            document_key = get_parent_key(document)
+            document_hits = [hit for hit in hits if get_parent_key(hit.metadata) == document_key]
+            trimmed_content, n_tokens = __trim_content(content, n_tokens, document_hits, token_limit)
+            packed_documents.append(PackedDocument(document, trimmed_content, n_tokens, is_trimmed=True))
+        remaining_tokens -= n_tokens + SEARCH_RESULT_HEADER_LENGTH_TOKENS
+    return packed_documents
@@ -0,0 +1,86 @@
+import json
+import logging
+import os
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+
+PARTIAL_SUFFIX = ".partial"  # Suffix of checkpoints of stages that did not finish yet
+
+
+def iter_jsonl(path: str) -> Iterator[dict[str, Any]]:
+    """
+    Reads the records of a JSON Lines file one by one.
+
+    :param path: The path to the file.
+    :return: The records.
+    """
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def __read_partial_checkpoint(path: str, get_key: Callable[[dict[str, Any]], str]) -> tuple[list[str], int]:
+    """
+    Finds the complete records of an interrupted stage. The records of the last key may be incomplete (e.g. only some splits
+    of a document were written), so they are dropped together with a trailing partially written line.
+
+    :param path: The path to the partial checkpoint.
+    :param get_key: Returns the key of the input (e.g. the source path of a document) that a record was produced from.
+    :return: The keys of the complete records, and the length of the file containing only the complete records.
+    """
+    keys: list[str] = []
+    offsets: list[int] = []
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            try:
+                key = get_key(json.loads(line))
+            except json.JSONDecodeError:
+                break
+            if not keys or keys[-1] != key:
+                keys.append(key)
+                offsets.append(offset)
+            offset += len(line)
+    if not keys:
+        return [], 0
+    return keys[:-1], offsets[-1]
+
+
+def checkpoint_stage(
+    path: str | None, run_stage: Callable[[set[str]], Iterable[dict[str, Any]]], get_key: Callable[[dict[str, Any]], str]
+) -> Iterator[dict[str, Any]]:
+    """
+    Streams the records of an ingest stage, optionally checkpointing them to JSON Lines. A finished stage is not run again,
+    its checkpoint is streamed instead. An interrupted stage is resumed: the records in its checkpoint are streamed first,
+    then the stage is run for the remaining inputs. The records produced from a single input must be consecutive.
+
+    :param path: The path to the checkpoint, or None to disable checkpointing.
+    :param run_stage: Runs the stage, skipping the inputs with the given keys.
+    :param get_key: Returns the key of the input that a record was produced from.
+    :return: The records.
+    """
+    if path is None:
+        yield from run_stage(set())
+        return
+    if os.path.exists(path):
+        logging.info(f"Reading the finished stage from {path}")
+        yield from iter_jsonl(path)
+        return
+
+    partial_path = path + PARTIAL_SUFFIX
+    done_keys: set[str] = set()
+    if os.path.exists(partial_path):
+        keys, length = __read_partial_checkpoint(partial_path, get_key)
+        done_keys = set(keys)
+        with open(partial_path, "r+b") as f:
+            f.truncate(length)
+        logging.info(f"Resuming from {partial_path} ({len(done_keys)} inputs done)")
+        yield from iter_jsonl(partial_path)
+
+    with open(partial_path, "a") as f:
+        for record in run_stage(done_keys):
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            yield record
+    os.replace(partial_path, path)
@@ -0,0 +1,566 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from queue import Empty, Full, Queue
+from typing import Any, ClassVar
+
+import chromadb
+import numpy as np
+import openai
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TextSplitter
+from langchain_core.embeddings import Embeddings
+from tqdm.autonotebook import tqdm
+
+from brainsoft_code_challenge.config import (
+    CHROMADB_CHUNK_OVERLAP,
+    CHROMADB_CHUNK_SIZE,
+    CHROMADB_PATH,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_CONCURRENT_REQUESTS,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_MODEL,
+    EMBEDDING_RETRY_BACKOFF_SECONDS,
+    NUMPY_INDEX_PATH,
+    PIPELINE_POLL_INTERVAL_SECONDS,
+    PIPELINE_QUEUE_SIZE,
+    VECTOR_STORE_BACKENDS,
+)
+from brainsoft_code_challenge.embedding_profile import CHROMADB_DISTANCE_SPACE, EmbeddingProfile
+from brainsoft_code_challenge.lexical_index import BM25Index
+from brainsoft_code_challenge.llm import RateLimitedOpenAIEmbeddings
+from brainsoft_code_challenge.numpy_index import NumpyVectorIndex, write_numpy_index
+from brainsoft_code_challenge.parent_store import ParentStore, get_parent_key, get_parent_reference
+from brainsoft_code_challenge.rate_limiting import Priority, RateLimiter
+from brainsoft_code_challenge.vector_store import MetadataType, VectorStore
+
+
+@dataclass
+class Chunk:
+    id: str
+    text: str
+    metadata: MetadataType
+
+
+@dataclass
+class IndexUpdateSummary:
+    added: int = 0
+    changed: int = 0
+    removed: int = 0
+    unchanged: int = 0
+
+    def __str__(self) -> str:
+        return f"{self.added} added, {self.changed} changed, {self.removed} removed, {self.unchanged} unchanged chunks"
+
+
+def get_chunk_id(document: Mapping[str, Any], text_chunk: str, model: str) -> str:
+    """
+    Derives a deterministic chunk id from the content, so that unchanged chunks keep their ids across index builds.
+
+    :param document: The document split the chunk belongs to.
+    :param text_chunk: The text of the chunk.
+    :param model: The name of the embedding profile (see EmbeddingProfile.name).
+    :return: The chunk id.
+    """
+    _, split_part = get_parent_key(document)
+    key = json.dumps([document["source_path"], split_part, text_chunk, model], ensure_ascii=False)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def get_text_key(text: str) -> bytes:
+    """
+    Returns the digest of a chunk text, which identifies the text without keeping it in memory.
+    """
+    return hashlib.sha256(text.encode()).digest()
+
+
+def get_text_splitter() -> RecursiveCharacterTextSplitter:
+    from brainsoft_code_challenge.tokenizer import count_tokens
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHROMADB_CHUNK_SIZE, chunk_overlap=CHROMADB_CHUNK_OVERLAP, length_function=count_tokens, separators=["\n\n", "\n", " ", ""]
+    )
+
+
+def iter_chunks(documents: Iterable[Mapping[str, Any]], text_splitter: TextSplitter, model: str = EMBEDDING_MODEL) -> Iterator[Chunk]:
+    """
+    Splits the document splits into chunks. The chunk metadata only references the document split (see parent_store),
+    together with the character range of the chunk in the document split, which allows returning only the best chunks of long splits.
+
+    :param documents: The document splits.
+    :param text_splitter: The text splitter.
+    :param model: The name of the embedding model (part of the chunk ids).
+    :return: The chunks.
+    """
+    for document in documents:
+        content = document["content"]
+        start = -1
+        for text_chunk in text_splitter.split_text(content):
+            # The chunks overlap, so each chunk is searched for after the start of the previous one
+            start = content.find(text_chunk, start + 1)
+            if start == -1:
+                start = content.find(text_chunk)
+            metadata: dict[str, str | int] = get_parent_reference(document)
+            if start != -1:
+                metadata.update(chunk_start=start, chunk_end=start + len(text_chunk))
+            yield Chunk(id=get_chunk_id(document, text_chunk, model), text=text_chunk, metadata=metadata)
+
+
+def chunk_documents(documents: Iterable[Mapping[str, Any]], text_splitter: TextSplitter, model: str = EMBEDDING_MODEL) -> dict[str, Chunk]:
+    """
+    Splits the document splits into chunks.
+
+    :param documents: The document splits.
+    :param text_splitter: The text splitter.
+    :param model: The name of the embedding model (part of the chunk ids).
+    :return: The chunks by their ids. Repeated chunks within a document split are only included once.
+    """
+    chunks: dict[str, Chunk] = {}
+    for chunk in iter_chunks(documents, text_splitter, model):
+        chunks.setdefault(chunk.id, chunk)
+    return chunks
+
+
+def summarize_update(existing_metadatas: Mapping[str, MetadataType], new_metadatas: Mapping[str, MetadataType]) -> IndexUpdateSummary:
+    """
+    Compares the chunks in an index with the new chunks. A new chunk replacing a removed chunk of the same document split
+    is counted as changed.
+
+    :param existing_metadatas: The metadata of the chunks in the index, by their ids.
+    :param new_metadatas: The metadata of the new chunks, by their ids.
+    :return: The summary of the update.
+    """
+    added_per_split = Counter(get_parent_key(metadata) for chunk_id, metadata in new_metadatas.items() if chunk_id not in existing_metadatas)
+    removed_per_split = Counter(get_parent_key(metadata) for chunk_id, metadata in existing_metadatas.items() if chunk_id not in new_metadatas)
+    changed = sum(min(n_added, removed_per_split[key]) for key, n_added in added_per_split.items())
+    return IndexUpdateSummary(
+        added=sum(added_per_split.values()) - changed,
+        changed=changed,
+        removed=sum(removed_per_split.values()) - changed,
+        unchanged=sum(1 for chunk_id in new_metadatas if chunk_id in existing_metadatas),
+    )
+
+
+def get_moved_metadatas(existing_metadatas: Mapping[str, MetadataType], new_metadatas: Mapping[str, MetadataType]) -> dict[str, MetadataType]:
+    """
+    Returns the new metadata of the chunks which are already in an index, but whose metadata changed, e.g. the character
+    range of an unchanged chunk after the text before it was edited. The chunk ids only depend on the text, so these chunks
+    are not embedded again.
+
+    :param existing_metadatas: The metadata of the chunks in the index, by their ids.
+    :param new_metadatas: The metadata of the new chunks, by their ids.
+    :return: The new metadata of the changed chunks, by their ids.
+    """
+    return {chunk_id: metadata for chunk_id, metadata in new_metadatas.items() if chunk_id in existing_metadatas and existing_metadatas[chunk_id] != metadata}
+
+
+class IndexWriter(ABC):
+    """
+    A vector index being built. Subclasses implement the individual backends.
+    """
+
+    name: ClassVar[str]  # The backend name, as in VECTOR_STORE_BACKENDS
+
+    @abstractmethod
+    def get_existing_metadatas(self) -> dict[str, MetadataType]:
+        """
+        Returns the metadata of the chunks already in the index, by chunk id.
+        """
+
+    @abstractmethod
+    def upsert(self, chunks: Sequence[Chunk], embeddings: Sequence[Sequence[float]]) -> None:
+        """
+        Adds the chunks with their embeddings, replacing the chunks with the same ids.
+        """
+
+    @abstractmethod
+    def update_metadatas(self, metadatas: Mapping[str, MetadataType]) -> None:
+        """
+        Replaces the metadata of existing chunks, keeping their embeddings.
+        """
+
+    @abstractmethod
+    def delete(self, ids: Sequence[str]) -> None:
+        """
+        Deletes the chunks, ignoring the ids which are not in the index.
+        """
+
+    def finalize(self) -> None:  # noqa: B027  # An optional hook
+        """
+        Persists the index once all chunks are written. Backends which persist each write don't override it.
+        """
+
+
+class ChromaIndexWriter(IndexWriter):
+    name = "chromadb"
+
+    def __init__(self, profile: EmbeddingProfile, path: str = CHROMADB_PATH, reset: bool = False) -> None:
+        chroma_client = chromadb.PersistentClient(path=path)
+        if "documentation" in [collection.name for collection in chroma_client.list_collections()]:
+            if reset:
+                chroma_client.delete_collection("documentation")
+            else:
+                profile.check_compatible(chroma_client.get_collection("documentation").metadata, self.name)
+        # ChromaDB stores the embeddings as float32 regardless of the profile dtype
+        metadata = {"hnsw:space": CHROMADB_DISTANCE_SPACE, **replace(profile, dtype="float32").to_metadata()}
+        self.collection = chroma_client.get_or_create_collection(name="documentation", metadata=metadata)
+
+    def get_existing_metadatas(self) -> dict[str, MetadataType]:
+        existing = self.collection.get(include=["metadatas"])
+        return dict(zip(existing["ids"], existing["metadatas"] or [], strict=True))
+
+    def upsert(self, chunks: Sequence[Chunk], embeddings: Sequence[Sequence[float]]) -> None:
+        self.collection.upsert(
+            ids=[chunk.id for chunk in chunks],
+            documents=[chunk.text for chunk in chunks],
+            metadatas=[chunk.metadata for chunk in chunks],
+            embeddings=list(embeddings),
+        )
+
+    def update_metadatas(self, metadatas: Mapping[str, MetadataType]) -> None:
+        if metadatas:
+            self.collection.update(ids=list(metadatas), metadatas=list(metadatas.values()))
+
+    def delete(self, ids: Sequence[str]) -> None:
+        if ids:
+            self.collection.delete(ids=list(ids))
+
+
+class NumpyIndexWriter(IndexWriter):
+    """
+    Keeps the existing snapshot (if any) memory-mapped and appends the new embeddings to a growable float32 matrix. When finalized,
+    copies only the surviving rows of the snapshot and the new rows into the new snapshot.
+    """
+
+    name = "numpy"
+
+    def __init__(self, profile: EmbeddingProfile, path: str = NUMPY_INDEX_PATH, reset: bool = False) -> None:
+        self.path = path
+        self.profile = profile
+        self.index: NumpyVectorIndex | None = None
+        self.snapshot_rows: dict[str, int] = {}  # The rows of the snapshot that are kept, by chunk id
+        self.new_rows: dict[str, int] = {}  # The rows of new_embeddings, by chunk id
+        self.new_embeddings = np.empty((0, 0), dtype=np.float32)
+        self.n_new_rows = 0
+        self.metadatas: dict[str, MetadataType] = {}
+        if not reset and os.path.exists(path):
+            self.index = NumpyVectorIndex(path)
+            profile.check_compatible(self.index.metadata, self.name)
+            self.snapshot_rows = {chunk_id: row for row, chunk_id in enumerate(self.index.ids)}
+            self.metadatas = dict(zip(self.index.ids, self.index.metadatas, strict=True))
+
+    def get_existing_metadatas(self) -> dict[str, MetadataType]:
+        return dict(self.metadatas)
+
+    def _append_row(self, embedding: Sequence[float]) -> int:
+        if self.n_new_rows == len(self.new_embeddings):
+            # The capacity doubles, so that appending is amortized O(1)
+            grown = np.empty((max(2 * self.n_new_rows, 1), len(embedding)), dtype=np.float32)
+            if self.n_new_rows:
+                grown[: self.n_new_rows] = self.new_embeddings
+            self.new_embeddings = grown
+        self.new_embeddings[self.n_new_rows] = embedding
+        self.n_new_rows += 1
+        return self.n_new_rows - 1
+
+    def upsert(self, chunks: Sequence[Chunk], embeddings: Sequence[Sequence[float]]) -> None:
+        for chunk, embedding in zip(chunks, embeddings, strict=True):
+            self.snapshot_rows.pop(chunk.id, None)
+            if chunk.id in self.new_rows:
+                self.new_embeddings[self.new_rows[chunk.id]] = embedding
+            else:
+                self.new_rows[chunk.id] = self._append_row(embedding)
+            self.metadatas[chunk.id] = chunk.metadata
+
+    def update_metadatas(self, metadatas: Mapping[str, MetadataType]) -> None:
+        self.metadatas.update(metadatas)
+
+    def delete(self, ids: Sequence[str]) -> None:
+        for chunk_id in ids:
+            self.snapshot_rows.pop(chunk_id, None)
+            self.new_rows.pop(chunk_id, None)
+            self.metadatas.pop(chunk_id, None)
+
+    def finalize(self) -> None:
+        ids = [*self.snapshot_rows, *self.new_rows]
+        dimensions = self.new_embeddings.shape[1]
+        if self.index is not None and self.snapshot_rows:
+            dimensions = self.index.matrix.shape[1]
+        matrix = np.empty((len(ids), dimensions), dtype=np.float32)
+        if self.index is not None and self.snapshot_rows:
+            # The kept rows are read in order, so that the snapshot is read sequentially
+            rows = np.fromiter(self.snapshot_rows.values(), dtype=np.int64, count=len(self.snapshot_rows))
+            order = np.argsort(rows)
+            matrix[order] = self.index.get_embeddings(rows[order])
+        if self.new_rows:
+            matrix[len(self.snapshot_rows) :] = self.new_embeddings[list(self.new_rows.values())]
+        write_numpy_index(self.path, ids, matrix, [self.metadatas[i] for i in ids], dtype=self.profile.dtype, metadata=self.profile.to_metadata())
+
+
+class PipelineAbortedError(RuntimeError):
+    pass
+
+
+class EmbeddingPipeline:
+    """
+    Chunks, tokenizes, embeds and upserts the documents in separate stages connected by bounded queues, so that the index
+    writes overlap with the embedding requests. Several embedding requests are in flight at once, within the requests-per-minute
+    and tokens-per-minute budget of the rate limiter (if any), and requests that hit the rate limit anyway are retried with exponential backoff.
+    Chunks with the same text are embedded once while the text is in flight, even if they are in different batches.
+    """
+
+    def __init__(
+        self,
+        writers: Sequence[IndexWriter],
+        embedder: Embeddings,
+        text_splitter: TextSplitter,
+        token_counter: Callable[[str], int],
+        rate_limiter: RateLimiter | None = None,
+        max_concurrent_requests: int = EMBEDDING_MAX_CONCURRENT_REQUESTS,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        model: str = EMBEDDING_MODEL,
+    ) -> None:
+        self.writers = writers
+        self.embedder = embedder
+        self.text_splitter = text_splitter
+        self.token_counter = token_counter
+        self.rate_limiter = rate_limiter
+        self.max_concurrent_requests = max_concurrent_requests
+        self.batch_size = batch_size
+        self.model = model
+        self.existing_metadatas = {writer.name: writer.get_existing_metadatas() for writer in writers}
+        self.chunk_metadatas: dict[str, MetadataType] = {}  # Only the metadata is kept, so that memory does not grow with the texts
+        # The embeddings of the texts in flight by their digests, dropped once no queued chunk references them, so that memory does not grow with the run
+        self.text_embeddings: dict[bytes, Future[list[float]]] = {}
+        self.text_references: Counter[bytes] = Counter()
+        self._text_lock = threading.Lock()
+        self.n_embedded_chunks = 0
+        self._error: BaseException | None = None
+
+    def _put(self, queue: Queue, item: Any) -> None:  # type: ignore
+        while self._error is None:
+            with contextlib.suppress(Full):
+                queue.put(item, timeout=PIPELINE_POLL_INTERVAL_SECONDS)
+                return
+
+    def _get(self, queue: Queue) -> Any:  # type: ignore
+        while self._error is None:
+            with contextlib.suppress(Empty):
+                return queue.get(timeout=PIPELINE_POLL_INTERVAL_SECONDS)
+        raise PipelineAbortedError()
+
+    def _run_stage(self, stage: Callable[[], None], output_queue: Queue, n_consumers: int = 1) -> None:  # type: ignore
+        """
+        Runs a stage, records its error (which stops the other stages), and signals the end of its output to the consumers.
+        """
+        try:
+            stage()
+        except PipelineAbortedError:
+            pass
+        except BaseException as e:
+            self._error = self._error or e
+        finally:
+            for _ in range(n_consumers):
+                self._put(output_queue, None)
+
+    def _is_missing(self, chunk_id: str) -> bool:
+        return any(chunk_id not in self.existing_metadatas[writer.name] for writer in self.writers)
+
+    def _chunk(self, documents: Iterable[Mapping[str, Any]], output_queue: Queue) -> None:  # type: ignore
+        batch: list[Chunk] = []
+        texts: list[str] = []  # The texts which are not in flight yet, the batch embeds them for all queued chunks with the same text
+        for chunk in iter_chunks(documents, self.text_splitter, self.model):
+            if chunk.id in self.chunk_metadatas:
+                continue
+            self.chunk_metadatas[chunk.id] = chunk.metadata
+            if self._is_missing(chunk.id):
+                batch.append(chunk)
+                text_key = get_text_key(chunk.text)
+                with self._text_lock:
+                    if text_key not in self.text_embeddings:
+                        self.text_embeddings[text_key] = Future()
+                        texts.append(chunk.text)
+                    self.text_references[text_key] += 1
+            if len(batch) >= self.batch_size:
+                self._put(output_queue, (batch, texts))
+                batch, texts = [], []
+        if batch:
+            self._put(output_queue, (batch, texts))
+
+    def _tokenize(self, input_queue: Queue, output_queue: Queue) -> None:  # type: ignore
+        while (item := self._get(input_queue)) is not None:
+            batch, texts = item
+            self._put(output_queue, (batch, texts, sum(self.token_counter(text) for text in texts)))
+
+    def _embed_texts(self, texts: list[str], n_tokens: int) -> list[list[float]]:
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(n_tokens)
+            try:
+                return self.embedder.embed_documents(texts)
+            except openai.RateLimitError:
+                if attempt == EMBEDDING_MAX_RETRIES:
+                    raise
+                backoff = EMBEDDING_RETRY_BACKOFF_SECONDS * 2**attempt
+                logging.warning(f"Embedding request rate limited, retrying in {backoff:.1f} s")
+                time.sleep(backoff * random.uniform(1.0, 1.5))  # noqa: S311
+                attempt += 1
+
+    def _get_embedding(self, text: str) -> list[float]:
+        """
+        Returns the embedding of the text, waiting for the batch that embeds it if it is still in flight. That batch was
+        queued earlier, so it never waits for this one.
+        """
+        with self._text_lock:
+            future = self.text_embeddings[get_text_key(text)]
+        while self._error is None:
+            with contextlib.suppress(TimeoutError):
+                return future.result(timeout=PIPELINE_POLL_INTERVAL_SECONDS)
+        raise PipelineAbortedError()
+
+    def _embed(self, input_queue: Queue, output_queue: Queue) -> None:  # type: ignore
+        while (item := self._get(input_queue)) is not None:
+            batch, texts, n_tokens = item
+            with self._text_lock:
+                futures = [self.text_embeddings[get_text_key(text)] for text in texts]
+            try:
+                embeddings = self._embed_texts(texts, n_tokens) if texts else []
+            except BaseException as e:
+                for future in futures:
+                    future.set_exception(e)
+                raise
+            for future, embedding in zip(futures, embeddings, strict=True):
+                future.set_result(embedding)
+            embeddings = [self._get_embedding(chunk.text) for chunk in batch]
+            self._release_texts(batch)
+            self._put(output_queue, (batch, embeddings))
+
+    def _release_texts(self, batch: Sequence[Chunk]) -> None:
+        """
+        Drops the embeddings of the texts that no other queued chunk references. A text seen again later is embedded again.
+        """
+        with self._text_lock:
+            for chunk in batch:
+                text_key = get_text_key(chunk.text)
+                self.text_references[text_key] -= 1
+                if not self.text_references[text_key]:
+                    del self.text_references[text_key]
+                    del self.text_embeddings[text_key]
+
+    def _upsert(self, input_queue: Queue, progress_bar: tqdm) -> None:  # type: ignore
+        n_finished_embedding_workers = 0
+        while n_finished_embedding_workers < self.max_concurrent_requests:
+            item = self._get(input_queue)
+            if item is None:
+                n_finished_embedding_workers += 1
+                continue
+            batch, embeddings = item
+            for writer in self.writers:
+                writer_batch = [
+                    (chunk, embedding) for chunk, embedding in zip(batch, embeddings, strict=True) if chunk.id not in self.existing_metadatas[writer.name]
+                ]
+                if writer_batch:
+                    writer.upsert([chunk for chunk, _ in writer_batch], [embedding for _, embedding in writer_batch])
+            self.n_embedded_chunks += len(batch)
+            progress_bar.update(len(batch))
+
+    def run(self, documents: Iterable[Mapping[str, Any]]) -> None:
+        """
+        Runs the pipeline, upserting the embeddings of the chunks missing from the writers. The chunks of the documents
+        (including those that were already indexed) is collected in self.chunk_metadatas.
+
+        :param documents: The document splits.
+        """
+        chunk_queue: Queue = Queue(maxsize=PIPELINE_QUEUE_SIZE)  # type: ignore
+        token_queue: Queue = Queue(maxsize=PIPELINE_QUEUE_SIZE)  # type: ignore
+        embedding_queue: Queue = Queue(maxsize=PIPELINE_QUEUE_SIZE)  # type: ignore
+        start_time = time.monotonic()
+        with ThreadPoolExecutor(max_workers=2 + self.max_concurrent_requests) as executor, tqdm(desc="Embedding", unit="chunks") as progress_bar:
+            executor.submit(self._run_stage, lambda: self._chunk(documents, chunk_queue), chunk_queue)
+            executor.submit(self._run_stage, lambda: self._tokenize(chunk_queue, token_queue), token_queue, self.max_concurrent_requests)
+            for _ in range(self.max_concurrent_requests):
+                executor.submit(self._run_stage, lambda: self._embed(token_queue, embedding_queue), embedding_queue)
+            try:
+                self._upsert(embedding_queue, progress_bar)
+            except PipelineAbortedError:
+                pass
+            except BaseException as e:
+                self._error = self._error or e
+        if self._error is not None:
+            raise self._error
+        elapsed_seconds = time.monotonic() - start_time
+        chunks_per_second = self.n_embedded_chunks / elapsed_seconds if elapsed_seconds > 0 else 0.0
+        logging.info(f"Embedded {self.n_embedded_chunks} chunks in {elapsed_seconds:.1f} s ({chunks_per_second:.1f} chunks/s)")
+
+
+def build_index(
+    data: Iterable[Mapping[str, Any]],
+    backends: Sequence[str] = VECTOR_STORE_BACKENDS,
+    incremental: bool = False,
+    vector_store: VectorStore | None = None,
+) -> dict[str, IndexUpdateSummary]:
+    """
+    Builds the vector indexes, the parent store and the BM25 index from a stream of document splits. In incremental mode,
+    only the new or changed chunks are embedded, stale chunks are deleted and the character ranges of moved chunks are
+    updated, otherwise the vector indexes are rebuilt from scratch.
+
+    :param data: The document splits.
+    :param backends: The vector index backends to build.
+    :param incremental: Whether to update the existing vector indexes instead of rebuilding them.
+    :param vector_store: The vector store providing the embedder and the embedding profile.
+    :return: The summary of the update of each vector index.
+    """
+    vector_store = vector_store or VectorStore()
+    writers: list[IndexWriter] = []
+    if "chromadb" in backends:
+        writers.append(ChromaIndexWriter(vector_store.profile, vector_store.chromadb_path, reset=not incremental))
+    if "numpy" in backends:
+        writers.append(NumpyIndexWriter(vector_store.profile, vector_store.numpy_index_path, reset=not incremental))
+
+    from brainsoft_code_challenge.tokenizer import count_tokens
+
+    # The OpenAI embedder waits for the shared rate limiter itself, at the lowest priority and without a timeout when building
+    # the index (local embedders run as fast as the CPU allows)
+    embedder = vector_store.get_embedder()
+    if isinstance(embedder, RateLimitedOpenAIEmbeddings):
+        embedder = embedder.with_priority(Priority.BACKGROUND, is_offline=True)
+    pipeline = EmbeddingPipeline(writers, embedder, get_text_splitter(), count_tokens, model=vector_store.profile.name)
+    parent_store_path = vector_store.parent_store_path + ".tmp"
+    if os.path.exists(parent_store_path):
+        os.remove(parent_store_path)
+    parent_store = ParentStore(parent_store_path)
+    lexical_index = BM25Index([], {}, [])
+
+    def __index_documents(documents: Iterable[Mapping[str, Any]]) -> Iterator[Mapping[str, Any]]:
+        for document in documents:
+            # The token counts are stored with the document splits, so that search results can be packed without tokenizing them
+            parent_store.add({**document, "n_tokens": count_tokens(str(document["content"]))})
+            lexical_index.add(document)
+            yield document
+
+    pipeline.run(__index_documents(data))
+
+    summaries = {}
+    for writer in writers:
+        writer_existing_metadatas = pipeline.existing_metadatas[writer.name]
+        writer.delete([chunk_id for chunk_id in writer_existing_metadatas if chunk_id not in pipeline.chunk_metadatas])
+        writer.update_metadatas(get_moved_metadatas(writer_existing_metadatas, pipeline.chunk_metadatas))
+        writer.finalize()
+        summaries[writer.name] = summarize_update(writer_existing_metadatas, pipeline.chunk_metadatas)
+        logging.info(f"Updated the {writer.name} index: {summaries[writer.name]}")
+
+    # The parent store is swapped in only when complete, the running API keeps reading the old file until then
+    parent_store.close()
+    os.replace(parent_store_path, vector_store.parent_store_path)
+    lexical_index.save(vector_store.lexical_index_path)
+    return summaries
@@ -1,11 +1,27 @@
+import asyncio
+import hashlib
+import io
+import json
 import logging
 import os
+import tarfile
+from collections import deque
+from collections.abc import Container, Iterator
+from typing import IO, Any
 
-import requests
+import httpx
 
+from brainsoft_code_challenge.config import SCRAPING_CACHE_DIR, SCRAPING_MAX_CONCURRENT_REQUESTS
+from brainsoft_code_challenge.http_clients import create_async_http_client
 from brainsoft_code_challenge.utils import is_pytest_running
 
 REQUEST_TIMEOUT_SECONDS = 60
+GITHUB_REPOSITORY = "IBM/ibm-generative-ai"
+GITHUB_REF = "main"
+DOCUMENTATION_SOURCE_DIR = "documentation/source/"
+EXAMPLES_DIR = "examples/"
+
+TreeEntryType = dict[str, Any]
 
 
 def __get_headers_for_github(github_api_token: str | None) -> dict[str, str]:
@@ -20,89 +36,218 @@ def __get_headers_for_github(github_api_token: str | None) -> dict[str, str]:
     return {"Authorization": f"Bearer {github_api_token}"}
 
 
-def __scrape_documentation(github_api_token: str | None = None) -> list[dict[str, str]]:
+def get_git_blob_sha(content: bytes) -> str:
+    """
+    Calculates the SHA of the content as a git blob (the same as in the git tree), so that downloaded files can be cached by it.
     """
-    Scrape the documentation from the IBM Generative AI repository.
+    return hashlib.sha1(f"blob {len(content)}\0".encode() + content).hexdigest()  # noqa: S324
 
-    :param github_api_token: The GitHub API token to avoid rate limits.
-    :return: The scraped documentation.
-    """
-    url = "https://api.github.com/repos/IBM/ibm-generative-ai/contents/documentation/source"
-    response = requests.get(url, headers=__get_headers_for_github(github_api_token), timeout=REQUEST_TIMEOUT_SECONDS)
-    data = response.json()
-    results = []
-    for file in data:
-        if file["name"].endswith(".rst"):
-            if file["name"] == "404.rst":
-                continue
-            documentation_url = f"https://ibm.github.io/ibm-generative-ai/main/{file['name'].removesuffix('.rst')}.html"
-            if is_pytest_running():
-                assert requests.get(documentation_url, timeout=REQUEST_TIMEOUT_SECONDS).status_code == 200  # noqa: PLR2004, S101
-            logging.info(f"Found page {documentation_url}")
-            source_url = file["download_url"]
-            source_response = requests.get(source_url, headers=__get_headers_for_github(github_api_token), timeout=REQUEST_TIMEOUT_SECONDS)
-            content = source_response.text
-            result = {
-                "source_path": file["path"],
-                "source_url": source_url,
-                "documentation_url": documentation_url,
-                "content": content,
-                "type": "documentation",
-            }
-            results.append(result)
-    return results
-
-
-def __scrape_examples_dir(url: str, github_api_token: str | None) -> list[dict[str, str]]:
-    """
-    Recursively scrape the examples from a directory in the IBM Generative AI repository.
-    :param url: The URL of the directory in the repository.
-    :param github_api_token: The GitHub API token to avoid rate limits.
-    :return: The scraped examples.
-    """
-    response = requests.get(url, headers=__get_headers_for_github(github_api_token), timeout=REQUEST_TIMEOUT_SECONDS)
-    data = response.json()
-    results = []
-    for file in data:
-        if file["type"] == "dir":
-            dir_url = file["url"]
-            results.extend(__scrape_examples_dir(dir_url, github_api_token))
-        elif file["type"] == "file" and file["name"].endswith(".py"):
-            if file["name"] == "__init__.py":
-                continue
-            documentation_url = f"https://ibm.github.io/ibm-generative-ai/main/rst_source/{file['path'].removesuffix('.py').replace('/', '.')}.html"
-            if is_pytest_running():
-                assert requests.get(documentation_url, timeout=REQUEST_TIMEOUT_SECONDS).status_code == 200  # noqa: PLR2004, S101
-            logging.info(f"Found page {documentation_url}")
-            source_url = file["download_url"]
-            source_response = requests.get(source_url, headers=__get_headers_for_github(github_api_token), timeout=REQUEST_TIMEOUT_SECONDS)
-            content = source_response.text
-            result = {"source_path": file["path"], "source_url": source_url, "documentation_url": documentation_url, "content": content, "type": "example"}
-            results.append(result)
-    return results
 
+def get_document_info(path: str) -> dict[str, str] | None:
+    """
+    Decides whether a file in the repository is scraped, and returns the page of the documentation showing it.
 
-def __scrape_examples(github_api_token: str | None = None) -> list[dict[str, str]]:
+    :param path: The path to the file in the repository.
+    :return: The documentation URL and the document type, or None if the file is not scraped.
     """
-    Scrape the examples from the IBM Generative AI repository.
+    name = path.rsplit("/", 1)[-1]
+    if path.startswith(DOCUMENTATION_SOURCE_DIR) and "/" not in path.removeprefix(DOCUMENTATION_SOURCE_DIR) and name.endswith(".rst") and name != "404.rst":
+        return {"documentation_url": f"https://ibm.github.io/ibm-generative-ai/main/{name.removesuffix('.rst')}.html", "type": "documentation"}
+    if path.startswith(EXAMPLES_DIR) and name.endswith(".py") and name != "__init__.py":
+        documentation_url = f"https://ibm.github.io/ibm-generative-ai/main/rst_source/{path.removesuffix('.py').replace('/', '.')}.html"
+        return {"documentation_url": documentation_url, "type": "example"}
+    return None
 
-    :param github_api_token: The GitHub API token to avoid rate limits.
-    :return: The scraped examples.
+
+def __get_source_url(path: str) -> str:
+    return f"https://raw.githubusercontent.com/{GITHUB_REPOSITORY}/{GITHUB_REF}/{path}"
+
+
+class ScrapingCache:
+    """
+    Keeps the last listed git tree (with its ETag) and the downloaded files by their git blob SHA. The tree is requested
+    conditionally, and unchanged files are read from the cache instead of being downloaded again.
     """
-    url = "https://api.github.com/repos/IBM/ibm-generative-ai/contents/examples"
-    return __scrape_examples_dir(url, github_api_token)
 
+    def __init__(self, path: str | None) -> None:
+        self.path = path
+        self.manifest: dict[str, Any] = {}
+        if path is not None:
+            os.makedirs(os.path.join(path, "blobs"), exist_ok=True)
+            if os.path.exists(self.manifest_path):
+                with open(self.manifest_path) as f:
+                    self.manifest = json.load(f)
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(str(self.path), "manifest.json")
+
+    def save_tree(self, etag: str | None, tree: list[TreeEntryType]) -> None:
+        self.manifest = {"tree_etag": etag, "tree": tree}
+        if self.path is not None:
+            with open(self.manifest_path, "w") as f:
+                f.write(json.dumps(self.manifest))
+
+    def get_blob(self, sha: str) -> bytes | None:
+        if self.path is None or not os.path.exists(os.path.join(self.path, "blobs", sha)):
+            return None
+        with open(os.path.join(self.path, "blobs", sha), "rb") as f:
+            return f.read()
+
+    def put_blob(self, content: bytes) -> None:
+        if self.path is not None:
+            with open(os.path.join(self.path, "blobs", get_git_blob_sha(content)), "wb") as f:
+                f.write(content)
+
+
+async def __list_repository_files(client: httpx.AsyncClient, cache: ScrapingCache) -> list[TreeEntryType]:
+    """
+    Lists the scraped files of the repository in a single recursive git tree request.
 
-def scrape_all(github_api_token: str | None = None) -> list[dict[str, str]]:
+    :param client: The HTTP client.
+    :param cache: The scraping cache.
+    :return: The tree entries of the scraped files.
     """
-    Scrape all the documentation and examples from the IBM Generative AI repository.
+    headers = {}
+    if cache.manifest.get("tree_etag"):
+        headers["If-None-Match"] = cache.manifest["tree_etag"]
+    url = f"https://api.github.com/repos/{GITHUB_REPOSITORY}/git/trees/{GITHUB_REF}?recursive=1"
+    response = await client.get(url, headers=headers)
+    if response.status_code == httpx.codes.NOT_MODIFIED:  # Conditional requests do not count against the GitHub rate limit
+        logging.info("The repository tree is unchanged")
+        tree = cache.manifest["tree"]
+    else:
+        response.raise_for_status()
+        data = response.json()
+        if data.get("truncated"):
+            logging.warning("The repository tree is truncated, some files may be missing")
+        tree = [entry for entry in data["tree"] if entry["type"] == "blob" and get_document_info(entry["path"]) is not None]
+        cache.save_tree(response.headers.get("ETag"), tree)
+    return tree
+
+
+async def __check_documentation_url(client: httpx.AsyncClient, documentation_url: str) -> None:
+    response = await client.head(documentation_url, follow_redirects=True)
+    assert response.status_code == 200  # noqa: PLR2004, S101
+
+
+async def __fetch_document(
+    client: httpx.AsyncClient, semaphore: asyncio.Semaphore, cache: ScrapingCache, entry: TreeEntryType, archive_files: dict[str, bytes] | None
+) -> dict[str, str]:
+    """
+    Fetches a file from the cache, the downloaded archive, or the repository.
+
+    :param client: The HTTP client.
+    :param semaphore: Limits the number of concurrent requests.
+    :param cache: The scraping cache.
+    :param entry: The tree entry of the file.
+    :param archive_files: The files extracted from the repository archive, if it was downloaded.
+    :return: The scraped document.
+    """
+    document_info = get_document_info(entry["path"])
+    assert document_info is not None  # noqa: S101
+    source_url = __get_source_url(entry["path"])
+    content = cache.get_blob(entry["sha"])
+    if content is None:
+        if archive_files is not None and entry["path"] in archive_files:
+            content = archive_files[entry["path"]]
+        else:
+            async with semaphore:
+                response = await client.get(source_url)
+            response.raise_for_status()
+            content = response.content
+        cache.put_blob(content)
+    if is_pytest_running():
+        async with semaphore:
+            await __check_documentation_url(client, document_info["documentation_url"])
+    logging.info(f"Found page {document_info['documentation_url']}")
+    return {
+        "source_path": entry["path"],
+        "source_url": source_url,
+        "documentation_url": document_info["documentation_url"],
+        "content": content.decode(),
+        "type": document_info["type"],
+    }
+
+
+def iter_tarball_files(fileobj: IO[bytes]) -> Iterator[tuple[str, bytes]]:
+    """
+    Reads the scraped files from a GitHub repository archive.
+
+    :param fileobj: The gzipped tar archive.
+    :return: The paths (relative to the repository root) and contents of the scraped files.
+    """
+    with tarfile.open(fileobj=fileobj, mode="r:gz") as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            _, _, path = member.name.partition("/")  # GitHub archives have a single top-level directory
+            if get_document_info(path) is not None:
+                extracted_file = archive.extractfile(member)
+                if extracted_file is not None:
+                    yield path, extracted_file.read()
+
+
+async def __download_tarball(client: httpx.AsyncClient) -> dict[str, bytes]:
+    response = await client.get(f"https://api.github.com/repos/{GITHUB_REPOSITORY}/tarball/{GITHUB_REF}", follow_redirects=True)
+    response.raise_for_status()
+    return dict(iter_tarball_files(io.BytesIO(response.content)))
+
+
+def iter_scrape_all(
+    github_api_token: str | None = None, skip_source_paths: Container[str] = (), use_tarball: bool = False, cache_dir: str | None = SCRAPING_CACHE_DIR
+) -> Iterator[dict[str, str]]:
+    """
+    Scrape all the documentation and examples from the IBM Generative AI repository, yielding each document as soon as
+    it is available. The files are listed by a single git tree request and downloaded concurrently.
 
     :param github_api_token: The GitHub API token to avoid rate limits.
+    :param skip_source_paths: The paths of files that should not be downloaded (e.g. already scraped before resuming).
+    :param use_tarball: Whether to download the changed files in a single repository archive instead of one by one.
+    :param cache_dir: The directory of the scraping cache, or None to download everything.
     :return: The scraped documentation and examples.
     """
     if github_api_token is None:
         github_api_token = os.getenv("GITHUB_API_TOKEN")
-    results = []
-    results.extend(__scrape_documentation(github_api_token))
-    results.extend(__scrape_examples(github_api_token))
-    return results
+    cache = ScrapingCache(cache_dir)
+    tasks: deque[asyncio.Task[dict[str, str]]] = deque()
+    loop = asyncio.new_event_loop()
+    client = create_async_http_client(
+        max_connections=SCRAPING_MAX_CONCURRENT_REQUESTS, headers=__get_headers_for_github(github_api_token), timeout=REQUEST_TIMEOUT_SECONDS
+    )
+    try:
+        tree = loop.run_until_complete(__list_repository_files(client, cache))
+        tree = [entry for entry in tree if entry["path"] not in skip_source_paths]
+        archive_files = None
+        n_missing_files = sum(1 for entry in tree if cache.get_blob(entry["sha"]) is None)
+        logging.info(f"Scraping {len(tree)} files, {len(tree) - n_missing_files} of them are cached")
+        if use_tarball and n_missing_files > 0:
+            archive_files = loop.run_until_complete(__download_tarball(client))
+
+        semaphore = asyncio.Semaphore(SCRAPING_MAX_CONCURRENT_REQUESTS)
+        # Only a window of documents is fetched ahead of the consumer, so that memory does not grow with the repository
+        entries = iter(tree)
+        while True:
+            while len(tasks) < 2 * SCRAPING_MAX_CONCURRENT_REQUESTS and (entry := next(entries, None)) is not None:
+                tasks.append(loop.create_task(__fetch_document(client, semaphore, cache, entry, archive_files)))
+            if not tasks:
+                break
+            yield loop.run_until_complete(tasks.popleft())
+    finally:
+        if tasks:  # The consumer stopped early or a download failed
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.run_until_complete(client.aclose())
+        loop.close()
+
+
+def scrape_all(github_api_token: str | None = None, use_tarball: bool = False) -> list[dict[str, str]]:
+    """
+    Scrape all the documentation and examples from the IBM Generative AI repository.
+
+    :param github_api_token: The GitHub API token to avoid rate limits.
+    :param use_tarball: Whether to download the changed files in a single repository archive instead of one by one.
+    :return: The scraped documentation and examples.
+    """
+    return list(iter_scrape_all(github_api_token, use_tarball=use_tarball))
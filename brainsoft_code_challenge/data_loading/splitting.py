@@ -1,4 +1,5 @@
-from collections.abc import Mapping, Sequence
+import logging
+from collections.abc import Iterable, Iterator, Mapping, Sequence
 from typing import Any
 
 from brainsoft_code_challenge.config import MIN_SPLIT_LENGTH_CHARS, SPLIT_DOCUMENTS_LONGER_THAN_N_CHARS
@@ -66,3 +67,17 @@ def split_document(document: Mapping[str, Any]) -> list[dict[str, Any]]:
             )
         return __split_long_document(document, min_length=MIN_SPLIT_LENGTH_CHARS)
     return [document]
+
+
+def iter_split_documents(documents: Iterable[Mapping[str, Any]]) -> Iterator[dict[str, Any]]:
+    """
+    Split a stream of documents into a stream of document splits.
+
+    :param documents: The documents to split.
+    :return: The split documents.
+    """
+    for document in documents:
+        split_parts = split_document(document)
+        if len(split_parts) > 1:
+            logging.info(f"Split {document['source_path']} into {len(split_parts)} parts")
+        yield from split_parts
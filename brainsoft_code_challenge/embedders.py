@@ -0,0 +1,108 @@
+import hashlib
+import os
+import threading
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from brainsoft_code_challenge.config import LOCAL_EMBEDDING_BATCH_SIZE, LOCAL_EMBEDDING_MAX_WORKERS
+from brainsoft_code_challenge.embedding_profile import EmbeddingProfile, truncate_embeddings
+from brainsoft_code_challenge.lexical_index import tokenize
+from brainsoft_code_challenge.llm import RateLimitedOpenAIEmbeddings
+
+HASHING_EMBEDDING_DIMENSIONS = 512  # Number of dimensions of the hashing embeddings, unless the profile shortens them
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    A deterministic local stand-in for the embedding API, e.g. for offline benchmarks and tests. The tokens of the text
+    (see lexical_index.tokenize) are hashed into a fixed number of signed buckets, so texts sharing words have similar embeddings.
+    """
+
+    def __init__(self, dimensions: int = HASHING_EMBEDDING_DIMENSIONS) -> None:
+        self.dimensions = dimensions
+
+    def embed_text(self, text: str) -> list[float]:
+        embedding = np.zeros(self.dimensions, dtype=np.float32)
+        for token in tokenize(text):
+            digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            embedding[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(embedding)
+        return (embedding / norm if norm > 0 else embedding).tolist()
+
+    def embed_documents(self, texts: Sequence[str]) -> list[list[float]]:  # type: ignore
+        return [self.embed_text(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_text(text)
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    Embeds the texts on the CPU with a sentence-transformers bi-encoder loaded from a local directory, so that queries don't
+    depend on the embedding API. The texts are split into batches, which are embedded concurrently in a thread pool
+    (the inference releases the GIL). The model is loaded on first use and requires the optional sentence-transformers package.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        dimensions: int | None = None,
+        batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE,
+        max_workers: int = LOCAL_EMBEDDING_MAX_WORKERS,
+    ) -> None:
+        if not os.path.isdir(model_path):
+            raise FileNotFoundError(f"The local embedding model directory {model_path} does not exist")
+        self.model_path = model_path
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="local-embeddings")
+        self._model: Any = None
+        self._lock = threading.Lock()
+
+    def get_model(self) -> Any:
+        with self._lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError as e:
+                    raise ImportError("The local embedding backend requires the sentence-transformers package") from e
+                self._model = SentenceTransformer(self.model_path, device="cpu")
+        return self._model
+
+    def _embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        return self.get_model().encode(list(texts), batch_size=len(texts), convert_to_numpy=True, normalize_embeddings=True)
+
+    def embed_documents(self, texts: Sequence[str]) -> list[list[float]]:  # type: ignore
+        if not texts:
+            return []
+        batches = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        embeddings = np.concatenate(list(self._executor.map(self._embed_batch, batches)))
+        # Matryoshka-trained models can be shortened like the text-embedding-3 embeddings, others lose accuracy
+        return truncate_embeddings(embeddings, self.dimensions).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+EMBEDDER_FACTORIES: dict[str, Callable[[EmbeddingProfile], Embeddings]] = {
+    "openai": lambda profile: RateLimitedOpenAIEmbeddings(model=profile.model, dimensions=profile.dimensions),
+    "local": lambda profile: LocalEmbeddings(profile.model, profile.dimensions),
+    "hashing": lambda profile: HashingEmbeddings(profile.dimensions or HASHING_EMBEDDING_DIMENSIONS),
+}
+
+
+def get_embedder(profile: EmbeddingProfile) -> Embeddings:
+    """
+    Creates the embedder calculating the embeddings of the profile, by its backend (see EMBEDDER_FACTORIES).
+
+    :param profile: The embedding profile.
+    :return: The embedder.
+    """
+    if profile.backend not in EMBEDDER_FACTORIES:
+        raise ValueError(f"Unknown embedding backend {profile.backend}, expected one of {', '.join(EMBEDDER_FACTORIES)}")
+    return EMBEDDER_FACTORIES[profile.backend](profile)
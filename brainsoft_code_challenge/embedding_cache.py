@@ -0,0 +1,81 @@
+import hashlib
+import sqlite3
+import threading
+from collections.abc import Sequence
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalizes the query text for the cache key. Only whitespace is normalized, as the embeddings are case-sensitive.
+    """
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    A disk-backed LRU cache of query embeddings. The cache is stored in SQLite (in WAL mode), so it can be shared by several
+    API workers on the same machine. The hit and miss counters are kept per process.
+    """
+
+    def __init__(self, path: str, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, embedding BLOB NOT NULL, last_used INTEGER NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    @staticmethod
+    def get_key(text: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\n{normalize_query(text)}".encode()).hexdigest()
+
+    def get(self, text: str, model: str) -> list[float] | None:
+        """
+        Returns the cached embedding of the text, or None on a cache miss.
+
+        :param text: The embedded text.
+        :param model: The name of the embedding model.
+        :return: The embedding or None.
+        """
+        key = self.get_key(text, model)
+        with self._lock:
+            row = self._connection.execute("SELECT embedding FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Recency is tracked by a counter shared through the database, as timestamps of consecutive uses can collide
+            self._connection.execute("UPDATE embeddings SET last_used = (SELECT COALESCE(MAX(last_used), 0) + 1 FROM embeddings) WHERE key = ?", (key,))
+        return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+    def put(self, text: str, model: str, embedding: Sequence[float]) -> None:
+        """
+        Stores the embedding of the text and evicts the least recently used entries if the cache is full.
+
+        :param text: The embedded text.
+        :param model: The name of the embedding model.
+        :param embedding: The embedding.
+        """
+        key = self.get_key(text, model)
+        blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO embeddings (key, embedding, last_used) VALUES (?, ?, (SELECT COALESCE(MAX(last_used), 0) + 1 FROM embeddings))",
+                (key, blob),
+            )
+            (n_entries,) = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if n_entries > self.max_entries:
+                self._connection.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (n_entries - self.max_entries,)
+                )
+
+    def get_stats(self) -> dict[str, int | float]:
+        """
+        Returns the hit and miss counters of this process.
+        """
+        n_lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / n_lookups if n_lookups else 0.0}
@@ -0,0 +1,98 @@
+import os
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from brainsoft_code_challenge.config import EMBEDDING_BACKEND, EMBEDDING_DIMENSIONS, EMBEDDING_MODEL, NUMPY_INDEX_DTYPE
+
+LEGACY_EMBEDDING_MODEL = "text-embedding-3-large"  # Indexes without a recorded profile were built with this model at full dimensions
+HASHING_EMBEDDING_MODEL = "hashing"  # The hashing embedder has no model, its profiles are named after the backend
+CHROMADB_DISTANCE_SPACE = "ip"  # The search turns the distances into inner product scores, ChromaDB defaults to "l2" without this metadata
+
+
+class EmbeddingProfileMismatchError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class EmbeddingProfile:
+    """
+    Describes how the chunks are embedded and stored: the embedder backend and model, the number of dimensions the embeddings
+    are shortened to (None for all dimensions), and the storage dtype of the NumPy snapshot (ChromaDB always stores float32).
+    """
+
+    model: str = EMBEDDING_MODEL
+    dimensions: int | None = EMBEDDING_DIMENSIONS
+    dtype: str = NUMPY_INDEX_DTYPE
+    backend: str = EMBEDDING_BACKEND
+
+    @property
+    def name(self) -> str:
+        """
+        Identifies the embeddings (not their storage), e.g. in the chunk ids and the query embedding cache keys.
+        Local models are identified by the name of their directory, so that the directory can be moved.
+        """
+        # The backend is not repeated in the name of a model named after it (the hashing embedder)
+        model = self.model if self.backend in ("openai", self.model) else f"{self.backend}/{os.path.basename(os.path.normpath(self.model))}"
+        if self.dimensions is None:
+            return model
+        return f"{model}:{self.dimensions}"
+
+    def to_metadata(self) -> dict[str, str | int]:
+        """
+        Returns the profile as index metadata (ChromaDB metadata values cannot be None, so 0 stands for all dimensions).
+        """
+        return {"embedding_backend": self.backend, "embedding_model": self.model, "embedding_dimensions": self.dimensions or 0, "embedding_dtype": self.dtype}
+
+    @classmethod
+    def from_metadata(cls, metadata: Mapping[str, Any] | None, default_dtype: str = "float32") -> "EmbeddingProfile":
+        metadata = metadata or {}
+        if "embedding_model" not in metadata:
+            return cls(model=LEGACY_EMBEDDING_MODEL, dimensions=None, dtype=default_dtype, backend="openai")
+        model = str(metadata["embedding_model"])
+        # Profiles were recorded without the backend before local embedders, when only the hashing embedder ran locally
+        legacy_backend = "hashing" if model == HASHING_EMBEDDING_MODEL else "openai"
+        return cls(
+            model=model,
+            dimensions=int(metadata["embedding_dimensions"]) or None,
+            dtype=str(metadata["embedding_dtype"]),
+            backend=str(metadata.get("embedding_backend", legacy_backend)),
+        )
+
+    def check_compatible(self, metadata: Mapping[str, Any] | None, index_name: str) -> None:
+        """
+        Rejects an index whose embeddings were calculated differently, as its scores against the query embeddings would be meaningless.
+        The storage dtype may differ, as the embeddings are dequantized for scoring. A ChromaDB collection must also use the
+        inner product space, which can't be changed once the collection is created.
+
+        :param metadata: The metadata of the index.
+        :param index_name: The name of the index, for the error message.
+        """
+        index_profile = self.from_metadata(metadata)
+        if index_profile.name != self.name:
+            raise EmbeddingProfileMismatchError(
+                f"The {index_name} index was built with the embedding profile {index_profile.name}, but {self.name} is configured. Rebuild the index."
+            )
+        distance_space = (metadata or {}).get("hnsw:space", "l2")
+        if index_name == "chromadb" and distance_space != CHROMADB_DISTANCE_SPACE:
+            raise EmbeddingProfileMismatchError(
+                f"The {index_name} index uses the {distance_space} distance, but the {CHROMADB_DISTANCE_SPACE} distance is expected. Rebuild the index."
+            )
+
+
+def truncate_embeddings(embeddings: Sequence[Sequence[float]] | np.ndarray, dimensions: int | None) -> np.ndarray:
+    """
+    Shortens the embeddings to the given number of dimensions and renormalizes them, which is what the OpenAI API does
+    for the text-embedding-3 models when the dimensions parameter is set.
+
+    :param embeddings: The full embeddings.
+    :param dimensions: The number of dimensions to keep, or None to keep all of them.
+    :return: The unit-length shortened embeddings.
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if dimensions is not None:
+        matrix = matrix[:, :dimensions]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
@@ -0,0 +1,154 @@
+import codecs
+import email.message
+import importlib.util
+import re
+from collections import defaultdict
+from collections.abc import Mapping
+from html.parser import HTMLParser
+
+IS_LXML_AVAILABLE = importlib.util.find_spec("lxml") is not None  # The C-backed parser of the lxml extra, the standard library parser is used otherwise
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+PLAIN_TEXT_CONTENT_TYPE = "text/plain"
+BOILERPLATE_TAGS = {"head", "script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form", "iframe", "button", "select"}
+BOILERPLATE_PATTERN = re.compile(r"comment|sidebar|footer|navbar|menu|cookie|banner|share|social|related|advert|promo|popup|breadcrumb", re.IGNORECASE)
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+MAIN_CONTENT_TAGS = {"article", "main"}
+MIN_PARAGRAPH_LENGTH = 25  # Shorter text nodes (links, labels, etc.) don't count towards the content score of their containers
+MIN_MAIN_CONTENT_LENGTH = 200  # A shorter <article> or <main> element is not trusted to hold the main content
+MIN_MAIN_CONTENT_SHARE = 0.25  # If the best scoring element holds less of the text, the page has no main content and all text is returned
+
+
+def get_media_type(content_type: str | None) -> str | None:
+    return content_type.split(";")[0].strip().lower() if content_type else None
+
+
+def is_supported_content_type(content_type: str | None) -> bool:
+    """
+    Returns whether the text of a response of the content type can be extracted. Responses without a content type are assumed to be HTML.
+    """
+    media_type = get_media_type(content_type)
+    return media_type is None or media_type in HTML_CONTENT_TYPES or media_type == PLAIN_TEXT_CONTENT_TYPE
+
+
+def decode_body(body: bytes, content_type: str | None) -> str:
+    """
+    Decodes the response body with the charset of the content type, or UTF-8 if it is missing or unknown.
+    """
+    message = email.message.Message()
+    message["Content-Type"] = content_type or ""
+    charset = message.get_content_charset() or "utf-8"
+    try:
+        codecs.lookup(charset)
+    except LookupError:
+        charset = "utf-8"
+    return body.decode(charset, errors="replace")
+
+
+class MainContentCollector:
+    """
+    Collects the text of a page while it is parsed, skipping the boilerplate elements (navigation, scripts, etc.), and scores
+    the elements in the style of Readability: each paragraph adds to the score of its container and half to the container's
+    parent. The interface is that of the parser targets of lxml, the standard library parser calls it through an adapter.
+    """
+
+    def __init__(self) -> None:
+        self._stack: list[tuple[str, int]] = []  # The open elements and their ids
+        self._n_elements = 0
+        self._boilerplate_depth = 0
+        self._segments: list[tuple[str, tuple[int, ...]]] = []  # The text nodes and the ids of their ancestors
+        self._scores: defaultdict[int, float] = defaultdict(float)
+        self._main_content_ids: list[int] = []
+
+    def start(self, tag: str, attrib: Mapping[str, str | None]) -> None:
+        tag = tag.lower()
+        if tag in VOID_TAGS:
+            return
+        self._n_elements += 1
+        self._stack.append((tag, self._n_elements))
+        class_and_id = f"{attrib.get('class') or ''} {attrib.get('id') or ''}"
+        if (
+            self._boilerplate_depth
+            or tag in BOILERPLATE_TAGS
+            or (tag not in MAIN_CONTENT_TAGS and tag not in ("html", "body") and BOILERPLATE_PATTERN.search(class_and_id))
+        ):
+            self._boilerplate_depth += 1
+        elif tag in MAIN_CONTENT_TAGS or attrib.get("role") == "main":
+            self._main_content_ids.append(self._n_elements)
+
+    def end(self, tag: str) -> None:
+        tag = tag.lower()
+        if not any(open_tag == tag for open_tag, _ in self._stack):  # Stray end tags are ignored
+            return
+        while self._stack:  # Elements left open inside the element are closed with it
+            open_tag, _ = self._stack.pop()
+            if self._boilerplate_depth:
+                self._boilerplate_depth -= 1
+            if open_tag == tag:
+                break
+
+    def data(self, data: str) -> None:
+        if self._boilerplate_depth or not (text := " ".join(data.split())):
+            return
+        ancestor_ids = tuple(element_id for _, element_id in self._stack)
+        self._segments.append((text, ancestor_ids))
+        if len(text) >= MIN_PARAGRAPH_LENGTH and len(ancestor_ids) >= 2:  # noqa: PLR2004
+            score = 1 + text.count(",") + min(len(text) / 100, 3)
+            self._scores[ancestor_ids[-2]] += score
+            if len(ancestor_ids) >= 3:  # noqa: PLR2004
+                self._scores[ancestor_ids[-3]] += score / 2
+
+    def close(self) -> str:
+        """
+        Returns the text of the main content, or all text if no element holds most of it.
+        """
+        all_text = [text for text, _ in self._segments]
+        main_text = [text for text, ancestor_ids in self._segments if any(element_id in ancestor_ids for element_id in self._main_content_ids)]
+        if sum(map(len, main_text)) >= MIN_MAIN_CONTENT_LENGTH:
+            return " ".join(main_text)
+        if self._scores:
+            best_id = max(self._scores, key=self._scores.__getitem__)
+            best_text = [text for text, ancestor_ids in self._segments if best_id in ancestor_ids]
+            if sum(map(len, best_text)) >= MIN_MAIN_CONTENT_SHARE * sum(map(len, all_text)):
+                return " ".join(best_text)
+        return " ".join(all_text)
+
+
+class _StandardLibraryParser(HTMLParser):
+    def __init__(self, target: MainContentCollector) -> None:
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self.target.start(tag, dict(attrs))
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        pass  # Self-closing elements have no text
+
+    def handle_endtag(self, tag: str) -> None:
+        self.target.end(tag)
+
+    def handle_data(self, data: str) -> None:
+        self.target.data(data)
+
+
+def extract_main_text(html: str, use_lxml: bool = IS_LXML_AVAILABLE) -> str:
+    """
+    Extracts the text of the main content of an HTML page, without the navigation, scripts and other boilerplate, in a single
+    pass of a streaming parser.
+
+    :param html: The HTML of the page, possibly truncated.
+    :param use_lxml: Whether to parse the page with lxml (the lxml extra), by default if it is installed.
+    :return: The text, with the whitespace normalized.
+    """
+    collector = MainContentCollector()
+    if use_lxml:
+        from lxml import etree
+
+        parser = etree.HTMLParser(target=collector)
+        parser.feed(html)
+        return parser.close()  # type: ignore
+    standard_library_parser = _StandardLibraryParser(collector)
+    standard_library_parser.feed(html)
+    standard_library_parser.close()
+    return collector.close()
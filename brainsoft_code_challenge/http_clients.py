@@ -0,0 +1,247 @@
+import asyncio
+import functools
+import importlib.util
+import ipaddress
+import socket
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from typing import Any
+
+import anyio.to_thread
+import httpcore
+import httpx
+import openai
+
+from brainsoft_code_challenge.config import (
+    DNS_CACHE_MAX_ENTRIES,
+    DNS_CACHE_TTL_SECONDS,
+    HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_TIMEOUT_SECONDS,
+)
+
+IS_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None  # Installed with the http2 extra of httpx (a declared dependency)
+
+
+class DnsCache:
+    """
+    Caches the addresses of the host names resolved by the shared HTTP clients for a limited time. Only the connections of
+    the clients created here resolve through the cache, the rest of the process uses the system resolver. Failed lookups are
+    not cached. Thread-safe.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.n_hits = 0
+        self.n_misses = 0
+        self._getaddrinfo = socket.getaddrinfo
+        self._entries: OrderedDict[tuple[str, int], tuple[float, list[str]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, host: str, port: int) -> list[str] | None:
+        """
+        Returns the cached addresses of the host, or None if they are missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get((host, port))
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            self._entries.move_to_end((host, port))
+            self.n_hits += 1
+            return entry[1]
+
+    def resolve(self, host: str, port: int) -> list[str]:
+        """
+        Returns the addresses of the host, from the cache or resolved by the system resolver (blocking).
+
+        :param host: The host name.
+        :param port: The port, which the system resolver may take into account.
+        :return: The IP addresses, in the order of the system resolver.
+        """
+        if (addresses := self.get(host, port)) is not None:
+            return addresses
+        addresses = list(dict.fromkeys(str(info[4][0]) for info in self._getaddrinfo(host, port, type=socket.SOCK_STREAM)))
+        with self._lock:
+            self.n_misses += 1
+            self._entries[(host, port)] = (time.monotonic() + self.ttl_seconds, addresses)
+            self._entries.move_to_end((host, port))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return addresses
+
+
+dns_cache = DnsCache(DNS_CACHE_TTL_SECONDS or 0.0, DNS_CACHE_MAX_ENTRIES)
+
+
+def is_ip_address(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+class CachingNetworkBackend(httpcore.NetworkBackend):
+    """
+    The network backend of the shared httpx client, which resolves the host through the DNS cache and connects to its
+    addresses in turn. TLS is still negotiated for the host name of the request.
+    """
+
+    def __init__(self, backend: httpcore.NetworkBackend, cache: DnsCache) -> None:
+        self.backend = backend
+        self.cache = cache
+
+    def connect_tcp(
+        self, host: str, port: int, timeout: float | None = None, local_address: str | None = None, socket_options: Iterable[Any] | None = None
+    ) -> httpcore.NetworkStream:
+        addresses = [host] if is_ip_address(host) else self.cache.resolve(host, port)
+        for i, address in enumerate(addresses):
+            try:
+                return self.backend.connect_tcp(address, port, timeout=timeout, local_address=local_address, socket_options=socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout):
+                if i == len(addresses) - 1:
+                    raise
+        raise httpcore.ConnectError(f"No addresses found for {host}")
+
+    def connect_unix_socket(self, path: str, timeout: float | None = None, socket_options: Iterable[Any] | None = None) -> httpcore.NetworkStream:
+        return self.backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    def sleep(self, seconds: float) -> None:
+        self.backend.sleep(seconds)
+
+
+class AsyncCachingNetworkBackend(httpcore.AsyncNetworkBackend):
+    """
+    The network backend of the shared httpx async clients, like CachingNetworkBackend. Hosts missing from the DNS cache are
+    resolved in a worker thread, so that the event loop is not blocked.
+    """
+
+    def __init__(self, backend: httpcore.AsyncNetworkBackend, cache: DnsCache) -> None:
+        self.backend = backend
+        self.cache = cache
+
+    async def connect_tcp(
+        self, host: str, port: int, timeout: float | None = None, local_address: str | None = None, socket_options: Iterable[Any] | None = None
+    ) -> httpcore.AsyncNetworkStream:
+        if is_ip_address(host):
+            addresses = [host]
+        elif (addresses := self.cache.get(host, port)) is None:  # type: ignore
+            addresses = await anyio.to_thread.run_sync(self.cache.resolve, host, port)
+        for i, address in enumerate(addresses):
+            try:
+                return await self.backend.connect_tcp(address, port, timeout=timeout, local_address=local_address, socket_options=socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout):
+                if i == len(addresses) - 1:
+                    raise
+        raise httpcore.ConnectError(f"No addresses found for {host}")
+
+    async def connect_unix_socket(self, path: str, timeout: float | None = None, socket_options: Iterable[Any] | None = None) -> httpcore.AsyncNetworkStream:
+        return await self.backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self.backend.sleep(seconds)
+
+
+def __get_limits(max_connections: int) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=min(max_connections, HTTP_MAX_KEEPALIVE_CONNECTIONS),
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    )
+
+
+def __get_pool_options(limits: httpx.Limits) -> dict[str, Any]:
+    return {
+        "ssl_context": httpx.create_ssl_context(),
+        "max_connections": limits.max_connections,
+        "max_keepalive_connections": limits.max_keepalive_connections,
+        "keepalive_expiry": limits.keepalive_expiry,
+        "http2": IS_HTTP2_AVAILABLE,
+    }
+
+
+def __create_transport(limits: httpx.Limits) -> httpx.HTTPTransport:
+    transport = httpx.HTTPTransport(http2=IS_HTTP2_AVAILABLE, limits=limits)
+    # httpx doesn't expose the network backend, so the pool is replaced by one with the same options. This relies on the private
+    # _pool attribute, hence httpx and httpcore are pinned to minor versions, and tests/test_http_clients.py checks the replacement.
+    if DNS_CACHE_TTL_SECONDS is not None:
+        transport._pool = httpcore.ConnectionPool(**__get_pool_options(limits), network_backend=CachingNetworkBackend(httpcore.SyncBackend(), dns_cache))
+    return transport
+
+
+def __create_async_transport(limits: httpx.Limits) -> httpx.AsyncHTTPTransport:
+    transport = httpx.AsyncHTTPTransport(http2=IS_HTTP2_AVAILABLE, limits=limits)
+    if DNS_CACHE_TTL_SECONDS is not None:
+        network_backend = AsyncCachingNetworkBackend(httpcore.AnyIOBackend(), dns_cache)
+        transport._pool = httpcore.AsyncConnectionPool(**__get_pool_options(limits), network_backend=network_backend)
+    return transport
+
+
+@functools.cache
+def get_http_client() -> httpx.Client:
+    """
+    Returns the httpx client shared by the process, with a keep-alive connection pool, HTTP/2 and the DNS cache.
+    """
+    return httpx.Client(transport=__create_transport(__get_limits(HTTP_MAX_CONNECTIONS)), timeout=HTTP_TIMEOUT_SECONDS)
+
+
+def create_async_http_client(max_connections: int = HTTP_MAX_CONNECTIONS, **kwargs: Any) -> httpx.AsyncClient:
+    """
+    Creates an httpx async client with the settings of the shared clients, for callers that run their own event loop and
+    close the client with it (e.g. the GitHub scraper).
+
+    :param max_connections: The maximum number of open connections.
+    :param kwargs: Other arguments of the client, e.g. default headers.
+    :return: The client.
+    """
+    kwargs.setdefault("timeout", HTTP_TIMEOUT_SECONDS)
+    return httpx.AsyncClient(transport=__create_async_transport(__get_limits(max_connections)), **kwargs)
+
+
+# The connections of an async client belong to the event loop that opened them, so each event loop gets its own clients
+# (e.g. Streamlit runs each script run in a new event loop). They are released together with the loop.
+__async_http_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = weakref.WeakKeyDictionary()
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Returns the httpx async client shared by the running event loop. Close it with close_async_http_client before the loop shuts down.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in __async_http_clients:
+        __async_http_clients[loop] = create_async_http_client()
+    return __async_http_clients[loop]
+
+
+async def close_async_http_client() -> None:
+    """
+    Closes the httpx async client of the running event loop (if any), so that its connections are closed while the loop still
+    runs. A later call of get_async_http_client creates a new client.
+    """
+    client = __async_http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+class LoopLocalResource:
+    """
+    Stands in for a resource of the async OpenAI client of a LangChain model (e.g. the chat completions). Each event loop gets
+    its own async client, created with the options of the model and the shared async httpx client of the loop, as a LangChain
+    model holds a single async client, which would otherwise be bound to the first loop.
+    """
+
+    def __init__(self, get_resource: Callable[[openai.AsyncOpenAI], Any]) -> None:
+        self.get_resource = get_resource
+        self.client_options: dict[str, Any] = {}  # Set once the model has resolved its options (API key, base URL, timeout, etc.)
+        self._clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, openai.AsyncOpenAI] = weakref.WeakKeyDictionary()
+
+    def create(self, *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        if loop not in self._clients:
+            self._clients[loop] = openai.AsyncOpenAI(**self.client_options, http_client=get_async_http_client())
+        return self.get_resource(self._clients[loop]).create(*args, **kwargs)
@@ -0,0 +1,179 @@
+import json
+import math
+import re
+from collections import Counter
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Any
+
+from brainsoft_code_challenge.config import BM25_B, BM25_K1, LEXICAL_FAST_PATH_MAX_QUERY_WORDS, LEXICAL_FAST_PATH_MIN_SCORE
+from brainsoft_code_challenge.parent_store import get_parent_reference
+
+LexicalResultType = tuple[Mapping[str, Any], float]
+
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*|\d+")
+WORD_PART_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+CAMEL_CASE_PATTERN = re.compile(r"[a-z0-9][A-Z]|[A-Z]{2}[a-z]")
+
+
+def __is_compound_identifier(identifier: str) -> bool:
+    """
+    Checks whether the identifier is composed of several words (dotted path, snake_case or CamelCase).
+    """
+    return "." in identifier or "_" in identifier.strip("_") or CAMEL_CASE_PATTERN.search(identifier) is not None
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Tokenizes the text for the BM25 index. Compound identifiers (e.g. Credentials.from_env) are kept as a single token,
+    and their components (credentials, from_env, from, env) are added as separate tokens, so that both exact identifier
+    queries and queries for their parts match.
+
+    :param text: The text to tokenize.
+    :return: The lowercase tokens.
+    """
+    tokens = []
+    for match in IDENTIFIER_PATTERN.finditer(text):
+        identifier = match.group()
+        tokens.append(identifier.lower())
+        if not __is_compound_identifier(identifier):
+            continue
+        components = set()
+        for dotted_part in identifier.split("."):
+            components.add(dotted_part.lower())
+            for word in dotted_part.split("_"):
+                components.update(part.lower() for part in WORD_PART_PATTERN.findall(word))
+        components.discard(identifier.lower())
+        components.discard("")
+        tokens.extend(sorted(components))
+    return tokens
+
+
+def get_query_identifiers(query: str) -> list[str]:
+    """
+    Extracts the compound identifiers (such as client.text.generation.create or LocalServer) from a query.
+
+    :param query: The query.
+    :return: The lowercase identifiers.
+    """
+    return [match.group().lower() for match in IDENTIFIER_PATTERN.finditer(query) if __is_compound_identifier(match.group())]
+
+
+class BM25Index:
+    """
+    An inverted index over the document splits, scored with Okapi BM25. It allows answering identifier queries
+    without calculating the query embedding. Only references to the document splits are stored, their contents are kept
+    in the parent store.
+    """
+
+    def __init__(self, documents: Sequence[Mapping[str, Any]], postings: Mapping[str, Mapping[int, int]], document_lengths: Sequence[int]) -> None:
+        self.documents = list(documents)
+        self.postings = {term: dict(term_postings) for term, term_postings in postings.items()}
+        self.document_lengths = list(document_lengths)
+        self.average_document_length = sum(self.document_lengths) / len(self.document_lengths) if self.document_lengths else 0.0
+
+    @classmethod
+    def build(cls, documents: Iterable[Mapping[str, Any]]) -> "BM25Index":
+        """
+        Builds the index from the document splits.
+
+        :param documents: The document splits (with the "content" key).
+        :return: The index.
+        """
+        index = cls([], {}, [])
+        for document in documents:
+            index.add(document)
+        return index
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str]) -> "BM25Index":
+        """
+        Builds an index over plain texts (e.g. the passages of a web page), which are identified by their positions (see rank).
+
+        :param texts: The texts.
+        :return: The index.
+        """
+        index = cls([], {}, [])
+        for text in texts:
+            index._add_text(text, {})
+        return index
+
+    def add(self, document: Mapping[str, Any]) -> None:
+        """
+        Adds a document split to the index.
+
+        :param document: The document split (with the "content" key).
+        """
+        self._add_text(str(document["content"]), get_parent_reference(document))
+
+    def _add_text(self, text: str, reference: Mapping[str, Any]) -> None:
+        i = len(self.documents)
+        term_frequencies = Counter(tokenize(text))
+        for term, frequency in term_frequencies.items():
+            self.postings.setdefault(term, {})[i] = frequency
+        self.documents.append(reference)
+        document_length = sum(term_frequencies.values())
+        self.document_lengths.append(document_length)
+        self.average_document_length += (document_length - self.average_document_length) / len(self.document_lengths)
+
+    def save(self, path: str) -> None:
+        data = {
+            "documents": self.documents,
+            "postings": {term: list(documents.items()) for term, documents in self.postings.items()},
+            "document_lengths": self.document_lengths,
+        }
+        with open(path, "w") as f:
+            f.write(json.dumps(data, ensure_ascii=False))
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path) as f:
+            data = json.load(f)
+        postings = {term: dict(documents) for term, documents in data["postings"].items()}
+        return cls(data["documents"], postings, data["document_lengths"])
+
+    def search(self, query: str, n_results: int) -> list[LexicalResultType]:
+        """
+        Scores the documents against the query.
+
+        :param query: The query.
+        :param n_results: The maximum number of results to return.
+        :return: The references to the matching document splits with their BM25 scores, best first.
+        """
+        return [(self.documents[i], score) for i, score in self.rank(query, n_results)]
+
+    def rank(self, query: str, n_results: int) -> list[tuple[int, float]]:
+        """
+        Scores the documents against the query, like search.
+
+        :param query: The query.
+        :param n_results: The maximum number of results to return.
+        :return: The positions of the matching documents (in the order they were added) with their BM25 scores, best first.
+        """
+        scores: dict[int, float] = {}
+        n_documents = len(self.documents)
+        for term in set(tokenize(query)):
+            term_postings = self.postings.get(term)
+            if not term_postings:
+                continue
+            idf = math.log(1 + (n_documents - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+            for i, frequency in term_postings.items():
+                length_norm = BM25_K1 * (1 - BM25_B + BM25_B * self.document_lengths[i] / self.average_document_length)
+                scores[i] = scores.get(i, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + length_norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:n_results]
+
+    def is_confident_match(self, query: str, results: Sequence[LexicalResultType]) -> bool:
+        """
+        Decides whether the lexical results can be returned without vector search. This is the case for short queries
+        made of SDK identifiers, if the best result contains all of the identifiers and scores high enough.
+
+        :param query: The query.
+        :param results: The results of the query from this index.
+        :return: True if the results can be returned without vector search.
+        """
+        identifiers = get_query_identifiers(query)
+        if not identifiers or not results or len(query.split()) > LEXICAL_FAST_PATH_MAX_QUERY_WORDS:
+            return False
+        best_document, best_score = results[0]
+        if best_score < LEXICAL_FAST_PATH_MIN_SCORE:
+            return False
+        return all(any(self.documents[i] == best_document for i in self.postings.get(identifier, {})) for identifier in identifiers)
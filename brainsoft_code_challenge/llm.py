@@ -0,0 +1,159 @@
+from collections.abc import AsyncIterator, Callable, Iterator, Sequence
+from typing import Any
+
+import openai
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from pydantic.v1 import root_validator
+
+from brainsoft_code_challenge.config import ADMISSION_TIMEOUTS_SECONDS, COMPLETION_TOKENS_ESTIMATE
+from brainsoft_code_challenge.http_clients import LoopLocalResource, get_http_client
+from brainsoft_code_challenge.rate_limiting import Priority, get_openai_rate_limiter
+from brainsoft_code_challenge.tokenizer import count_tokens
+
+
+def get_admission_timeout(priority: Priority, is_offline: bool = False) -> float | None:
+    """
+    Returns the admission timeout of the priority, or None (no timeout) for offline work such as index builds.
+    """
+    return None if is_offline else ADMISSION_TIMEOUTS_SECONDS[priority.name.lower()]
+
+
+def use_shared_http_client(values: dict[str, Any], get_resource: Callable[[openai.AsyncOpenAI], Any]) -> dict[str, Any]:
+    """
+    Makes a LangChain OpenAI model use the shared httpx client, unless it is given its own OpenAI or httpx clients. LangChain
+    creates the sync OpenAI client with the options of the model, while the async client is created for each event loop.
+
+    :param values: The values of the model, before validation.
+    :param get_resource: Returns the resource of the async OpenAI client used by the model, e.g. the embeddings.
+    :return: The values.
+    """
+    if values.get("client") is None and values.get("http_client") in (None, get_http_client()):
+        values["http_client"] = get_http_client()
+        values["async_client"] = LoopLocalResource(get_resource)
+    return values
+
+
+def configure_loop_local_client(values: dict[str, Any]) -> dict[str, Any]:
+    """
+    Passes the options of a validated LangChain OpenAI model (API key, base URL, timeout, retries, etc.) to its loop-local async
+    client, the same options LangChain passes to the sync client.
+    """
+    if isinstance(async_client := values.get("async_client"), LoopLocalResource):
+        async_client.client_options = {
+            "api_key": values["openai_api_key"].get_secret_value() if values["openai_api_key"] else None,
+            "organization": values["openai_organization"],
+            "base_url": values["openai_api_base"],
+            "timeout": values["request_timeout"],
+            "max_retries": values["max_retries"],
+            "default_headers": values["default_headers"],
+            "default_query": values["default_query"],
+        }
+    return values
+
+
+class RateLimitedChatOpenAI(ChatOpenAI):
+    """
+    ChatOpenAI which waits for the shared rate limiter of its model before each request. The token budget is charged with the
+    prompt tokens and the maximum completion tokens. Raises an AdmissionRejectedError if the request can't be admitted in time.
+    Unless other clients are given, the requests go through the shared httpx clients (and their connection pools).
+    """
+
+    priority: Priority = Priority.INTERACTIVE
+
+    @root_validator(pre=True)
+    def use_shared_clients(cls, values: dict[str, Any]) -> dict[str, Any]:  # noqa: N805
+        return use_shared_http_client(values, lambda client: client.chat.completions)
+
+    @root_validator(skip_on_failure=True)
+    def configure_async_client(cls, values: dict[str, Any]) -> dict[str, Any]:  # noqa: N805
+        return configure_loop_local_client(values)
+
+    def _estimate_tokens(self, messages: Sequence[BaseMessage]) -> int:
+        return sum(count_tokens(str(message.content)) for message in messages) + (self.max_tokens or COMPLETION_TOKENS_ESTIMATE)
+
+    def _acquire(self, messages: Sequence[BaseMessage]) -> None:
+        get_openai_rate_limiter(self.model_name).acquire(self._estimate_tokens(messages), self.priority, get_admission_timeout(self.priority))
+
+    async def _aacquire(self, messages: Sequence[BaseMessage]) -> None:
+        await get_openai_rate_limiter(self.model_name).aacquire(self._estimate_tokens(messages), self.priority, get_admission_timeout(self.priority))
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        stream: bool | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if not (stream if stream is not None else self.streaming):  # Streamed requests are admitted by _stream
+            self._acquire(messages)
+        return super()._generate(messages, stop=stop, run_manager=run_manager, stream=stream, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        stream: bool | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if not (stream if stream is not None else self.streaming):
+            await self._aacquire(messages)
+        return await super()._agenerate(messages, stop=stop, run_manager=run_manager, stream=stream, **kwargs)
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        self._acquire(messages)
+        yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await self._aacquire(messages)
+        async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            yield chunk
+
+
+class RateLimitedOpenAIEmbeddings(OpenAIEmbeddings):
+    """
+    OpenAIEmbeddings which waits for the shared rate limiter of its model before each request (embed_query goes through
+    embed_documents), and uses the shared httpx clients unless other clients are given.
+    """
+
+    priority: Priority = Priority.INTERACTIVE
+    is_offline: bool = False  # Offline work (index builds) waits for the rate limiter without the admission timeout
+
+    @root_validator(pre=True)
+    def use_shared_clients(cls, values: dict[str, Any]) -> dict[str, Any]:  # noqa: N805
+        return use_shared_http_client(values, lambda client: client.embeddings)
+
+    @root_validator(skip_on_failure=True)
+    def configure_async_client(cls, values: dict[str, Any]) -> dict[str, Any]:  # noqa: N805
+        return configure_loop_local_client(values)
+
+    def with_priority(self, priority: Priority, is_offline: bool = False) -> "RateLimitedOpenAIEmbeddings":
+        # The clients are excluded from copies and from dict(), so the copy is built through the constructor, which creates them again
+        return type(self)(**{**self.dict(exclude={"client", "async_client"}), "priority": priority, "is_offline": is_offline})
+
+    def _get_n_tokens(self, texts: Sequence[str]) -> int:
+        return sum(count_tokens(text) for text in texts)
+
+    def embed_documents(self, texts: list[str], chunk_size: int | None = 0) -> list[list[float]]:
+        get_openai_rate_limiter(self.model).acquire(self._get_n_tokens(texts), self.priority, get_admission_timeout(self.priority, self.is_offline))
+        return super().embed_documents(texts, chunk_size=chunk_size)
+
+    async def aembed_documents(self, texts: list[str], chunk_size: int | None = 0) -> list[list[float]]:
+        await get_openai_rate_limiter(self.model).aacquire(self._get_n_tokens(texts), self.priority, get_admission_timeout(self.priority, self.is_offline))
+        return await super().aembed_documents(texts, chunk_size=chunk_size)
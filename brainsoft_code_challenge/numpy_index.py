@@ -0,0 +1,180 @@
+import json
+import os
+import struct
+from collections.abc import Mapping, Sequence
+from typing import Any
+
+import numpy as np
+
+IndexMetadataType = Mapping[str, Any]
+QueryResultType = dict[str, list[list[Any]]]
+
+SNAPSHOT_MAGIC = b"BSVI"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_ALIGNMENT = 64  # The embedding matrix starts at an offset aligned to this number of bytes
+SCORING_BLOCK_ROWS = 4096  # Rows are upcast to float32 in blocks of this size, which bounds the temporary memory used by a query
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+INT8_MAX = 127
+
+
+class InvalidSnapshotError(ValueError):
+    pass
+
+
+def __quantize(embeddings: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """
+    Converts the embeddings to the storage dtype. Int8 quantization is symmetric and uses a separate scale for each row.
+
+    :param embeddings: The float32 embedding matrix.
+    :param dtype: The storage dtype.
+    :return: The stored matrix and the row scales (None unless the dtype is int8).
+    """
+    if dtype == "int8":
+        scales = np.abs(embeddings).max(axis=1) / INT8_MAX
+        scales[scales == 0] = 1.0
+        quantized = np.rint(embeddings / scales[:, None]).clip(-INT8_MAX, INT8_MAX).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    return embeddings.astype(dtype), None
+
+
+def write_numpy_index(
+    path: str,
+    ids: Sequence[str],
+    embeddings: Sequence[Sequence[float]] | np.ndarray,
+    metadatas: Sequence[IndexMetadataType],
+    dtype: str = "float16",
+    metadata: Mapping[str, Any] | None = None,
+) -> None:
+    """
+    Writes the embeddings into a single snapshot file, which can be memory-mapped by NumpyVectorIndex.
+
+    The file consists of a magic string, a JSON header (ids, metadatas and the layout of the matrix), the embedding matrix
+    stored in the given dtype, and (for int8) the float32 row scales.
+
+    :param path: The path of the snapshot file.
+    :param ids: The ids of the embeddings.
+    :param embeddings: The embeddings (a float32 matrix is used without a copy).
+    :param metadatas: The metadata of each embedding.
+    :param dtype: The storage dtype, one of SUPPORTED_DTYPES.
+    :param metadata: Metadata describing the whole index.
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Dtype must be one of {SUPPORTED_DTYPES}")
+    if not len(ids) == len(embeddings) == len(metadatas):
+        raise ValueError("The number of ids, embeddings and metadatas must be equal.")
+    matrix = np.asarray(embeddings, dtype=np.float32) if len(embeddings) else np.empty((0, 0), dtype=np.float32)
+    stored_matrix, scales = __quantize(matrix, dtype)
+    header = {
+        "dtype": dtype,
+        "n_vectors": matrix.shape[0],
+        "dimensions": matrix.shape[1],
+        "ids": list(ids),
+        "metadatas": [dict(m) for m in metadatas],
+        "metadata": dict(metadata or {}),
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    prefix_length = len(SNAPSHOT_MAGIC) + struct.calcsize("<IQ")
+    padding = -(prefix_length + len(header_bytes)) % SNAPSHOT_ALIGNMENT
+    # The previous snapshot may be memory-mapped (by the index writer or a running server), so it is replaced rather than truncated
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack("<IQ", SNAPSHOT_VERSION, len(header_bytes) + padding))
+        f.write(header_bytes + b" " * padding)
+        f.write(np.ascontiguousarray(stored_matrix).tobytes())
+        if scales is not None:
+            f.write(scales.tobytes())
+    os.replace(temporary_path, path)
+
+
+class NumpyVectorIndex:
+    """
+    Exact inner product search over a memory-mapped snapshot written by write_numpy_index. For a corpus of a few thousand chunks,
+    a single matrix-vector product is faster than an HNSW query, and loading the index is a single mmap call.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                raise InvalidSnapshotError(f"{path} is not a vector index snapshot.")
+            version, header_length = struct.unpack("<IQ", f.read(struct.calcsize("<IQ")))
+            if version != SNAPSHOT_VERSION:
+                raise InvalidSnapshotError(f"Unsupported snapshot version {version}.")
+            header = json.loads(f.read(header_length))
+        self.dtype: str = header["dtype"]
+        self.ids: list[str] = header["ids"]
+        self.metadatas: list[IndexMetadataType] = header["metadatas"]
+        self.metadata: dict[str, Any] = header["metadata"]
+        shape = (header["n_vectors"], header["dimensions"])
+        data_offset = len(SNAPSHOT_MAGIC) + struct.calcsize("<IQ") + header_length
+        self.matrix: np.ndarray = np.memmap(path, dtype=self.dtype, mode="r", offset=data_offset, shape=shape) if shape[0] else np.empty(shape)
+        self.scales: np.ndarray | None = None
+        if self.dtype == "int8" and shape[0]:
+            scales_offset = data_offset + self.matrix.nbytes
+            self.scales = np.memmap(path, dtype=np.float32, mode="r", offset=scales_offset, shape=(shape[0],))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get_embeddings(self, rows: np.ndarray | None = None) -> np.ndarray:
+        """
+        Returns the (dequantized) float32 embedding matrix.
+
+        :param rows: The indices of the rows to return, all rows if None. Only these rows are read from the snapshot.
+        :return: The embeddings.
+        """
+        matrix = np.asarray(self.matrix if rows is None else self.matrix[rows], dtype=np.float32)
+        if self.scales is not None:
+            matrix = matrix * (self.scales if rows is None else self.scales[rows])[:, None]
+        return matrix
+
+    def score(self, query_embeddings: Sequence[Sequence[float]]) -> np.ndarray:
+        """
+        Computes the inner products between the queries and all stored embeddings.
+
+        :param query_embeddings: The query embeddings.
+        :return: A matrix of shape (number of queries, number of stored embeddings).
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        scores = np.empty((queries.shape[0], len(self)), dtype=np.float32)
+        for start in range(0, len(self), SCORING_BLOCK_ROWS):
+            end = min(start + SCORING_BLOCK_ROWS, len(self))
+            block_scores = np.asarray(self.matrix[start:end], dtype=np.float32) @ queries.T
+            if self.scales is not None:
+                block_scores *= self.scales[start:end, None]
+            scores[:, start:end] = block_scores.T
+        return scores
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int, include_embeddings: bool = False) -> QueryResultType:
+        """
+        Finds the nearest neighbours of the query embeddings. The result has the same structure as a ChromaDB query result,
+        with distances computed as in ChromaDB's "ip" space.
+
+        :param query_embeddings: The query embeddings.
+        :param n_results: The number of results for each query.
+        :param include_embeddings: Whether to include the (dequantized) embeddings of the results.
+        :return: The ids, metadatas and distances (and embeddings) of the results.
+        """
+        result: QueryResultType = {"ids": [], "metadatas": [], "distances": []}
+        if include_embeddings:
+            result["embeddings"] = []
+        n_results = min(n_results, len(self))
+        for query_scores in self.score(query_embeddings):
+            if n_results == 0:
+                result["ids"].append([])
+                result["metadatas"].append([])
+                result["distances"].append([])
+                if include_embeddings:
+                    result["embeddings"].append([])
+                continue
+            top_indices = np.argpartition(-query_scores, n_results - 1)[:n_results]
+            top_indices = top_indices[np.argsort(-query_scores[top_indices], kind="stable")]
+            result["ids"].append([self.ids[i] for i in top_indices])
+            result["metadatas"].append([self.metadatas[i] for i in top_indices])
+            result["distances"].append([float(1.0 - query_scores[i]) for i in top_indices])
+            if include_embeddings:
+                embeddings = np.asarray(self.matrix[top_indices], dtype=np.float32)
+                if self.scales is not None:
+                    embeddings = embeddings * self.scales[top_indices, None]
+                result["embeddings"].append(embeddings.tolist())
+        return result
@@ -0,0 +1,83 @@
+import json
+import sqlite3
+import threading
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Any
+
+NO_SPLIT_PART = -1  # Split part of documents that were not split
+
+ParentKeyType = tuple[str, int]
+
+
+def get_parent_key(document: Mapping[str, Any]) -> ParentKeyType:
+    """
+    Returns the key of the document split that a document split or chunk metadata belongs to.
+    """
+    return str(document["source_url"]), int(document.get("split_part", NO_SPLIT_PART))
+
+
+def get_parent_reference(document: Mapping[str, Any]) -> dict[str, str | int]:
+    """
+    Returns the minimal metadata referencing the document split, which is stored with each chunk instead of the split contents.
+    """
+    source_url, split_part = get_parent_key(document)
+    return {"source_url": source_url, "split_part": split_part}
+
+
+class ParentStore:
+    """
+    Stores the whole document splits (the "parents" of the embedded chunks) in SQLite, keyed by (source_url, split_part).
+    The vector indexes only hold a reference to the parent, so each split is stored once and only the unique results are loaded.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS parents (source_url TEXT NOT NULL, split_part INTEGER NOT NULL, document TEXT NOT NULL, "
+            "PRIMARY KEY (source_url, split_part))"
+        )
+
+    def write(self, documents: Iterable[Mapping[str, Any]]) -> None:
+        """
+        Replaces the contents of the store with the given document splits.
+
+        :param documents: The document splits.
+        """
+        rows = ((*get_parent_key(document), json.dumps(dict(document), ensure_ascii=False)) for document in documents)
+        with self._lock:
+            self._connection.execute("BEGIN")
+            self._connection.execute("DELETE FROM parents")
+            self._connection.executemany("INSERT OR REPLACE INTO parents (source_url, split_part, document) VALUES (?, ?, ?)", rows)
+            self._connection.execute("COMMIT")
+
+    def add(self, document: Mapping[str, Any]) -> None:
+        """
+        Adds a document split to the store (or replaces it), e.g. while the document splits are streamed during ingest.
+
+        :param document: The document split.
+        """
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO parents (source_url, split_part, document) VALUES (?, ?, ?)",
+                (*get_parent_key(document), json.dumps(dict(document), ensure_ascii=False)),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def get_many(self, keys: Sequence[ParentKeyType]) -> list[dict[str, Any]]:
+        """
+        Loads the document splits with the given keys. Missing document splits are skipped.
+
+        :param keys: The keys of the document splits.
+        :return: The document splits, in the order of the keys.
+        """
+        documents = {}
+        with self._lock:
+            for key in keys:
+                row = self._connection.execute("SELECT document FROM parents WHERE source_url = ? AND split_part = ?", key).fetchone()
+                if row is not None:
+                    documents[key] = json.loads(row[0])
+        return [documents[key] for key in keys if key in documents]
@@ -0,0 +1,93 @@
+import re
+import textwrap
+from dataclasses import dataclass
+
+from brainsoft_code_challenge.config import WEB_SEARCH_EXTRACT_ANSWER_MAX_TOKENS, WEB_SEARCH_PASSAGE_LENGTH_CHARS, WEB_SEARCH_SUMMARY_INPUT_TOKEN_BUDGET
+from brainsoft_code_challenge.constants import OMISSION_MARKER, QUERY_STOPWORDS
+from brainsoft_code_challenge.lexical_index import BM25Index, tokenize
+from brainsoft_code_challenge.tokenizer import count_tokens
+
+SENTENCE_BOUNDARY_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class PageExtract:
+    """
+    The passages of a web page that match the query, in the order of the page.
+    """
+
+    text: str
+    n_tokens: int
+    answers_query: bool  # The extract is short and contains all query terms, so it can be returned without summarization
+
+
+def split_passages(text: str, passage_length: int = WEB_SEARCH_PASSAGE_LENGTH_CHARS) -> list[str]:
+    """
+    Splits the text into passages of whole sentences, up to the passage length. Longer sentences are split between words.
+
+    :param text: The text of the page.
+    :param passage_length: The maximum length of a passage in characters.
+    :return: The passages.
+    """
+    passages: list[str] = []
+    current_passage = ""
+    for sentence in SENTENCE_BOUNDARY_PATTERN.split(text.strip()):
+        for part in textwrap.wrap(sentence, passage_length) if len(sentence) > passage_length else [sentence]:
+            if current_passage and len(current_passage) + 1 + len(part) > passage_length:
+                passages.append(current_passage)
+                current_passage = ""
+            current_passage = f"{current_passage} {part}" if current_passage else part
+    if current_passage:
+        passages.append(current_passage)
+    return passages
+
+
+def extract_passages(
+    text: str, query: str, token_budget: int = WEB_SEARCH_SUMMARY_INPUT_TOKEN_BUDGET, answer_max_tokens: int = WEB_SEARCH_EXTRACT_ANSWER_MAX_TOKENS
+) -> PageExtract:
+    """
+    Selects the passages of the page that score best against the query with BM25, up to the token budget. Pages that fit the
+    budget are kept whole, and if no passage matches the query, the beginning of the page is selected.
+
+    :param text: The text of the page.
+    :param query: The query.
+    :param token_budget: The maximum number of tokens of the extract.
+    :param answer_max_tokens: Extracts up to this length which contain all query terms are marked as answering the query.
+    :return: The extract, with the omitted parts of the page marked.
+    """
+    passages = split_passages(text)
+    if not passages:
+        return PageExtract(text="", n_tokens=0, answers_query=False)
+    query_terms = set(tokenize(query)) - QUERY_STOPWORDS
+    passage_tokens = [count_tokens(passage) for passage in passages]
+    if sum(passage_tokens) <= token_budget:
+        selected = list(range(len(passages)))
+    else:
+        index = BM25Index.from_texts(passages)
+        matches = index.rank(" ".join(query_terms), len(passages))  # Stopwords would match nearly every passage
+        ranking = [i for i, _ in matches] or list(range(len(passages)))
+        selected, n_tokens = [], 0
+        for i in ranking:
+            if n_tokens + passage_tokens[i] <= token_budget:
+                selected.append(i)
+                n_tokens += passage_tokens[i]
+            elif not matches:  # The beginning of the page is kept contiguous
+                break
+        selected = sorted(selected) or [ranking[0]]
+
+    groups: list[list[str]] = []
+    for position, i in enumerate(selected):
+        if position > 0 and i == selected[position - 1] + 1:
+            groups[-1].append(passages[i])
+        else:
+            groups.append([passages[i]])
+    excerpts = [" ".join(group) for group in groups]
+    if selected[0] > 0:
+        excerpts.insert(0, "")
+    if selected[-1] < len(passages) - 1:
+        excerpts.append("")
+    extract_text = OMISSION_MARKER.join(excerpts).strip("\n")
+
+    n_tokens = count_tokens(extract_text)
+    answers_query = n_tokens <= answer_max_tokens and bool(query_terms) and query_terms <= set(tokenize(extract_text))
+    return PageExtract(text=extract_text, n_tokens=n_tokens, answers_query=answers_query)
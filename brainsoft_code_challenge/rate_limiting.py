@@ -0,0 +1,191 @@
+import asyncio
+import contextlib
+import functools
+import heapq
+import itertools
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from enum import IntEnum
+
+from brainsoft_code_challenge.config import ADMISSION_QUEUE_MAX_SIZE, DEFAULT_OPENAI_RATE_LIMIT, OPENAI_RATE_LIMITS
+
+
+class TokenBucket:
+    """
+    A token bucket which refills continuously up to its capacity.
+    """
+
+    def __init__(self, capacity: float, refill_rate_per_second: float) -> None:
+        self.capacity = capacity
+        self.refill_rate_per_second = refill_rate_per_second
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate_per_second)
+        self.last_refill = now
+
+    def get_wait_time(self, amount: float) -> float:
+        """
+        Returns the number of seconds until the given amount of tokens is available (0 if it is available now).
+        Amounts larger than the capacity are capped, as they would never become available otherwise.
+        """
+        self.refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.refill_rate_per_second)
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+class Priority(IntEnum):
+    """
+    The priority classes of the requests, in the order they are admitted by the rate limiter.
+    """
+
+    INTERACTIVE = 0  # The agent's turns, which the user waits for
+    TOOL = 1  # LLM calls of the tools, e.g. the summaries of the web search
+    BACKGROUND = 2  # Conversation summarization and index building
+
+
+class AdmissionRejectedError(RuntimeError):
+    """
+    Raised when a request can't be admitted by the rate limiter, as the wait queue is full or the deadline would be missed.
+    """
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    wake: Callable[[], None] = field(compare=False)
+
+
+class RateLimiter:
+    """
+    Limits the number of requests and tokens per minute, in the same way as the OpenAI API rate limits. Thread-safe, and can be
+    awaited without blocking the event loop. Waiting requests are admitted by priority (then in the order of arrival), and
+    the wait queue can be bounded, so that requests fail fast rather than time out under overload.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, max_queue_size: int | None = None) -> None:
+        """
+        :param requests_per_minute: The request budget.
+        :param tokens_per_minute: The token budget.
+        :param max_queue_size: The maximum number of waiting requests (unbounded if None).
+        """
+        self._requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self._tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self.max_queue_size = max_queue_size
+        self._queue: list[_Waiter] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def n_waiting(self) -> int:
+        return len(self._queue)
+
+    def is_queue_full(self) -> bool:
+        return self.max_queue_size is not None and len(self._queue) >= self.max_queue_size
+
+    def _enqueue(self, priority: Priority, wake: Callable[[], None]) -> _Waiter:
+        with self._lock:
+            if self.is_queue_full():
+                raise AdmissionRejectedError(f"The rate limiter queue is full ({self.max_queue_size} waiting requests).")
+            waiter = _Waiter(priority, next(self._sequence), wake)
+            heapq.heappush(self._queue, waiter)
+            return waiter
+
+    def _try_admit(self, waiter: _Waiter, n_tokens: int) -> float | None:
+        """
+        Admits the waiter if it is first in the queue and the budget allows it.
+
+        :return: 0 if admitted, the time until the budget allows it if it is first in the queue, or None if it must wait for its turn.
+        """
+        with self._lock:
+            if self._queue[0] is not waiter:
+                return None
+            wait_time = max(self._requests.get_wait_time(1), self._tokens.get_wait_time(n_tokens))
+            if wait_time == 0:
+                self._requests.consume(1)
+                self._tokens.consume(n_tokens)
+                heapq.heappop(self._queue)
+                if self._queue:
+                    self._queue[0].wake()
+            return wait_time
+
+    def _dequeue(self, waiter: _Waiter) -> None:
+        """
+        Removes a waiter that gave up, and wakes the next one if it was first in the queue.
+        """
+        with self._lock:
+            if waiter not in self._queue:
+                return
+            was_first = self._queue[0] is waiter
+            self._queue.remove(waiter)
+            heapq.heapify(self._queue)
+            if was_first and self._queue:
+                self._queue[0].wake()
+
+    @staticmethod
+    def _get_timeout(wait_time: float | None, deadline: float | None) -> float | None:
+        """
+        Returns how long to wait before trying again, or raises an AdmissionRejectedError if the deadline would be missed.
+        """
+        remaining = deadline - time.monotonic() if deadline is not None else None
+        if remaining is not None and (remaining <= 0 or (wait_time is not None and wait_time > remaining)):
+            raise AdmissionRejectedError("The request could not be admitted by the rate limiter before its deadline.")
+        if wait_time is None:
+            return remaining
+        return wait_time
+
+    def acquire(self, n_tokens: int, priority: Priority = Priority.INTERACTIVE, timeout: float | None = None) -> None:
+        """
+        Blocks until a request with the given number of tokens fits into the budget and all requests with a higher priority
+        (or the same priority, which arrived earlier) are admitted, and consumes the budget.
+
+        :param n_tokens: The number of tokens in the request.
+        :param priority: The priority class of the request.
+        :param timeout: Raises an AdmissionRejectedError if the request can't be admitted within this number of seconds (or as
+            soon as it is clear that it can't). Waits indefinitely if None.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        event = threading.Event()
+        waiter = self._enqueue(priority, event.set)
+        try:
+            while (wait_time := self._try_admit(waiter, n_tokens)) != 0:
+                event.wait(self._get_timeout(wait_time, deadline))
+                event.clear()
+        except BaseException:
+            self._dequeue(waiter)
+            raise
+
+    async def aacquire(self, n_tokens: int, priority: Priority = Priority.INTERACTIVE, timeout: float | None = None) -> None:
+        """
+        Waits like acquire, without blocking the event loop.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        waiter = self._enqueue(priority, lambda: loop.call_soon_threadsafe(event.set))
+        try:
+            while (wait_time := self._try_admit(waiter, n_tokens)) != 0:
+                timeout_seconds = self._get_timeout(wait_time, deadline)
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(event.wait(), timeout_seconds)
+                event.clear()
+        except BaseException:
+            self._dequeue(waiter)
+            raise
+
+
+@functools.cache
+def get_openai_rate_limiter(model: str) -> RateLimiter:
+    """
+    Returns the rate limiter of the model, shared by all OpenAI requests of the process, with the budget from OPENAI_RATE_LIMITS.
+    """
+    requests_per_minute, tokens_per_minute = OPENAI_RATE_LIMITS.get(model, DEFAULT_OPENAI_RATE_LIMIT)
+    return RateLimiter(requests_per_minute, tokens_per_minute, max_queue_size=ADMISSION_QUEUE_MAX_SIZE)
@@ -0,0 +1,207 @@
+import datetime
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from brainsoft_code_challenge.config import (
+    SESSION_CACHE_MAX_ENTRIES,
+    SESSION_SPILL_DIR,
+    SESSION_SPILL_PURGE_INTERVAL_SECONDS,
+    SESSION_SPILL_TTL_SECONDS,
+    SESSION_TTL_SECONDS,
+)
+
+if TYPE_CHECKING:
+    from langchain.chains.conversation.memory import ConversationSummaryBufferMemory
+
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")  # Session ids are used as file names of the spilled sessions
+
+
+class InvalidSessionIdError(ValueError):
+    pass
+
+
+class SessionBusyError(RuntimeError):
+    pass
+
+
+@dataclass
+class ConversationSession:
+    """
+    The memory of a conversation kept on the server, including its running summary. The lock is held while a turn of the
+    conversation is processed, as concurrent turns would interleave in the memory.
+    """
+
+    session_id: str
+    memory: "ConversationSummaryBufferMemory"
+    started_at: datetime.datetime = field(default_factory=datetime.datetime.now)  # Rendered into the system prompt of each turn
+    last_used: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class SessionStore:
+    """
+    Keeps the conversation sessions in memory, up to a maximum number of sessions and for a limited idle time. Least recently
+    used and expired sessions are spilled to disk as JSON and restored on their next request. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        memory_factory: Callable[[str], "ConversationSummaryBufferMemory"],
+        max_sessions: int = SESSION_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = SESSION_TTL_SECONDS,
+        spill_dir: str = SESSION_SPILL_DIR,
+        spill_ttl_seconds: float = SESSION_SPILL_TTL_SECONDS,
+        spill_purge_interval_seconds: float = SESSION_SPILL_PURGE_INTERVAL_SECONDS,
+    ) -> None:
+        """
+        :param memory_factory: Creates an empty memory for the given model.
+        :param max_sessions: The maximum number of sessions kept in memory.
+        :param ttl_seconds: Sessions idle for longer are spilled to disk.
+        :param spill_dir: The directory of the spilled sessions.
+        :param spill_ttl_seconds: Spilled sessions idle for longer are deleted.
+        :param spill_purge_interval_seconds: The minimum time between the scans of the spill directory for expired sessions.
+        """
+        self.memory_factory = memory_factory
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.spill_dir = spill_dir
+        self.spill_ttl_seconds = spill_ttl_seconds
+        self.spill_purge_interval_seconds = spill_purge_interval_seconds
+        self._last_purge_time: float | None = None
+        self._sessions: OrderedDict[str, ConversationSession] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _get_spill_path(self, session_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{session_id}.json")
+
+    def _spill(self, session: ConversationSession) -> None:
+        """
+        Writes the messages and the running summary of the session to disk.
+        """
+        from langchain_core.messages import messages_to_dict
+
+        os.makedirs(self.spill_dir, exist_ok=True)
+        state = {
+            "summary": session.memory.moving_summary_buffer,
+            "messages": messages_to_dict(session.memory.chat_memory.messages),
+            "started_at": session.started_at.isoformat(),
+        }
+        path = self._get_spill_path(session.session_id)
+        with open(path + ".tmp", "w") as f:
+            f.write(json.dumps(state, ensure_ascii=False))
+        os.replace(path + ".tmp", path)
+
+    def _restore(self, session_id: str, model: str) -> ConversationSession | None:
+        from langchain_core.messages import messages_from_dict
+
+        path = self._get_spill_path(session_id)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            state = json.load(f)
+        os.remove(path)
+        memory = self.memory_factory(model)
+        memory.moving_summary_buffer = state["summary"]
+        memory.chat_memory.add_messages(messages_from_dict(state["messages"]))
+        started_at = datetime.datetime.fromisoformat(state["started_at"]) if "started_at" in state else datetime.datetime.now()
+        return ConversationSession(session_id, memory, started_at)
+
+    def _evict(self, current_session_id: str) -> None:
+        """
+        Spills the expired sessions and the least recently used sessions above the maximum number, unless they are in use.
+        """
+        now = time.monotonic()
+        for session_id, session in list(self._sessions.items()):
+            if session_id == current_session_id or session.lock.locked():
+                continue
+            if now - session.last_used > self.ttl_seconds or len(self._sessions) > self.max_sessions:
+                del self._sessions[session_id]
+                self._spill(session)
+        self._purge_spilled()
+
+    def _purge_spilled(self) -> None:
+        """
+        Deletes the expired spilled sessions. The spill directory is scanned at most once per purge interval, as the scan runs
+        under the lock of the store.
+        """
+        now = time.monotonic()
+        if self._last_purge_time is not None and now - self._last_purge_time < self.spill_purge_interval_seconds:
+            return
+        self._last_purge_time = now
+        if not os.path.isdir(self.spill_dir):
+            return
+        for file_name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, file_name)
+            if time.time() - os.path.getmtime(path) > self.spill_ttl_seconds:
+                os.remove(path)
+
+    def get_or_create(self, session_id: str, model: str) -> ConversationSession:
+        """
+        Returns the session from memory or from disk, or creates a new one.
+
+        :param session_id: The session id chosen by the client.
+        :param model: The model of the current turn (the memory token limit depends on it).
+        :return: The session.
+        """
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise InvalidSessionIdError("The session id must consist of 1 to 64 letters, digits, underscores or hyphens.")
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._restore(session_id, model)
+                if session is not None:
+                    logging.info(f"Restored the spilled session {session_id}")
+            if session is None:
+                session = ConversationSession(session_id, self.memory_factory(model))
+            session.last_used = time.monotonic()
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            self._evict(session_id)
+            return session
+
+    def acquire(self, session_id: str, model: str) -> ConversationSession:
+        """
+        Returns the session like get_or_create, locked for a turn of the conversation. The session is locked before the store
+        is unlocked, so it can't be spilled by a concurrent request in between. Raises a SessionBusyError if it is already locked.
+
+        :param session_id: The session id chosen by the client.
+        :param model: The model of the current turn.
+        :return: The locked session, which must be released after the turn.
+        """
+        with self._lock:
+            session = self.get_or_create(session_id, model)
+            if not session.lock.acquire(blocking=False):
+                raise SessionBusyError(f"Another turn of the session {session_id} is being processed.")
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Deletes the session from memory and from disk.
+
+        :return: Whether the session existed.
+        """
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise InvalidSessionIdError("The session id must consist of 1 to 64 letters, digits, underscores or hyphens.")
+        with self._lock:
+            existed = self._sessions.pop(session_id, None) is not None
+            if os.path.exists(path := self._get_spill_path(session_id)):
+                os.remove(path)
+                existed = True
+            return existed
+
+    def spill_all(self) -> None:
+        """
+        Spills all sessions to disk, e.g. on shutdown.
+        """
+        with self._lock:
+            for session in self._sessions.values():
+                self._spill(session)
+            self._sessions.clear()
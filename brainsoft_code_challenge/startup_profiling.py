@@ -0,0 +1,48 @@
+import re
+import subprocess
+import sys
+from dataclasses import dataclass
+
+IMPORT_TIME_LINE_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+@dataclass
+class ImportTiming:
+    """
+    The import time of a module as reported by -X importtime: the time of its own body, and including its imports.
+    """
+
+    module: str
+    self_seconds: float
+    cumulative_seconds: float
+    depth: int
+
+
+def profile_imports(module: str) -> list[ImportTiming]:
+    """
+    Imports the module in a fresh interpreter with -X importtime, so that no module is already imported.
+
+    :param module: The module to import, e.g. an entry point of the application.
+    :return: The import times of all modules imported (in the order they finished importing).
+    """
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True)  # noqa: S603
+    timings = []
+    for line in process.stderr.splitlines():
+        if (match := IMPORT_TIME_LINE_PATTERN.match(line)) is not None:
+            self_us, cumulative_us, indent, name = match.groups()
+            timings.append(ImportTiming(name, int(self_us) / 1e6, int(cumulative_us) / 1e6, depth=(len(indent) - 1) // 2))
+    return timings
+
+
+def get_import_time(timings: list[ImportTiming], module: str) -> float:
+    """
+    Returns the cumulative import time of a top-level module of the profile.
+    """
+    return next(timing.cumulative_seconds for timing in timings if timing.module == module and timing.depth == 0)
+
+
+def get_imported_modules(timings: list[ImportTiming], prefixes: tuple[str, ...]) -> list[str]:
+    """
+    Returns the imported modules that are (submodules of) one of the given modules.
+    """
+    return [timing.module for timing in timings if any(timing.module == prefix or timing.module.startswith(prefix + ".") for prefix in prefixes)]
@@ -27,6 +27,8 @@ from brainsoft_code_challenge.config import (
 )
 from brainsoft_code_challenge.constants import ACTION_HINTS
 from brainsoft_code_challenge.files import InputFile, UnsupportedFileTypeError, process_csv, read_pdf_file
+from brainsoft_code_challenge.http_clients import close_async_http_client
+from brainsoft_code_challenge.warmup import WarmupState, warm_up
 
 
 class StreamlitMessageData:
@@ -209,11 +211,23 @@ def __reset_chat(model: str, temperature: float, frequency_penalty: float, prese
         del st.session_state.current_response
 
 
+@st.cache_resource(show_spinner="Warming up...")
+def __warm_up() -> WarmupState:
+    """
+    Warms up the process once, shared by all sessions, before the first session can send a message.
+    """
+    return warm_up()
+
+
 def __prepare_page() -> None:
     """
-    Prepares the Streamlit page by initializing the chat and displaying the sidebar.
+    Prepares the Streamlit page by warming up the process, initializing the chat and displaying the sidebar.
     """
     st.set_page_config(layout="wide", page_title="Generative AI Python SDK Assistant")
+    warmup_state = __warm_up()
+    if warmup_state.error is not None:
+        st.error(warmup_state.error)
+        st.stop()
     __initialize_chat()
 
     with st.sidebar:
@@ -318,6 +332,8 @@ async def __process_user_input(user_input: str, attached_files: Sequence[Uploade
             if event["event"] == "on_tool_end":
                 if "query" in event["data"]["input"]:
                     query = event["data"]["input"]["query"]
+                elif "queries" in event["data"]["input"]:
+                    query = "; ".join(event["data"]["input"]["queries"])
                 elif "python_code" in event["data"]["input"]:
                     query = event["data"]["input"]["python_code"]
                 else:
@@ -350,4 +366,7 @@ async def render_streamlit_ui() -> None:
 
     attached_files_note = f" ({len(attached_files)} file{'s' if len(attached_files) != 1 else ''} attached)" if attached_files else ""
     if user_input := st.chat_input(f"How can I help you?{attached_files_note}"):
-        await __process_user_input(user_input, attached_files)
+        try:
+            await __process_user_input(user_input, attached_files)
+        finally:
+            await close_async_http_client()  # Each script run has its own event loop, which ends with the run
@@ -0,0 +1,40 @@
+import contextlib
+import time
+from collections.abc import Iterator
+
+import numpy as np
+
+
+class StageTimer:
+    """
+    Collects the durations of named stages (e.g. of a documentation search) over many runs.
+    """
+
+    def __init__(self) -> None:
+        self.durations: dict[str, list[float]] = {}
+
+    @contextlib.contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations.setdefault(stage, []).append(time.perf_counter() - start)
+
+    def get_percentiles(self, percentiles: tuple[float, ...] = (50, 90, 99)) -> dict[str, dict[str, float]]:
+        """
+        Returns the percentiles of the durations of each stage, in milliseconds.
+        """
+        return {
+            stage: {"n": len(durations), **{f"p{percentile:g}": float(np.percentile(durations, percentile)) * 1000 for percentile in percentiles}}
+            for stage, durations in self.durations.items()
+        }
+
+
+def measure(timer: StageTimer | None, stage: str) -> contextlib.AbstractContextManager[None]:
+    """
+    Measures the stage if a timer is given.
+    """
+    if timer is None:
+        return contextlib.nullcontext()
+    return timer.measure(stage)
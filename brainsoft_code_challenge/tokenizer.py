@@ -1,15 +1,23 @@
+import functools
+
 import tiktoken
 
 from brainsoft_code_challenge.constants import CONTEXT_WINDOW_SIZE_IN_TOKENS_BY_MODEL, OUTPUT_TOKEN_LIMIT, TOOLS_AND_SYSTEM_PROMPT_LENGTH_TOKENS
 
-tokenizer = tiktoken.get_encoding("cl100k_base")
+
+@functools.cache
+def get_tokenizer() -> tiktoken.Encoding:
+    """
+    Loads the tokenizer on first use rather than at import, as the encoding may need to be downloaded (see warmup).
+    """
+    return tiktoken.get_encoding("cl100k_base")
 
 
 def count_tokens(text: str) -> int:
     """
     Counts the number of tokens in the given text.
     """
-    tokens = tokenizer.encode(text, disallowed_special=())
+    tokens = get_tokenizer().encode(text, disallowed_special=())
     return len(tokens)
 
 
@@ -34,6 +42,14 @@ def get_memory_token_limit(model: str) -> int:
     return __get_universal_token_limit(model)
 
 
+def get_tool_output_token_limit(token_budget: int) -> int:
+    """
+    Get the token limit for the output of a tool. Tools don't know which model the agent uses, so the limit must fit the
+    input token limit of the model with the smallest context window.
+    """
+    return min(token_budget, *(get_input_token_limit(model) for model in CONTEXT_WINDOW_SIZE_IN_TOKENS_BY_MODEL))
+
+
 def shorten_text(text: str, token_limit: int) -> tuple[str, bool]:
     """
     Shorten the input text to fit the token limit.
@@ -42,10 +58,10 @@ def shorten_text(text: str, token_limit: int) -> tuple[str, bool]:
     :param token_limit: The token limit.
     :return: The shortened text and a boolean indicating whether the text was shortened.
     """
-    tokens = tokenizer.encode(text, disallowed_special=())
+    tokens = get_tokenizer().encode(text, disallowed_special=())
     if len(tokens) <= token_limit:
         return text, False
-    text = tokenizer.decode(tokens[:token_limit])
+    text = get_tokenizer().decode(tokens[:token_limit])
     return text, True
 
 
@@ -1,15 +1,43 @@
-from collections.abc import Sequence
-from typing import cast
+import asyncio
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, field
+from itertools import zip_longest
+from typing import Any
 
-from langchain.agents import tool
+from langchain_core.tools import StructuredTool
 from pydantic.v1 import BaseModel, Field
 
-from brainsoft_code_challenge.config import N_CHROMADB_RESULTS, N_CHROMADB_UNIQUE_RESULTS
+from brainsoft_code_challenge.config import (
+    BATCH_DOCUMENTATION_SEARCH_TOKEN_BUDGET,
+    DOCUMENTATION_SEARCH_TOKEN_BUDGET,
+    MAX_BATCH_SEARCH_QUERIES,
+    N_BATCH_SEARCH_UNIQUE_RESULTS,
+    N_CHROMADB_RESULTS,
+    N_LEXICAL_RESULTS,
+    N_PACKING_CANDIDATE_RESULTS,
+    RRF_K,
+)
+from brainsoft_code_challenge.context_packing import ChunkHit, pack_documents, rank_by_mmr
+from brainsoft_code_challenge.parent_store import ParentKeyType, get_parent_key
+from brainsoft_code_challenge.timing import StageTimer, measure
+from brainsoft_code_challenge.tokenizer import get_tool_output_token_limit
 from brainsoft_code_challenge.vector_store import MetadataType, VectorStore
 
 vector_store = VectorStore()
 
 
+@dataclass
+class SearchResult:
+    """
+    The unique document splits found for a query, with the chunks returned by the vector search and the query embedding
+    (both empty if the BM25 index answered the query alone).
+    """
+
+    ranking: list[MetadataType]
+    chunk_hits: list[ChunkHit] = field(default_factory=list)
+    query_embedding: list[float] | None = None
+
+
 def __get_unique_results(results: Sequence[MetadataType], n_results: int) -> list[MetadataType]:
     """
     Documentation documents are split into smaller "splits", which are split into "chunks". Embeddings are calculated chunk-wise,
@@ -37,24 +65,184 @@ def __get_unique_results(results: Sequence[MetadataType], n_results: int) -> lis
     return unique_results
 
 
+def __fuse_rankings(rankings: Sequence[Sequence[MetadataType]], n_results: int) -> list[MetadataType]:
+    """
+    Fuses rankings of unique document splits (e.g. from the vector search and from the BM25 index) using reciprocal rank fusion.
+
+    :param rankings: The rankings to fuse, each without duplicate document splits.
+    :param n_results: The number of results to return.
+    :return: The fused ranking.
+    """
+    scores: dict[ParentKeyType, float] = {}
+    results: dict[ParentKeyType, MetadataType] = {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking):
+            key = get_parent_key(result)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            results.setdefault(key, result)
+    fused_keys = sorted(scores, key=lambda key: scores[key], reverse=True)[:n_results]
+    return [results[key] for key in fused_keys]
+
+
+def __format_results(result: SearchResult, token_budget: int, timer: StageTimer | None = None) -> str:
+    """
+    Loads the document splits referenced by the search result from the parent store, ranks them by maximal marginal relevance
+    and packs them into the token budget, and formats them as the tool output for the agent.
+    """
+    with measure(timer, "packing"):
+        ranking = result.ranking
+        if result.query_embedding is not None:
+            ranking = rank_by_mmr(ranking, result.chunk_hits, result.query_embedding)
+        documents: list[Mapping[str, Any]] = vector_store.get_parent_store().get_many([get_parent_key(result) for result in ranking])
+        packed_documents = pack_documents(documents, result.chunk_hits, get_tool_output_token_limit(token_budget))
+    with measure(timer, "formatting"):
+        if not packed_documents:
+            return "No results found."
+        outputs = []
+        for packed_document in packed_documents:
+            output = f"Documentation page URL: {packed_document.document['documentation_url']}"
+            output += " (excerpts, [...] marks omitted parts)\n" if packed_document.is_trimmed else "\n"
+            output += packed_document.content
+            outputs.append(output)
+        return "\n\n========================================\n\n".join(outputs)
+
+
+def __search_lexical(queries: Sequence[str], n_results: int, timer: StageTimer | None) -> tuple[list[SearchResult | None], list[list[MetadataType]]]:
+    """
+    Searches the BM25 index for each of the queries.
+
+    :return: The results of the queries that the BM25 index answers confidently (None for the rest), and the BM25 rankings.
+    """
+    results: list[SearchResult | None] = [None] * len(queries)
+    lexical_rankings: list[list[MetadataType]] = [[] for _ in queries]
+    if (lexical_index := vector_store.get_lexical_index()) is not None:
+        with measure(timer, "lexical"):
+            for i, query in enumerate(queries):
+                scored_lexical_results = lexical_index.search(query, n_results=N_LEXICAL_RESULTS)
+                lexical_rankings[i] = [result for result, _ in scored_lexical_results]
+                if lexical_index.is_confident_match(query, scored_lexical_results):
+                    # Identifier queries that the BM25 index answers confidently don't need the embedding round trip
+                    results[i] = SearchResult(lexical_rankings[i][:n_results])
+    return results, lexical_rankings
+
+
+def __search_vectors(
+    vector_search_indices: Sequence[int],
+    query_embeddings: Sequence[Sequence[float]],
+    results: list[SearchResult | None],
+    lexical_rankings: Sequence[Sequence[MetadataType]],
+    n_results: int,
+    timer: StageTimer | None,
+) -> list[SearchResult]:
+    """
+    Looks up the embedded queries in a single vector index query and fuses the results with the BM25 rankings.
+
+    :return: The results of all queries.
+    """
+    with measure(timer, "vector_query"):
+        # The chunk embeddings are returned for the maximal marginal relevance ranking
+        query_result = vector_store.query(query_embeddings, n_results=N_CHROMADB_RESULTS, include_embeddings=True)
+        metadatas = query_result["metadatas"] or [[] for _ in vector_search_indices]
+        distances = query_result["distances"] or [[] for _ in vector_search_indices]
+        embeddings = query_result.get("embeddings") or [[] for _ in vector_search_indices]
+    with measure(timer, "dedup"):
+        for j, i in enumerate(vector_search_indices):
+            vector_results = metadatas[j]
+            if lexical_rankings[i]:
+                ranking = __fuse_rankings([__get_unique_results(vector_results, n_results=N_CHROMADB_RESULTS), lexical_rankings[i]], n_results=n_results)
+            else:
+                ranking = __get_unique_results(vector_results, n_results=n_results)
+            chunk_hits = [
+                ChunkHit(metadata, 1.0 - distance, embedding)
+                for metadata, distance, embedding in zip_longest(vector_results, distances[j], embeddings[j])
+                if metadata is not None
+            ]
+            results[i] = SearchResult(ranking, chunk_hits, list(query_embeddings[j]))
+    return [result or SearchResult([]) for result in results]
+
+
+def __search(queries: Sequence[str], n_results: int, timer: StageTimer | None = None) -> list[SearchResult]:
+    """
+    Searches the documentation for each of the queries. Queries that the BM25 index answers confidently are not embedded,
+    the rest is embedded in a single request and looked up in a single vector index query.
+
+    :param queries: The queries.
+    :param n_results: The number of unique document splits to return for each query.
+    :param timer: Measures the durations of the search stages (e.g. in benchmarks).
+    :return: The references to the unique document splits found for each query, with the chunks found by the vector search.
+    """
+    results, lexical_rankings = __search_lexical(queries, n_results, timer)
+    vector_search_indices = [i for i, result in enumerate(results) if result is None]
+    if not vector_search_indices:
+        return [result or SearchResult([]) for result in results]
+    with measure(timer, "embedding"):
+        query_embeddings = vector_store.embed_queries([queries[i] for i in vector_search_indices])
+    return __search_vectors(vector_search_indices, query_embeddings, results, lexical_rankings, n_results, timer)
+
+
+async def __asearch(queries: Sequence[str], n_results: int) -> list[SearchResult]:
+    """
+    Searches the documentation like __search, but awaits the embedding request. The local index lookups run in a worker thread,
+    so that the event loop is not blocked.
+    """
+    results, lexical_rankings = await asyncio.to_thread(__search_lexical, queries, n_results, None)
+    vector_search_indices = [i for i, result in enumerate(results) if result is None]
+    if not vector_search_indices:
+        return [result or SearchResult([]) for result in results]
+    query_embeddings = await vector_store.aembed_queries([queries[i] for i in vector_search_indices])
+    return await asyncio.to_thread(__search_vectors, vector_search_indices, query_embeddings, results, lexical_rankings, n_results, None)
+
+
 class DocumentationQuery(BaseModel):
     query: str = Field(description="The query to execute")
 
 
-@tool(args_schema=DocumentationQuery)
-def search_documentation(query: str) -> str:
-    """Searches the documentation (development version) using a natural language query."""  # Tool description for agent
-    query_embeddings = cast(list[Sequence[float]], vector_store.get_embedder().embed_documents([query]))
-    metadatas = vector_store.get_chromadb_collection().query(query_embeddings=query_embeddings, n_results=N_CHROMADB_RESULTS, include=["metadatas"])[
-        "metadatas"
-    ]  # noqa: E501
-    if not metadatas:
-        return "No results found."
-    results = metadatas[0]
-    results = __get_unique_results(results, n_results=N_CHROMADB_UNIQUE_RESULTS)
-    outputs = []
-    for result in results:
-        output = f"Documentation page URL: {result['documentation_url']}\n"
-        output += str(result["content"])
-        outputs.append(output)
-    return "\n\n========================================\n\n".join(outputs)
+def __search_documentation(query: str) -> str:
+    return __format_results(__search([query], n_results=N_PACKING_CANDIDATE_RESULTS)[0], token_budget=DOCUMENTATION_SEARCH_TOKEN_BUDGET)
+
+
+async def __asearch_documentation(query: str) -> str:
+    search_results = await __asearch([query], n_results=N_PACKING_CANDIDATE_RESULTS)
+    return await asyncio.to_thread(__format_results, search_results[0], DOCUMENTATION_SEARCH_TOKEN_BUDGET)
+
+
+search_documentation = StructuredTool.from_function(
+    func=__search_documentation,
+    coroutine=__asearch_documentation,
+    name="search_documentation",
+    description="Searches the documentation (development version) using a natural language query.",  # Tool description for agent
+    args_schema=DocumentationQuery,
+)
+
+
+class DocumentationBatchQuery(BaseModel):
+    queries: list[str] = Field(description="The queries to execute", min_items=1, max_items=MAX_BATCH_SEARCH_QUERIES)
+
+
+def __merge_batch_results(search_results: Sequence[SearchResult]) -> SearchResult:
+    # The best results of all queries go first, so that each query is represented if the number of results or tokens is limited
+    interleaved_results = [result for results in zip_longest(*(result.ranking for result in search_results)) for result in results if result is not None]
+    chunk_hits = [chunk_hit for result in search_results for chunk_hit in result.chunk_hits]
+    return SearchResult(__get_unique_results(interleaved_results, n_results=N_BATCH_SEARCH_UNIQUE_RESULTS), chunk_hits)
+
+
+def __search_documentation_batch(queries: list[str]) -> str:
+    batch_result = __merge_batch_results(__search(queries, n_results=N_PACKING_CANDIDATE_RESULTS))
+    return __format_results(batch_result, token_budget=BATCH_DOCUMENTATION_SEARCH_TOKEN_BUDGET)
+
+
+async def __asearch_documentation_batch(queries: list[str]) -> str:
+    batch_result = __merge_batch_results(await __asearch(queries, n_results=N_PACKING_CANDIDATE_RESULTS))
+    return await asyncio.to_thread(__format_results, batch_result, BATCH_DOCUMENTATION_SEARCH_TOKEN_BUDGET)
+
+
+search_documentation_batch = StructuredTool.from_function(
+    func=__search_documentation_batch,
+    coroutine=__asearch_documentation_batch,
+    name="search_documentation_batch",
+    description=(  # Tool description for agent
+        "Searches the documentation (development version) using several natural language queries at once, e.g. for different aspects of a question. "
+        "Each document is returned only once."
+    ),
+    args_schema=DocumentationBatchQuery,
+)
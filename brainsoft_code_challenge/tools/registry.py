@@ -0,0 +1,73 @@
+import threading
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
+
+
+class ToolRegistry:
+    """
+    Holds a factory for each agent tool, which imports and constructs the tool when it is first requested (when the agent
+    binds it). Importing the tool modules pulls in LangChain, the API clients and the vector store, so that would slow down
+    the startup of every process that imports the agent. Thread-safe, each tool is constructed once per process.
+    """
+
+    def __init__(self) -> None:
+        self._factories: dict[str, Callable[[], "BaseTool"]] = {}
+        self._tools: dict[str, "BaseTool"] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], "BaseTool"]) -> None:
+        """
+        :param name: The name of the tool, as seen by the agent.
+        :param factory: Imports and constructs the tool.
+        """
+        self._factories[name] = factory
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._factories)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._tools
+
+    def get(self, name: str) -> "BaseTool":
+        with self._lock:
+            if name not in self._tools:
+                self._tools[name] = self._factories[name]()
+            return self._tools[name]
+
+    def get_all(self) -> list["BaseTool"]:
+        return [self.get(name) for name in self._factories]
+
+
+def __load_search_documentation() -> "BaseTool":
+    from brainsoft_code_challenge.tools.documentation_search import search_documentation
+
+    return search_documentation
+
+
+def __load_search_documentation_batch() -> "BaseTool":
+    from brainsoft_code_challenge.tools.documentation_search import search_documentation_batch
+
+    return search_documentation_batch
+
+
+def __load_search_google() -> "BaseTool":
+    from brainsoft_code_challenge.tools.web_search import search_google
+
+    return search_google
+
+
+def __load_code_interpreter() -> "BaseTool":
+    from brainsoft_code_challenge.tools.code_interpreter import get_code_interpreter_tool
+
+    return get_code_interpreter_tool()  # type: ignore
+
+
+tool_registry = ToolRegistry()
+tool_registry.register("search_documentation", __load_search_documentation)
+tool_registry.register("search_documentation_batch", __load_search_documentation_batch)
+tool_registry.register("search_google", __load_search_google)
+tool_registry.register("bearly_interpreter", __load_code_interpreter)
@@ -1,28 +1,61 @@
-from collections.abc import Mapping
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Mapping
 from typing import Any
 
-import requests
-from bs4 import BeautifulSoup
-from langchain.agents import tool
 from langchain.schema.output_parser import StrOutputParser
 from langchain.schema.runnable import RunnablePassthrough
 from langchain_community.utilities import GoogleSerperAPIWrapper
+from langchain_core.callbacks import Callbacks
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableSerializable
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableBranch, RunnableLambda, RunnableSerializable
+from langchain_core.tools import StructuredTool
 from pydantic.v1 import BaseModel, Field
 
 from brainsoft_code_challenge.config import (
+    HTTP_TIMEOUT_SECONDS,
     N_WEB_SEARCH_RESULTS,
+    WEB_SEARCH_DEADLINE_SECONDS,
     WEB_SEARCH_MODEL,
     WEB_SEARCH_MODEL_KWARGS,
-    WEB_SEARCH_SCRAPING_MAX_RESULT_LENGTH,
+    WEB_SEARCH_SCRAPING_MAX_BYTES,
     WEB_SEARCH_SCRAPING_TIMEOUT_SECONDS,
     WEB_SEARCH_SUMMARIZE_MAX_TOKENS,
     WEB_SEARCH_TEMPERATURE,
 )
+from brainsoft_code_challenge.constants import WEB_SEARCH_RESULT_RUN_NAME, WEB_SEARCH_SCRAPING_CHUNK_SIZE
+from brainsoft_code_challenge.html_extraction import PLAIN_TEXT_CONTENT_TYPE, decode_body, extract_main_text, get_media_type, is_supported_content_type
+from brainsoft_code_challenge.http_clients import get_async_http_client, get_http_client
+from brainsoft_code_challenge.llm import RateLimitedChatOpenAI
+from brainsoft_code_challenge.passage_extraction import PageExtract, extract_passages
+from brainsoft_code_challenge.rate_limiting import Priority
+from brainsoft_code_challenge.web_cache import CachedPage, normalize_search_query, page_text_cache, search_results_cache
 
-search = GoogleSerperAPIWrapper()
+
+class PooledGoogleSerperAPIWrapper(GoogleSerperAPIWrapper):
+    """
+    GoogleSerperAPIWrapper which sends the requests through the shared HTTP clients, so that the connection to Serper is kept alive.
+    """
+
+    def _get_request(self, search_term: str, search_type: str, **kwargs: Any) -> tuple[str, dict[str, str], dict[str, Any]]:
+        headers = {"X-API-KEY": self.serper_api_key or "", "Content-Type": "application/json"}
+        params = {"q": search_term, **{key: value for key, value in kwargs.items() if value is not None}}
+        return f"https://google.serper.dev/{search_type}", headers, params
+
+    def _google_serper_api_results(self, search_term: str, search_type: str = "search", **kwargs: Any) -> dict[str, Any]:
+        url, headers, params = self._get_request(search_term, search_type, **kwargs)
+        response = get_http_client().post(url, headers=headers, params=params, timeout=HTTP_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        return response.json()  # type: ignore
+
+    async def _async_google_serper_search_results(self, search_term: str, search_type: str = "search", **kwargs: Any) -> dict[str, Any]:
+        url, headers, params = self._get_request(search_term, search_type, **kwargs)
+        response = await get_async_http_client().post(url, headers=headers, params=params)
+        response.raise_for_status()
+        return response.json()  # type: ignore
+
+
+search = PooledGoogleSerperAPIWrapper()
 
 
 SUMMARY_TEMPLATE = """{text}
@@ -40,63 +73,232 @@ SUMMARY_PROMPT = ChatPromptTemplate.from_template(SUMMARY_TEMPLATE)
 
 def __serp_api_search(query: str, num_results: int) -> list[str]:
     """
-    Search Google using SerpAPI.
+    Search Google using SerpAPI. The results are cached by the normalized query.
 
     :param query: The query to search.
     :param num_results: The number of results to return.
     :return: The top URLs from the search.
     """
-    results = search.results(query)["organic"][:num_results]
-    return [r["link"] for r in results]
+    key = normalize_search_query(query)
+    if (results := search_results_cache.get(key)) is None:
+        results = search.results(query)
+        search_results_cache.put(key, results)
+    return [r["link"] for r in results["organic"][:num_results]]
+
+
+async def __aserp_api_search(query: str, num_results: int) -> list[str]:
+    key = normalize_search_query(query)
+    if (results := search_results_cache.get(key)) is None:
+        results = await search.aresults(query)
+        search_results_cache.put(key, results)
+    return [r["link"] for r in results["organic"][:num_results]]
+
+
+def __extract_text(body: bytes, content_type: str | None) -> str:
+    text = decode_body(body, content_type)
+    if get_media_type(content_type) == PLAIN_TEXT_CONTENT_TYPE:
+        return " ".join(text.split())
+    return extract_main_text(text)
+
+
+def __cache_page_text(url: str, response_headers: Mapping[str, str], text: str) -> None:
+    page_text_cache.put(url, CachedPage(text, etag=response_headers.get("ETag"), last_modified=response_headers.get("Last-Modified")))
 
 
 def __scrape_text(url: str) -> str:
     """
-    Function to scrape text from a webpage.
+    Function to scrape text from a webpage. The body is streamed and the download stops after WEB_SEARCH_SCRAPING_MAX_BYTES,
+    responses that are not HTML or plain text are not downloaded at all. The text is cached by the URL, and an expired page is
+    requested conditionally, so an unchanged page is neither downloaded nor parsed again.
     """
+    if (cached_page := page_text_cache.get(url)) is not None:
+        return cached_page.text
+    expired_page = page_text_cache.get_expired(url)
     try:
-        response = requests.get(url, timeout=WEB_SEARCH_SCRAPING_TIMEOUT_SECONDS)
-        if response.status_code != 200:  # noqa: PLR2004
-            return f"Failed to retrieve the webpage: Status code {response.status_code}"
-        soup = BeautifulSoup(response.text, "html.parser")
-        return soup.get_text(separator=" ", strip=True)  # type: ignore
+        headers = expired_page.get_conditional_headers() if expired_page is not None else None
+        request_stream = get_http_client().stream("GET", url, headers=headers, timeout=WEB_SEARCH_SCRAPING_TIMEOUT_SECONDS, follow_redirects=True)
+        with request_stream as response:
+            if response.status_code == 304 and expired_page is not None:  # noqa: PLR2004
+                page_text_cache.refresh(url, expired_page)
+                return expired_page.text
+            if response.status_code != 200:  # noqa: PLR2004
+                return f"Failed to retrieve the webpage: Status code {response.status_code}"
+            content_type = response.headers.get("Content-Type")
+            if not is_supported_content_type(content_type):
+                return f"Failed to retrieve the webpage: Unsupported content type {get_media_type(content_type)}"
+            body = bytearray()
+            for chunk in response.iter_bytes(chunk_size=WEB_SEARCH_SCRAPING_CHUNK_SIZE):
+                body += chunk
+                if len(body) >= WEB_SEARCH_SCRAPING_MAX_BYTES:
+                    break
+        text = __extract_text(bytes(body[:WEB_SEARCH_SCRAPING_MAX_BYTES]), content_type)
+        __cache_page_text(url, response.headers, text)
+        return text
     except Exception as e:
         return f"Failed to retrieve the webpage: {e}"
 
 
-def build_web_search_chain(model: str, temperature: float, model_kwargs: Mapping[str, Any]) -> RunnableSerializable:  # type: ignore
+async def __ascrape_text(url: str) -> str:
     """
-    Builds a LangChain chain that searches Google and summarizes the top result pages.
+    Scrapes the text from a webpage like __scrape_text, without blocking the event loop (the HTML is parsed in a worker thread).
+    """
+    if (cached_page := page_text_cache.get(url)) is not None:
+        return cached_page.text
+    expired_page = page_text_cache.get_expired(url)
+    try:
+        headers = expired_page.get_conditional_headers() if expired_page is not None else None
+        request_stream = get_async_http_client().stream("GET", url, headers=headers, timeout=WEB_SEARCH_SCRAPING_TIMEOUT_SECONDS, follow_redirects=True)
+        async with request_stream as response:
+            if response.status_code == 304 and expired_page is not None:  # noqa: PLR2004
+                page_text_cache.refresh(url, expired_page)
+                return expired_page.text
+            if response.status_code != 200:  # noqa: PLR2004
+                return f"Failed to retrieve the webpage: Status code {response.status_code}"
+            content_type = response.headers.get("Content-Type")
+            if not is_supported_content_type(content_type):
+                return f"Failed to retrieve the webpage: Unsupported content type {get_media_type(content_type)}"
+            body = bytearray()
+            async for chunk in response.aiter_bytes(chunk_size=WEB_SEARCH_SCRAPING_CHUNK_SIZE):
+                body += chunk
+                if len(body) >= WEB_SEARCH_SCRAPING_MAX_BYTES:
+                    break
+        text = await asyncio.to_thread(__extract_text, bytes(body[:WEB_SEARCH_SCRAPING_MAX_BYTES]), content_type)
+        __cache_page_text(url, response.headers, text)
+        return text
+    except Exception as e:
+        return f"Failed to retrieve the webpage: {e}"
+
+
+def __get_urls(x: Mapping[str, Any]) -> list[str]:
+    return __serp_api_search(x["query"], N_WEB_SEARCH_RESULTS)
+
+
+async def __aget_urls(x: Mapping[str, Any]) -> list[str]:
+    return await __aserp_api_search(x["query"], N_WEB_SEARCH_RESULTS)
+
+
+def __get_page_text(x: Mapping[str, Any]) -> str:
+    return __scrape_text(x["url"])  # Not truncated, the passages are selected from the whole text
+
+
+async def __aget_page_text(x: Mapping[str, Any]) -> str:
+    return await __ascrape_text(x["url"])
+
+
+def __get_page_extract(x: Mapping[str, Any]) -> PageExtract:
+    return extract_passages(x["text"], x["query"])
+
+
+def build_page_summary_chain(model: str, temperature: float, model_kwargs: Mapping[str, Any]) -> RunnableSerializable:  # type: ignore
+    """
+    Builds a LangChain chain that scrapes and summarizes a single page, from a mapping with the query and the URL. Only the
+    passages of the page that match the query are summarized, and if they already answer it, they are returned without a summary.
 
     :param model: The OpenAI model to use.
     :param temperature: The temperature to use for the model.
     :param model_kwargs: The model kwargs.
-    :return: The LangChain chain.
+    :return: The LangChain chain, which outputs the URL and the summary (or the extract).
     """
-    scrape_and_summarize_chain = RunnablePassthrough.assign(
-        summary=RunnablePassthrough.assign(text=lambda x: __scrape_text(x["url"])[:WEB_SEARCH_SCRAPING_MAX_RESULT_LENGTH])
+    summarize_chain = (
+        (lambda x: {"query": x["query"], "text": x["extract"].text})
         | SUMMARY_PROMPT
-        | ChatOpenAI(model=model, max_tokens=WEB_SEARCH_SUMMARIZE_MAX_TOKENS, temperature=temperature, model_kwargs=dict(model_kwargs))
+        | RateLimitedChatOpenAI(
+            model=model, max_tokens=WEB_SEARCH_SUMMARIZE_MAX_TOKENS, temperature=temperature, model_kwargs=dict(model_kwargs), priority=Priority.TOOL
+        )
         | StrOutputParser()
-    ) | (lambda x: f"URL: {x['url']}\nSUMMARY: {x['summary']}")
+    )
+    return (
+        RunnablePassthrough.assign(text=RunnableLambda(__get_page_text, afunc=__aget_page_text))
+        | RunnablePassthrough.assign(extract=__get_page_extract)
+        | RunnableBranch(
+            (lambda x: x["extract"].answers_query, lambda x: f"URL: {x['url']}\nEXTRACT: {x['extract'].text}"),
+            RunnablePassthrough.assign(summary=summarize_chain) | (lambda x: f"URL: {x['url']}\nSUMMARY: {x['summary']}"),
+        )
+    ).with_config(run_name=WEB_SEARCH_RESULT_RUN_NAME)
 
+
+def build_web_search_chain(page_summary_chain: RunnableSerializable) -> RunnableSerializable:  # type: ignore
+    """
+    Builds a LangChain chain that searches Google and summarizes the top result pages.
+
+    :param page_summary_chain: The chain that scrapes and summarizes a single page.
+    :return: The LangChain chain.
+    """
     return (
-        RunnablePassthrough.assign(urls=lambda x: __serp_api_search(x["query"], N_WEB_SEARCH_RESULTS))
+        RunnablePassthrough.assign(urls=RunnableLambda(__get_urls, afunc=__aget_urls))
         | (lambda x: [{"query": x["query"], "url": url} for url in x["urls"]])
-        | scrape_and_summarize_chain.map()
+        | page_summary_chain.map()
         | (lambda x: "\n\n".join(x))
     )
 
 
-web_search_chain = build_web_search_chain(WEB_SEARCH_MODEL, WEB_SEARCH_TEMPERATURE, WEB_SEARCH_MODEL_KWARGS)
+page_summary_chain = build_page_summary_chain(WEB_SEARCH_MODEL, WEB_SEARCH_TEMPERATURE, WEB_SEARCH_MODEL_KWARGS)
+web_search_chain = build_web_search_chain(page_summary_chain)
+
+
+async def astream_web_search(
+    query: str,
+    page_summary_chain: RunnableSerializable = page_summary_chain,  # type: ignore
+    deadline_seconds: float = WEB_SEARCH_DEADLINE_SECONDS,
+    callbacks: Callbacks = None,
+) -> AsyncIterator[str]:
+    """
+    Searches Google and scrapes and summarizes the top result pages concurrently, yielding the summaries as they are ready.
+    When the deadline passes, the pages still in progress are cancelled and the iteration stops. Pages whose summarization
+    failed are skipped, unless all of them failed.
+
+    :param query: The query to search.
+    :param page_summary_chain: The chain that scrapes and summarizes a single page.
+    :param deadline_seconds: The time limit of the whole search, including the Google search.
+    :param callbacks: The callbacks of the summarization runs (e.g. of the tool run).
+    :return: The summaries in the order of completion.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + deadline_seconds
+    try:
+        urls = await asyncio.wait_for(__aserp_api_search(query, N_WEB_SEARCH_RESULTS), timeout=deadline_seconds)
+    except TimeoutError:
+        logging.warning(f"The Google search of {query!r} did not finish within {deadline_seconds} s")
+        return
+
+    tasks = [asyncio.create_task(page_summary_chain.ainvoke({"query": query, "url": url}, {"callbacks": callbacks})) for url in urls]
+    errors: list[Exception] = []
+    try:
+        for next_summary in asyncio.as_completed(tasks, timeout=max(deadline - loop.time(), 0)):
+            try:
+                yield await next_summary
+            except TimeoutError:
+                logging.warning(f"{sum(not task.done() for task in tasks)} web search results of {query!r} were not ready within {deadline_seconds} s")
+                break
+            except Exception as e:
+                logging.warning(f"A web search result of {query!r} could not be summarized: {e}")
+                errors.append(e)
+        if tasks and len(errors) == len(tasks):
+            raise errors[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 
 class GoogleQuery(BaseModel):
     query: str = Field(description="The query to execute")
 
 
-@tool(args_schema=GoogleQuery)
-def search_google(query: str) -> str:
-    """Searches Google and returns the summaries of the most relevant results."""  # Tool description for agent
+def __search_google(query: str) -> str:
     result = web_search_chain.invoke({"query": query})
     return str(result)
+
+
+async def __asearch_google(query: str, callbacks: Callbacks = None) -> str:
+    summaries = [summary async for summary in astream_web_search(query, callbacks=callbacks)]
+    return "\n\n".join(summaries) if summaries else "No web search results could be retrieved."
+
+
+search_google = StructuredTool.from_function(
+    func=__search_google,
+    coroutine=__asearch_google,
+    name="search_google",
+    description="Searches Google and returns the summaries of the most relevant results.",  # Tool description for agent
+    args_schema=GoogleQuery,
+)
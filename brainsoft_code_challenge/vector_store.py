@@ -1,27 +1,157 @@
-from collections.abc import Mapping
+import asyncio
+import os
+from collections.abc import Mapping, Sequence
+from typing import Any, cast
 
 import chromadb
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
+
+from brainsoft_code_challenge.config import (
+    CHROMADB_PATH,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_PATH,
+    LEXICAL_INDEX_PATH,
+    NUMPY_INDEX_PATH,
+    PARENT_STORE_PATH,
+    VECTOR_STORE_BACKEND,
+    VECTOR_STORE_BACKENDS,
+)
+from brainsoft_code_challenge.embedders import get_embedder
+from brainsoft_code_challenge.embedding_cache import EmbeddingCache
+from brainsoft_code_challenge.embedding_profile import EmbeddingProfile
+from brainsoft_code_challenge.lexical_index import BM25Index
+from brainsoft_code_challenge.numpy_index import NumpyVectorIndex, QueryResultType
+from brainsoft_code_challenge.parent_store import ParentStore
 
 MetadataType = Mapping[str, str | int | float | bool]
 
 
 class VectorStore:
     """
-    A class to manage the embeddings and the vector database.
+    A class to manage the embeddings, the vector database, the lexical (BM25) index and the store of the whole document splits.
+    The vector indexes are only used if they were built with the configured embedding profile.
     """
 
-    def __init__(self) -> None:
-        self._embedder: OpenAIEmbeddings | None = None
+    def __init__(
+        self,
+        backend: str = VECTOR_STORE_BACKEND,
+        profile: EmbeddingProfile | None = None,
+        index_dir: str | None = None,
+        embedding_cache_path: str | None = EMBEDDING_CACHE_PATH,
+    ) -> None:
+        """
+        :param backend: The vector index backend used for queries.
+        :param profile: The embedding profile, by default from the configuration.
+        :param index_dir: A directory with the indexes (e.g. built for a benchmark), by default the configured paths are used.
+        :param embedding_cache_path: The path to the query embedding cache, or None to disable caching.
+        """
+        if backend not in VECTOR_STORE_BACKENDS:
+            raise ValueError(f"Vector store backend must be one of {VECTOR_STORE_BACKENDS}")
+        self.backend = backend
+        self.profile = profile or EmbeddingProfile()
+        self.chromadb_path = CHROMADB_PATH if index_dir is None else os.path.join(index_dir, os.path.basename(CHROMADB_PATH))
+        self.numpy_index_path = NUMPY_INDEX_PATH if index_dir is None else os.path.join(index_dir, os.path.basename(NUMPY_INDEX_PATH))
+        self.lexical_index_path = LEXICAL_INDEX_PATH if index_dir is None else os.path.join(index_dir, os.path.basename(LEXICAL_INDEX_PATH))
+        self.parent_store_path = PARENT_STORE_PATH if index_dir is None else os.path.join(index_dir, os.path.basename(PARENT_STORE_PATH))
+        self.embedding_cache_path = embedding_cache_path
+        self._embedder: Embeddings | None = None
         self._chromadb_collection: chromadb.Collection | None = None
+        self._numpy_index: NumpyVectorIndex | None = None
+        self._lexical_index: BM25Index | None = None
+        self._embedding_cache: EmbeddingCache | None = None
+        self._parent_store: ParentStore | None = None
 
-    def get_embedder(self) -> OpenAIEmbeddings:
+    def get_embedder(self) -> Embeddings:
         if self._embedder is None:
-            self._embedder = OpenAIEmbeddings(model="text-embedding-3-large")
+            self._embedder = get_embedder(self.profile)
         return self._embedder
 
+    def get_embedding_cache(self) -> EmbeddingCache | None:
+        """
+        Returns the query embedding cache, or None if caching is disabled.
+        """
+        if self._embedding_cache is None and self.embedding_cache_path is not None:
+            self._embedding_cache = EmbeddingCache(self.embedding_cache_path, max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+        return self._embedding_cache
+
+    def _get_cached_embeddings(self, queries: Sequence[str]) -> list[Sequence[float] | None]:
+        cache = self.get_embedding_cache()
+        return [cache.get(query, self.profile.name) if cache is not None else None for query in queries]
+
+    def _add_new_embeddings(
+        self, queries: Sequence[str], embeddings: list[Sequence[float] | None], missing_indices: Sequence[int], new_embeddings: Sequence[Sequence[float]]
+    ) -> list[Sequence[float]]:
+        cache = self.get_embedding_cache()
+        for i, embedding in zip(missing_indices, new_embeddings, strict=True):
+            embeddings[i] = embedding
+            if cache is not None:
+                cache.put(queries[i], self.profile.name, embedding)
+        return cast(list[Sequence[float]], embeddings)
+
+    def embed_queries(self, queries: Sequence[str]) -> list[Sequence[float]]:
+        """
+        Embeds the queries, using the cache where possible. All cache misses are embedded with a single request.
+
+        :param queries: The queries to embed.
+        :return: The query embeddings.
+        """
+        embeddings = self._get_cached_embeddings(queries)
+        missing_indices = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        new_embeddings = self.get_embedder().embed_documents([queries[i] for i in missing_indices]) if missing_indices else []
+        return self._add_new_embeddings(queries, embeddings, missing_indices, new_embeddings)
+
+    async def aembed_queries(self, queries: Sequence[str]) -> list[Sequence[float]]:
+        """
+        Embeds the queries like embed_queries, but awaits the embedding request (local models run in the default executor). The
+        SQLite cache is read and written in worker threads, so that the disk I/O doesn't block the event loop.
+
+        :param queries: The queries to embed.
+        :return: The query embeddings.
+        """
+        embeddings = await asyncio.to_thread(self._get_cached_embeddings, queries)
+        missing_indices = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        new_embeddings = await self.get_embedder().aembed_documents([queries[i] for i in missing_indices]) if missing_indices else []
+        return await asyncio.to_thread(self._add_new_embeddings, queries, embeddings, missing_indices, new_embeddings)
+
     def get_chromadb_collection(self) -> chromadb.Collection:
         if self._chromadb_collection is None:
-            chroma_client = chromadb.PersistentClient(path="../chromadb")
-            self._chromadb_collection = chroma_client.get_collection(name="documentation")
+            chroma_client = chromadb.PersistentClient(path=self.chromadb_path)
+            collection = chroma_client.get_collection(name="documentation")
+            self.profile.check_compatible(collection.metadata, "chromadb")
+            self._chromadb_collection = collection
         return self._chromadb_collection
+
+    def get_numpy_index(self) -> NumpyVectorIndex:
+        if self._numpy_index is None:
+            numpy_index = NumpyVectorIndex(self.numpy_index_path)
+            self.profile.check_compatible(numpy_index.metadata, "numpy")
+            self._numpy_index = numpy_index
+        return self._numpy_index
+
+    def get_lexical_index(self) -> BM25Index | None:
+        """
+        Returns the BM25 index, or None if it has not been built.
+        """
+        if self._lexical_index is None and os.path.exists(self.lexical_index_path):
+            self._lexical_index = BM25Index.load(self.lexical_index_path)
+        return self._lexical_index
+
+    def get_parent_store(self) -> ParentStore:
+        if self._parent_store is None:
+            self._parent_store = ParentStore(self.parent_store_path)
+        return self._parent_store
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int, include_embeddings: bool = False) -> QueryResultType:
+        """
+        Queries the configured backend for the nearest chunks.
+
+        :param query_embeddings: The query embeddings.
+        :param n_results: The number of results for each query.
+        :param include_embeddings: Whether to include the embeddings of the results.
+        :return: The ids, metadatas and distances (and embeddings) of the results (in the format of a ChromaDB query result).
+        """
+        if self.backend == "numpy":
+            return self.get_numpy_index().query(query_embeddings, n_results, include_embeddings=include_embeddings)
+        include = ["metadatas", "distances", "embeddings"] if include_embeddings else ["metadatas", "distances"]
+        result = self.get_chromadb_collection().query(query_embeddings=query_embeddings, n_results=n_results, include=include)  # type: ignore
+        return cast(dict[str, list[list[Any]]], result)
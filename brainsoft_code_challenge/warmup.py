@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+from brainsoft_code_challenge.agent import get_agent_executor
+from brainsoft_code_challenge.config import DEFAULT_FREQUENCY_PENALTY, DEFAULT_MODEL, DEFAULT_PRESENCE_PENALTY, DEFAULT_TEMPERATURE, DEFAULT_TOP_P
+from brainsoft_code_challenge.parent_store import get_parent_key
+from brainsoft_code_challenge.tokenizer import get_tokenizer
+from brainsoft_code_challenge.tools.registry import tool_registry
+
+
+class WarmupState:
+    """
+    Tracks the warm-up of the process, which the readiness check reports. The warm-up runs once, later calls wait for it.
+    """
+
+    def __init__(self) -> None:
+        self.durations: dict[str, float] = {}
+        self.error: str | None = None
+        self.is_done = False
+        self.lock = threading.Lock()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.is_done and self.error is None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"ready": self.is_ready, "done": self.is_done, "durations_seconds": dict(self.durations), "error": self.error}
+
+
+warmup_state = WarmupState()
+
+
+def __load_tokenizer() -> None:
+    get_tokenizer().encode("warm-up")
+
+
+def __load_tools() -> None:
+    tool_registry.get_all()
+
+
+def __open_indexes() -> None:
+    """
+    Opens the vector index, the BM25 index and the parent store, and runs a query, which loads the HNSW index of ChromaDB
+    (or pages in the memory-mapped NumPy snapshot). The query embedding is taken from the index, so the embedding API is not called.
+    An empty index is opened but not queried.
+    """
+    import numpy as np
+
+    from brainsoft_code_challenge.tools import documentation_search
+
+    vector_store = documentation_search.vector_store
+    vector_store.get_lexical_index()
+    parent_store = vector_store.get_parent_store()
+    if vector_store.backend == "numpy":
+        numpy_index = vector_store.get_numpy_index()
+        query_embeddings = [np.asarray(numpy_index.matrix[0], dtype=np.float32).tolist()] if len(numpy_index) else []
+    else:
+        query_embeddings = vector_store.get_chromadb_collection().get(limit=1, include=["embeddings"])["embeddings"] or []  # type: ignore
+    if not query_embeddings:
+        logging.warning("The vector index is empty")
+        return
+    result = vector_store.query(query_embeddings, n_results=1)  # type: ignore
+    parent_store.get_many([get_parent_key(metadata) for metadata in (result["metadatas"] or [[]])[0]])
+
+
+def __create_clients() -> None:
+    """
+    Creates the embedder (and its HTTP client, or loads the local model) and the chat model clients of the agent.
+    """
+    from brainsoft_code_challenge.embedders import LocalEmbeddings
+    from brainsoft_code_challenge.tools import documentation_search
+
+    embedder = documentation_search.vector_store.get_embedder()
+    if isinstance(embedder, LocalEmbeddings):
+        embedder.get_model()
+    get_agent_executor(DEFAULT_MODEL, DEFAULT_TEMPERATURE, DEFAULT_FREQUENCY_PENALTY, DEFAULT_PRESENCE_PENALTY, DEFAULT_TOP_P, verbose=False)
+
+
+# The heavy modules are imported by the steps, so that importing this module doesn't slow down the startup
+WARMUP_STEPS: list[tuple[str, Callable[[], None]]] = [
+    ("tokenizer", __load_tokenizer),
+    ("tools", __load_tools),
+    ("indexes", __open_indexes),
+    ("clients", __create_clients),
+]
+
+
+def warm_up(state: WarmupState = warmup_state) -> WarmupState:
+    """
+    Loads everything that would otherwise be loaded lazily by the first request: the tokenizer, the tools, the indexes and the API clients.
+    A failed step is recorded as the error of the state, so that the process never reports ready.
+
+    :param state: The warm-up state to update.
+    :return: The warm-up state.
+    """
+    with state.lock:
+        if state.is_done:
+            return state
+        for step_name, step in WARMUP_STEPS:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                logging.exception(f"Warm-up step {step_name} failed")
+                state.error = f"Warm-up step {step_name} failed: {e}"
+                break
+            state.durations[step_name] = time.perf_counter() - start
+            logging.info(f"Warm-up step {step_name} took {state.durations[step_name]:.2f} s")
+        state.is_done = True
+    return state
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Generic, TypeVar
+
+from brainsoft_code_challenge.config import (
+    WEB_PAGE_TEXT_CACHE_MAX_ENTRIES,
+    WEB_PAGE_TEXT_CACHE_TTL_SECONDS,
+    WEB_SEARCH_RESULTS_CACHE_MAX_ENTRIES,
+    WEB_SEARCH_RESULTS_CACHE_TTL_SECONDS,
+)
+
+ValueType = TypeVar("ValueType")
+
+
+def normalize_search_query(query: str) -> str:
+    """
+    Normalizes the query for the cache key. Google search is case-insensitive, so the case is normalized together with the whitespace.
+    """
+    return " ".join(query.lower().split())
+
+
+@dataclass
+class CachedPage:
+    """
+    The text extracted from a page, with the validators of the response, which allow to revalidate the page once it expires.
+    """
+
+    text: str
+    etag: str | None = None
+    last_modified: str | None = None
+
+    def get_conditional_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class TtlCache(Generic[ValueType]):
+    """
+    An in-memory LRU cache whose entries are fresh for a limited time. Expired entries are kept until they are evicted, so that
+    they can be revalidated. The hit, miss and revalidation counters are kept per process. Thread-safe.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._entries: OrderedDict[str, tuple[float, ValueType]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> ValueType | None:
+        """
+        Returns the fresh value of the key, or None on a cache miss (including expired entries).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_expired(self, key: str) -> ValueType | None:
+        """
+        Returns the value of the key even if it has expired, e.g. to revalidate it after a miss. The counters are not updated.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else None
+
+    def put(self, key: str, value: ValueType) -> None:
+        """
+        Stores the value and evicts the least recently used entries if the cache is full.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def refresh(self, key: str, value: ValueType) -> None:
+        """
+        Stores the value of an expired entry that the origin confirmed to be unchanged, and counts the revalidation.
+        """
+        self.put(key, value)
+        with self._lock:
+            self.revalidations += 1
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        Returns the counters of this process. Revalidations are counted among the misses.
+        """
+        with self._lock:
+            n_lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "hit_rate": self.hits / n_lookups if n_lookups else 0.0,
+                "entries": len(self._entries),
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+search_results_cache: TtlCache[dict[str, Any]] = TtlCache(WEB_SEARCH_RESULTS_CACHE_TTL_SECONDS, WEB_SEARCH_RESULTS_CACHE_MAX_ENTRIES)
+page_text_cache: TtlCache[CachedPage] = TtlCache(WEB_PAGE_TEXT_CACHE_TTL_SECONDS, WEB_PAGE_TEXT_CACHE_MAX_ENTRIES)
+
+
+def get_web_cache_stats() -> dict[str, dict[str, Any]]:
+    return {"search_results": search_results_cache.get_stats(), "page_text": page_text_cache.get_stats()}
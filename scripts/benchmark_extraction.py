@@ -0,0 +1,81 @@
+from brainsoft_code_challenge.utils import load_environment
+
+load_environment()
+
+import argparse  # noqa: E402
+import os  # noqa: E402
+import re  # noqa: E402
+import time  # noqa: E402
+from collections.abc import Callable  # noqa: E402
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from brainsoft_code_challenge.config import WEB_SEARCH_SCRAPING_MAX_BYTES  # noqa: E402
+from brainsoft_code_challenge.html_extraction import IS_LXML_AVAILABLE, extract_main_text  # noqa: E402
+from brainsoft_code_challenge.http_clients import get_http_client  # noqa: E402
+
+PREVIOUS_MAX_RESULT_LENGTH = 10000  # The previous extraction truncated the text of each page to this many characters
+
+
+def __extract_with_beautiful_soup(body: bytes) -> str:
+    """
+    The previous extraction: the whole body parsed by BeautifulSoup with html.parser, the text truncated afterwards.
+    """
+    soup = BeautifulSoup(body.decode("utf-8", errors="replace"), "html.parser")
+    return soup.get_text(separator=" ", strip=True)[:PREVIOUS_MAX_RESULT_LENGTH]  # type: ignore
+
+
+def __extract_main_text(body: bytes) -> str:
+    return extract_main_text(body[:WEB_SEARCH_SCRAPING_MAX_BYTES].decode("utf-8", errors="replace"))
+
+
+def __get_best_time(extract: Callable[[bytes], str], body: bytes, n_repeats: int) -> tuple[float, str]:
+    best_time = float("inf")
+    text = ""
+    for _ in range(n_repeats):
+        start_time = time.perf_counter()
+        text = extract(body)
+        best_time = min(best_time, time.perf_counter() - start_time)
+    return best_time, text
+
+
+def __download_pages(urls: list[str], pages_dir: str) -> None:
+    os.makedirs(pages_dir, exist_ok=True)
+    for url in urls:
+        response = get_http_client().get(url, follow_redirects=True)
+        response.raise_for_status()
+        file_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", url.split("://")[-1]).strip("_")[:100] + ".html"
+        with open(os.path.join(pages_dir, file_name), "wb") as f:
+            f.write(response.content)
+        print(f"Saved {url} ({len(response.content) / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the text extraction of web search results on saved pages")
+    parser.add_argument("--pages-dir", type=str, default="data/benchmark/pages", help="Directory of the saved HTML pages")
+    parser.add_argument("--download", type=str, nargs="+", default=[], help="URLs of pages to save to the directory before the benchmark")
+    parser.add_argument("--repeats", type=int, default=3, help="Number of runs of each extraction, the fastest one is reported")
+    args = parser.parse_args()
+
+    if args.download:
+        __download_pages(args.download, args.pages_dir)
+    paths = sorted(os.path.join(args.pages_dir, file_name) for file_name in os.listdir(args.pages_dir) if file_name.endswith((".html", ".htm")))
+    if not paths:
+        raise SystemExit(f"No saved pages in {args.pages_dir}, save some with --download")
+
+    print(f"Parser of the main content extractor: {'lxml' if IS_LXML_AVAILABLE else 'html.parser (install the lxml extra for the C-backed parser)'}")
+    print(f"{'page':<40} {'KiB':>8} {'bs4 ms':>10} {'main ms':>10} {'speedup':>8} {'bs4 chars':>10} {'main chars':>11}")
+    total_baseline_time = total_time = 0.0
+    for path in paths:
+        with open(path, "rb") as f:
+            body = f.read()
+        baseline_time, baseline_text = __get_best_time(__extract_with_beautiful_soup, body, args.repeats)
+        main_text_time, main_text = __get_best_time(__extract_main_text, body, args.repeats)
+        total_baseline_time += baseline_time
+        total_time += main_text_time
+        print(
+            f"{os.path.basename(path)[:40]:<40} {len(body) / 1024:>8.0f} {baseline_time * 1000:>10.1f} {main_text_time * 1000:>10.1f}"
+            f" {baseline_time / main_text_time:>7.1f}x {len(baseline_text):>10} {len(main_text):>11}"
+        )
+    print(f"Total: {total_baseline_time * 1000:.1f} ms with BeautifulSoup, {total_time * 1000:.1f} ms with the main content extractor", end="")
+    print(f", {total_baseline_time / total_time:.1f}x faster")
@@ -0,0 +1,113 @@
+from brainsoft_code_challenge.utils import load_environment
+
+load_environment()
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import logging  # noqa: E402
+import tempfile  # noqa: E402
+from collections.abc import Mapping, Sequence  # noqa: E402
+from typing import Any  # noqa: E402
+
+from brainsoft_code_challenge.config import DOCUMENTATION_SEARCH_TOKEN_BUDGET, N_CHROMADB_UNIQUE_RESULTS, NUMPY_INDEX_DTYPE, VECTOR_STORE_BACKENDS  # noqa: E402
+from brainsoft_code_challenge.data_loading.indexing import build_index  # noqa: E402
+from brainsoft_code_challenge.data_loading.splitting import iter_split_documents  # noqa: E402
+from brainsoft_code_challenge.embedding_profile import HASHING_EMBEDDING_MODEL, EmbeddingProfile  # noqa: E402
+from brainsoft_code_challenge.parent_store import get_parent_key  # noqa: E402
+from brainsoft_code_challenge.timing import StageTimer  # noqa: E402
+from brainsoft_code_challenge.tools import documentation_search  # noqa: E402
+from brainsoft_code_challenge.tools.documentation_search import __format_results, __search  # noqa: E402
+from brainsoft_code_challenge.vector_store import MetadataType, VectorStore  # noqa: E402
+
+logging.basicConfig(level=logging.WARNING)
+
+
+def __get_ranked_urls(vector_store: VectorStore, results: Sequence[MetadataType]) -> list[str]:
+    """
+    Returns the unique documentation page URLs of the results, in the order of the results.
+    """
+    documents = vector_store.get_parent_store().get_many([get_parent_key(result) for result in results])
+    return list(dict.fromkeys(str(document["documentation_url"]) for document in documents))
+
+
+def __evaluate_query(ranked_urls: Sequence[str], expected_urls: Sequence[str]) -> tuple[float, float]:
+    """
+    Calculates the recall of the expected pages among the results, and the reciprocal rank of the first expected page.
+    """
+    recall = len(set(ranked_urls) & set(expected_urls)) / len(expected_urls)
+    reciprocal_rank = next((1.0 / (rank + 1) for rank, url in enumerate(ranked_urls) if url in expected_urls), 0.0)
+    return recall, reciprocal_rank
+
+
+def __print_report(report: Mapping[str, Any], baseline: Mapping[str, Any] | None) -> None:
+    def __format_delta(key: str, value: float, stage: str | None = None) -> str:
+        if baseline is None:
+            return ""
+        baseline_value = baseline["latency_ms"].get(stage, {}).get(key) if stage is not None else baseline.get(key)
+        return f" ({value - baseline_value:+.3f})" if baseline_value is not None else ""
+
+    print(f"Query set v{report['query_set_version']} ({report['n_queries']} queries), {report['backend']} backend, profile {report['profile']}")
+    print(f"recall@{report['k']}: {report['recall_at_k']:.3f}{__format_delta('recall_at_k', report['recall_at_k'])}")
+    print(f"MRR: {report['mrr']:.3f}{__format_delta('mrr', report['mrr'])}")
+    print(f"{'Stage':<14} {'n':>6} {'p50 ms':>16} {'p90 ms':>16} {'p99 ms':>16}")
+    for stage, stats in report["latency_ms"].items():
+        columns = [f"{stats[key]:.3f}{__format_delta(key, stats[key], stage)}" for key in ("p50", "p90", "p99")]
+        print(f"{stage:<14} {stats['n']:>6} {columns[0]:>16} {columns[1]:>16} {columns[2]:>16}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the documentation search offline, with a deterministic local embedder")
+    parser.add_argument("--queries-path", type=str, default="data/benchmark/queries_v1.json", help="Path to the labeled query set")
+    parser.add_argument("--input-path", type=str, default="data/pytest/scraped_docs.json", help="Path to the scraped documentation to index")
+    parser.add_argument("--backend", type=str, choices=VECTOR_STORE_BACKENDS, default="numpy", help="Vector index backend")
+    parser.add_argument("--embedding-dimensions", type=int, help="Number of dimensions of the hashing embeddings")
+    parser.add_argument("--k", type=int, default=N_CHROMADB_UNIQUE_RESULTS, help="Number of unique document splits returned for each query")
+    parser.add_argument("--repeats", type=int, default=5, help="Number of times each query is run for the latency percentiles")
+    parser.add_argument("--output-path", type=str, help="Path to save the report (JSON), e.g. as a baseline for later runs")
+    parser.add_argument("--baseline-path", type=str, help="Path to a previous report to compare against")
+    args = parser.parse_args()
+
+    with open(args.queries_path) as f:
+        query_set = json.load(f)
+    with open(args.input_path) as f:
+        data = json.load(f)
+    baseline = None
+    if args.baseline_path is not None:
+        with open(args.baseline_path) as f:
+            baseline = json.load(f)
+
+    profile = EmbeddingProfile(model=HASHING_EMBEDDING_MODEL, dimensions=args.embedding_dimensions, dtype=NUMPY_INDEX_DTYPE, backend="hashing")
+    with tempfile.TemporaryDirectory() as index_dir:
+        # The query embedding cache is disabled, so that the embedding stage is measured in every run
+        vector_store = VectorStore(backend=args.backend, profile=profile, index_dir=index_dir, embedding_cache_path=None)
+        build_index(iter_split_documents(data), backends=[args.backend], vector_store=vector_store)
+        documentation_search.vector_store = vector_store
+
+        recalls, reciprocal_ranks = [], []
+        for labeled_query in query_set["queries"]:  # Also warms up the indexes before the timed runs
+            results = __search([labeled_query["query"]], n_results=args.k)[0].ranking
+            recall, reciprocal_rank = __evaluate_query(__get_ranked_urls(vector_store, results), labeled_query["expected_documentation_urls"])
+            recalls.append(recall)
+            reciprocal_ranks.append(reciprocal_rank)
+
+        timer = StageTimer()
+        for _ in range(args.repeats):
+            for labeled_query in query_set["queries"]:
+                with timer.measure("total"):
+                    search_result = __search([labeled_query["query"]], n_results=args.k, timer=timer)[0]
+                    __format_results(search_result, token_budget=DOCUMENTATION_SEARCH_TOKEN_BUDGET, timer=timer)
+
+    report = {
+        "query_set_version": query_set["version"],
+        "n_queries": len(query_set["queries"]),
+        "backend": args.backend,
+        "profile": profile.name,
+        "k": args.k,
+        "recall_at_k": sum(recalls) / len(recalls),
+        "mrr": sum(reciprocal_ranks) / len(reciprocal_ranks),
+        "latency_ms": timer.get_percentiles(),
+    }
+    __print_report(report, baseline)
+    if args.output_path is not None:
+        with open(args.output_path, "w") as f:
+            f.write(json.dumps(report, indent=2))
@@ -0,0 +1,82 @@
+from brainsoft_code_challenge.utils import load_environment
+
+load_environment()
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import logging  # noqa: E402
+import os  # noqa: E402
+import tempfile  # noqa: E402
+from collections.abc import Sequence  # noqa: E402
+from dataclasses import replace  # noqa: E402
+
+import chromadb  # noqa: E402
+import numpy as np  # noqa: E402
+
+from brainsoft_code_challenge.config import CHROMADB_PATH, N_CHROMADB_RESULTS, N_CHROMADB_UNIQUE_RESULTS  # noqa: E402
+from brainsoft_code_challenge.embedding_profile import EmbeddingProfile, truncate_embeddings  # noqa: E402
+from brainsoft_code_challenge.numpy_index import SUPPORTED_DTYPES, NumpyVectorIndex, write_numpy_index  # noqa: E402
+from brainsoft_code_challenge.parent_store import ParentKeyType, get_parent_key  # noqa: E402
+from brainsoft_code_challenge.vector_store import VectorStore  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+
+
+def __get_top_parents(index: NumpyVectorIndex, query_embeddings: np.ndarray, k: int) -> list[list[ParentKeyType]]:
+    """
+    Returns the top k unique document splits for each query, as returned by the documentation search tool.
+    """
+    result = index.query(query_embeddings.tolist(), N_CHROMADB_RESULTS)
+    top_parents = []
+    for metadatas in result["metadatas"]:
+        parents = list(dict.fromkeys(get_parent_key(metadata) for metadata in metadatas))
+        top_parents.append(parents[:k])
+    return top_parents
+
+
+def __get_recall(baseline: Sequence[Sequence[ParentKeyType]], results: Sequence[Sequence[ParentKeyType]]) -> float:
+    recalls = [len(set(expected) & set(found)) / len(expected) for expected, found in zip(baseline, results, strict=True) if expected]
+    return float(np.mean(recalls)) if recalls else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report recall@k of shortened and quantized embedding profiles against the full-dimension float32 baseline")
+    parser.add_argument("--queries-path", type=str, required=True, help="Path to a JSON list of queries (strings or objects with a 'query' key)")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[3072, 1536, 1024, 512, 256], help="Numbers of dimensions to evaluate")
+    parser.add_argument("--dtypes", type=str, nargs="+", choices=SUPPORTED_DTYPES, default=SUPPORTED_DTYPES, help="Storage dtypes to evaluate")
+    parser.add_argument("--k", type=int, default=N_CHROMADB_UNIQUE_RESULTS, help="Number of unique document splits compared")
+    args = parser.parse_args()
+
+    with open(args.queries_path) as f:
+        queries = [query if isinstance(query, str) else query["query"] for query in json.load(f)]
+
+    # The chunk embeddings are taken from a full-dimension ChromaDB collection, so that no chunks need to be embedded
+    collection = chromadb.PersistentClient(path=CHROMADB_PATH).get_collection(name="documentation")
+    baseline_profile = EmbeddingProfile.from_metadata(collection.metadata)
+    if baseline_profile.dimensions is not None:
+        raise ValueError(f"The ChromaDB collection must be built with full-dimension embeddings, not {baseline_profile.name}")
+    chunks = collection.get(include=["embeddings", "metadatas"])
+    chunk_embeddings = np.asarray(chunks["embeddings"], dtype=np.float32)
+    query_embeddings = np.asarray(VectorStore(profile=baseline_profile).embed_queries(queries), dtype=np.float32)
+    logging.info(f"Evaluating {len(queries)} queries against {len(chunks['ids'])} chunks of {baseline_profile.name}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+
+        def __evaluate(profile: EmbeddingProfile) -> tuple[list[list[ParentKeyType]], int]:
+            path = os.path.join(temp_dir, f"{profile.dimensions}_{profile.dtype}.bin")
+            write_numpy_index(path, chunks["ids"], truncate_embeddings(chunk_embeddings, profile.dimensions), chunks["metadatas"], dtype=profile.dtype)
+            index = NumpyVectorIndex(path)
+            n_bytes = index.matrix.nbytes + (index.scales.nbytes if index.scales is not None else 0)
+            return __get_top_parents(index, truncate_embeddings(query_embeddings, profile.dimensions), args.k), n_bytes
+
+        baseline, _ = __evaluate(replace(baseline_profile, dtype="float32"))
+        rows = []
+        for dimensions in sorted(args.dimensions, reverse=True):
+            for dtype in args.dtypes:
+                profile = replace(baseline_profile, dimensions=dimensions if dimensions < chunk_embeddings.shape[1] else None, dtype=dtype)
+                results, n_bytes = __evaluate(profile)
+                rows.append((profile.name, dtype, n_bytes, __get_recall(baseline, results)))
+
+    print(f"{'Profile':<32} {'Dtype':<8} {'Matrix size':>12} recall@{args.k}")
+    for name, dtype, n_bytes, recall in rows:
+        print(f"{name:<32} {dtype:<8} {n_bytes / 2**20:>9.2f} MB {recall:.3f}")
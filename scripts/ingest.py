@@ -0,0 +1,62 @@
+from brainsoft_code_challenge.utils import load_environment
+
+load_environment()
+
+import argparse  # noqa: E402
+import logging  # noqa: E402
+import os  # noqa: E402
+
+from brainsoft_code_challenge.config import (  # noqa: E402
+    EMBEDDING_BACKEND,
+    EMBEDDING_BACKENDS,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL,
+    NUMPY_INDEX_DTYPE,
+    VECTOR_STORE_BACKENDS,
+)
+from brainsoft_code_challenge.data_loading.checkpointing import PARTIAL_SUFFIX, checkpoint_stage  # noqa: E402
+from brainsoft_code_challenge.data_loading.indexing import build_index  # noqa: E402
+from brainsoft_code_challenge.data_loading.scraping import iter_scrape_all  # noqa: E402
+from brainsoft_code_challenge.data_loading.splitting import iter_split_documents  # noqa: E402
+from brainsoft_code_challenge.embedding_profile import EmbeddingProfile  # noqa: E402
+from brainsoft_code_challenge.numpy_index import SUPPORTED_DTYPES  # noqa: E402
+from brainsoft_code_challenge.vector_store import VectorStore  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape, split and index the documentation in a single streaming pass")
+    parser.add_argument("--github-api-token", type=str, help="GitHub API token")
+    parser.add_argument("--tarball", action="store_true", help="Download the changed files in a single repository archive")
+    parser.add_argument("--checkpoint-dir", type=str, help="Directory for JSON Lines checkpoints of the stages, an interrupted run is resumed from them")
+    parser.add_argument("--backend", type=str, nargs="+", choices=VECTOR_STORE_BACKENDS, default=VECTOR_STORE_BACKENDS, help="Indexes to build")
+    parser.add_argument("--numpy-index-dtype", type=str, choices=SUPPORTED_DTYPES, default=NUMPY_INDEX_DTYPE, help="Storage dtype of the NumPy snapshot")
+    parser.add_argument("--embedding-backend", type=str, choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND, help="Embedder backend")
+    parser.add_argument("--embedding-model", type=str, default=EMBEDDING_MODEL, help="Embedding model (a model directory for the local backend)")
+    parser.add_argument("--embedding-dimensions", type=int, default=EMBEDDING_DIMENSIONS, help="Shorten the embeddings to this number of dimensions")
+    parser.add_argument("--incremental", action="store_true", help="Only embed new or changed chunks and delete stale ones instead of rebuilding")
+    args = parser.parse_args()
+
+    scraped_path = split_path = None
+    resuming = False
+    if args.checkpoint_dir is not None:
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
+        scraped_path = os.path.join(args.checkpoint_dir, "scraped_docs.jsonl")
+        split_path = os.path.join(args.checkpoint_dir, "split_docs.jsonl")
+        resuming = any(os.path.exists(path) or os.path.exists(path + PARTIAL_SUFFIX) for path in (scraped_path, split_path))
+
+    documents = checkpoint_stage(
+        scraped_path,
+        lambda done_source_paths: iter_scrape_all(args.github_api_token, skip_source_paths=done_source_paths, use_tarball=args.tarball),
+        lambda document: document["source_path"],
+    )
+    splits = checkpoint_stage(
+        split_path,
+        # The splits checkpoint is always behind the scraped documents, so the documents that were already split are skipped
+        lambda done_source_paths: iter_split_documents(document for document in documents if document["source_path"] not in done_source_paths),
+        lambda split: split["source_path"],
+    )
+    # Chunk ids are derived from the content, so resuming an interrupted run incrementally skips the chunks it already indexed
+    profile = EmbeddingProfile(model=args.embedding_model, dimensions=args.embedding_dimensions, dtype=args.numpy_index_dtype, backend=args.embedding_backend)
+    build_index(splits, backends=args.backend, vector_store=VectorStore(profile=profile), incremental=args.incremental or resuming)
@@ -0,0 +1,27 @@
+from brainsoft_code_challenge.utils import load_environment
+
+load_environment()
+
+import argparse  # noqa: E402
+
+from brainsoft_code_challenge.config import IMPORT_TIME_BUDGETS_SECONDS  # noqa: E402
+from brainsoft_code_challenge.constants import LAZILY_IMPORTED_MODULES  # noqa: E402
+from brainsoft_code_challenge.startup_profiling import get_import_time, get_imported_modules, profile_imports  # noqa: E402
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the import times of the entry points, in the style of -X importtime")
+    parser.add_argument("--modules", type=str, nargs="+", default=list(IMPORT_TIME_BUDGETS_SECONDS), help="Modules to import")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list for each module")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        timings = profile_imports(module)
+        total = get_import_time(timings, module)
+        budget = IMPORT_TIME_BUDGETS_SECONDS.get(module)
+        budget_note = f" (budget {budget:.2f} s{', EXCEEDED' if total > budget else ''})" if budget is not None else ""
+        print(f"\n{module}: {total:.3f} s{budget_note}, {len(timings)} modules imported")
+        if lazily_imported := get_imported_modules(timings, LAZILY_IMPORTED_MODULES):
+            print(f"Eagerly imported heavy modules: {', '.join(sorted({name.split('.')[0] for name in lazily_imported}))}")
+        print(f"{'self s':>8} {'cumulative s':>13}  module")
+        for timing in sorted((timing for timing in timings if timing.module != module), key=lambda timing: timing.cumulative_seconds, reverse=True)[: args.top]:
+            print(f"{timing.self_seconds:>8.3f} {timing.cumulative_seconds:>13.3f}  {'  ' * timing.depth}{timing.module}")
@@ -4,68 +4,36 @@ load_environment()
 
 import argparse  # noqa: E402
 import json  # noqa: E402
-from collections.abc import Sequence  # noqa: E402
-from typing import cast  # noqa: E402
-from uuid import uuid4  # noqa: E402
+import logging  # noqa: E402
 
-import chromadb  # noqa: E402
-from langchain.text_splitter import RecursiveCharacterTextSplitter  # noqa: E402
-from tqdm.autonotebook import tqdm  # noqa: E402
+from brainsoft_code_challenge.config import (  # noqa: E402
+    EMBEDDING_BACKEND,
+    EMBEDDING_BACKENDS,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL,
+    NUMPY_INDEX_DTYPE,
+    VECTOR_STORE_BACKENDS,
+)
+from brainsoft_code_challenge.data_loading.indexing import build_index  # noqa: E402
+from brainsoft_code_challenge.embedding_profile import EmbeddingProfile  # noqa: E402
+from brainsoft_code_challenge.numpy_index import SUPPORTED_DTYPES  # noqa: E402
+from brainsoft_code_challenge.vector_store import VectorStore  # noqa: E402
 
-from brainsoft_code_challenge.config import CHROMADB_CHUNK_OVERLAP, CHROMADB_CHUNK_SIZE  # noqa: E402
-from brainsoft_code_challenge.tokenizer import count_tokens  # noqa: E402
-from brainsoft_code_challenge.vector_store import MetadataType, VectorStore  # noqa: E402
-
-vector_store = VectorStore()
-
-
-def upsert_to_index(texts: Sequence[str], metadatas: list[MetadataType], collection: chromadb.Collection) -> None:
-    texts = list(texts)
-    ids = [str(uuid4()) for _ in range(len(texts))]
-    embeddings = cast(list[Sequence[float]], vector_store.get_embedder().embed_documents(texts))
-    collection.add(documents=texts, metadatas=metadatas, ids=ids, embeddings=embeddings)
-
-
-def rebuild_chromadb(data: Sequence[MetadataType]) -> None:
-    chroma_client = chromadb.PersistentClient(path="../chromadb")
-    collections = chroma_client.list_collections()
-    if "documentation" in [collection.name for collection in collections]:
-        chroma_client.delete_collection("documentation")
-    collection = chroma_client.create_collection(name="documentation", metadata={"hnsw:space": "ip"})
-
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHROMADB_CHUNK_SIZE, chunk_overlap=CHROMADB_CHUNK_OVERLAP, length_function=count_tokens, separators=["\n\n", "\n", " ", ""]
-    )  # noqa: E501
-
-    batch_limit = 100
-    text_chunks = []
-    metadatas = []
-    for document in tqdm(data):
-        document_text_chunks = text_splitter.split_text(document["content"])
-        document_metadatas = []
-        for i, text_chunk in enumerate(document_text_chunks):
-            embedding_text = f"{document['documentation_url']}: {text_chunk}"
-            metadata: MetadataType = {
-                "chunk": i,
-                "embedding_text": embedding_text,
-                **{k: v for k, v in document.items() if v is not None},
-            }
-            document_metadatas.append(metadata)
-        text_chunks.extend(document_text_chunks)
-        metadatas.extend(document_metadatas)
-        if len(text_chunks) >= batch_limit:
-            upsert_to_index(text_chunks, metadatas, collection)
-            text_chunks = []
-            metadatas = []
-    if text_chunks:
-        upsert_to_index(text_chunks, metadatas, collection)
+logging.basicConfig(level=logging.INFO)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--input-path", type=str, default="split_docs.json", help="Path to input data")
+    parser.add_argument("--backend", type=str, nargs="+", choices=VECTOR_STORE_BACKENDS, default=VECTOR_STORE_BACKENDS, help="Indexes to build")
+    parser.add_argument("--numpy-index-dtype", type=str, choices=SUPPORTED_DTYPES, default=NUMPY_INDEX_DTYPE, help="Storage dtype of the NumPy snapshot")
+    parser.add_argument("--embedding-backend", type=str, choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND, help="Embedder backend")
+    parser.add_argument("--embedding-model", type=str, default=EMBEDDING_MODEL, help="Embedding model (a model directory for the local backend)")
+    parser.add_argument("--embedding-dimensions", type=int, default=EMBEDDING_DIMENSIONS, help="Shorten the embeddings to this number of dimensions")
+    parser.add_argument("--incremental", action="store_true", help="Only embed new or changed chunks and delete stale ones instead of rebuilding")
     args = parser.parse_args()
 
     with open(args.input_path) as f:
         data = json.load(f)
-    rebuild_chromadb(data)
+    profile = EmbeddingProfile(model=args.embedding_model, dimensions=args.embedding_dimensions, dtype=args.numpy_index_dtype, backend=args.embedding_backend)
+    build_index(data, backends=args.backend, vector_store=VectorStore(profile=profile), incremental=args.incremental)
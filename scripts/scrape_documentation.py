@@ -14,10 +14,11 @@ logging.basicConfig(level=logging.INFO)
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--github-api-token", type=str, help="GitHub API token")
+    parser.add_argument("--tarball", action="store_true", help="Download the changed files in a single repository archive")
     parser.add_argument("--output-path", type=str, default="scraped_docs.json", help="Path to save the results")
     args = parser.parse_args()
 
-    results = scrape_all(args.github_api_token)
+    results = scrape_all(args.github_api_token, use_tarball=args.tarball)
     logging.info(f"Successfully obtained {len(results)} documents")
     with open(args.output_path, "w") as f:
         f.write(json.dumps(results, ensure_ascii=False))
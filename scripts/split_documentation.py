@@ -6,7 +6,7 @@ import argparse  # noqa: E402
 import json  # noqa: E402
 import logging  # noqa: E402
 
-from brainsoft_code_challenge.data_loading.splitting import split_document  # noqa: E402
+from brainsoft_code_challenge.data_loading.splitting import iter_split_documents  # noqa: E402
 
 logging.basicConfig(level=logging.INFO)
 
@@ -20,12 +20,7 @@ if __name__ == "__main__":
     with open(args.input_path) as f:
         data = json.load(f)
 
-    results = []
-    for document in data:
-        split_parts = split_document(document)
-        if len(split_parts) > 1:
-            logging.info(f"Split {document['source_path']} into {len(split_parts)} parts")
-        results.extend(split_parts)
+    results = list(iter_split_documents(data))
 
     with open(args.output_path, "w") as f:
         f.write(json.dumps(results, ensure_ascii=False))
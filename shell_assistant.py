@@ -35,6 +35,7 @@ from brainsoft_code_challenge.config import (  # noqa: E402
     MODEL_CHOICES,
 )
 from brainsoft_code_challenge.constants import PYTEST_USER_INPUT_ENV_VAR  # noqa: E402
+from brainsoft_code_challenge.http_clients import close_async_http_client  # noqa: E402
 from brainsoft_code_challenge.utils import is_pytest_running  # noqa: E402
 
 if TYPE_CHECKING:
@@ -157,7 +158,10 @@ async def run(model: str, temperature: float, frequency_penalty: float, presence
     with warnings.catch_warnings():
         warnings.filterwarnings("ignore", category=DeprecationWarning)
         agent_executor = get_agent_executor(model, temperature, frequency_penalty, presence_penalty, top_p, verbose=False)
-        await __conversation_loop(agent_executor, user_input, prompt_style, model)
+        try:
+            await __conversation_loop(agent_executor, user_input, prompt_style, model)
+        finally:
+            await close_async_http_client()
 
 
 if __name__ == "__main__":
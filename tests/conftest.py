@@ -0,0 +1,40 @@
+import pytest
+import tiktoken
+
+from brainsoft_code_challenge import tokenizer
+
+
+class StubEncoding:
+    """
+    Stands in for the tiktoken encoding, which is downloaded on first use, so that the tests can run offline. Each token is
+    four characters, roughly the average of cl100k_base on English text.
+    """
+
+    def __init__(self) -> None:
+        self.vocabulary: dict[str, int] = {}
+        self.pieces: list[str] = []
+
+    def encode(self, text: str, allowed_special: object = (), disallowed_special: object = ()) -> list[int]:  # noqa: ARG002
+        tokens = []
+        for i in range(0, len(text), 4):
+            piece = text[i : i + 4]
+            if piece not in self.vocabulary:
+                self.vocabulary[piece] = len(self.pieces)
+                self.pieces.append(piece)
+            tokens.append(self.vocabulary[piece])
+        return tokens
+
+    def decode(self, tokens: list[int]) -> str:
+        return "".join(self.pieces[token] for token in tokens)
+
+
+@pytest.fixture()
+def stub_tokenizer(monkeypatch: pytest.MonkeyPatch) -> StubEncoding:
+    """
+    Replaces the tokenizer of the package and the encodings which OpenAIEmbeddings loads from tiktoken.
+    """
+    encoding = StubEncoding()
+    monkeypatch.setattr(tokenizer, "get_tokenizer", lambda: encoding)
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda _: encoding)
+    monkeypatch.setattr(tiktoken, "encoding_for_model", lambda _: encoding)
+    return encoding
@@ -1,8 +1,12 @@
+import datetime
+
 from brainsoft_code_challenge.utils import load_environment
 
 load_environment()
 
-from brainsoft_code_challenge.tools.documentation_search import __get_unique_results  # noqa: E402
+from brainsoft_code_challenge.agent import get_agent_executor, get_conversation_start  # noqa: E402
+from brainsoft_code_challenge.config import DEFAULT_FREQUENCY_PENALTY, DEFAULT_MODEL, DEFAULT_PRESENCE_PENALTY, DEFAULT_TEMPERATURE, DEFAULT_TOP_P  # noqa: E402
+from brainsoft_code_challenge.tools.documentation_search import __fuse_rankings, __get_unique_results  # noqa: E402
 from brainsoft_code_challenge.vector_store import MetadataType  # noqa: E402
 
 
@@ -27,3 +31,41 @@ def test_get_unique_results() -> None:
         {"source_url": "url1", "split_part": 1, "content": "content1_1", "chunk": "0"},
         {"source_url": "url2", "split_part": 0, "content": "content2_0", "chunk": "0"},
     ]
+
+
+def test_fuse_rankings() -> None:
+    vector_results: list[MetadataType] = [
+        {"source_url": "url1", "split_part": 0, "content": "content1_0"},
+        {"source_url": "url2", "content": "content2"},
+        {"source_url": "url3", "content": "content3"},
+    ]
+    lexical_results: list[MetadataType] = [
+        {"source_url": "url2", "content": "content2"},
+        {"source_url": "url4", "content": "content4"},
+        {"source_url": "url1", "split_part": 0, "content": "content1_0"},
+    ]
+    fused_results = __fuse_rankings([vector_results, lexical_results], 3)
+    assert [result["source_url"] for result in fused_results] == ["url2", "url1", "url4"]  # noqa: S101
+
+
+def test_agent_reuse() -> None:
+    model_config = (DEFAULT_MODEL, DEFAULT_TEMPERATURE, DEFAULT_FREQUENCY_PENALTY, DEFAULT_PRESENCE_PENALTY, DEFAULT_TOP_P)
+    agent_executor = get_agent_executor(*model_config, verbose=False)
+    other_agent_executor = get_agent_executor(*model_config, verbose=False)
+    # The agent is shared by conversations with the same model configuration, the memory is not
+    assert agent_executor.agent.runnable is other_agent_executor.agent.runnable  # type: ignore  # noqa: S101
+    assert agent_executor.memory is not other_agent_executor.memory  # noqa: S101
+    hotter_agent_executor = get_agent_executor(DEFAULT_MODEL, DEFAULT_TEMPERATURE + 0.5, *model_config[2:], verbose=False)
+    assert hotter_agent_executor.agent.runnable is not agent_executor.agent.runnable  # type: ignore  # noqa: S101
+
+
+def test_conversation_start() -> None:
+    model_config = (DEFAULT_MODEL, DEFAULT_TEMPERATURE, DEFAULT_FREQUENCY_PENALTY, DEFAULT_PRESENCE_PENALTY, DEFAULT_TOP_P)
+    started_at = datetime.datetime(2024, 3, 1, 9, 30)
+    agent_executor = get_agent_executor(*model_config, verbose=False, started_at=started_at)
+    # The start is rendered once, when the executor is created, and passed with every turn to the shared prompt
+    assert agent_executor.conversation_start == "Friday, March 01, 2024 at 09:30" == get_conversation_start(started_at)  # type: ignore  # noqa: S101
+    inputs = agent_executor.prep_inputs({"input": "Hello"})
+    assert inputs["conversation_start"] == agent_executor.conversation_start  # type: ignore  # noqa: S101
+    system_message = agent_executor.agent.runnable.get_prompts()[0].format_messages(**inputs, agent_scratchpad=[])[0]  # type: ignore
+    assert system_message.content.endswith("The conversation begins on Friday, March 01, 2024 at 09:30.")  # noqa: S101
@@ -1,10 +1,24 @@
+import asyncio
 import base64
-
+import json
+import threading
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
+import api
 from api import app
-from brainsoft_code_challenge.config import DEFAULT_MODEL  # noqa: E402
+from brainsoft_code_challenge import warmup
+from brainsoft_code_challenge.config import DEFAULT_MODEL, VECTOR_STORE_BACKENDS  # noqa: E402
+from brainsoft_code_challenge.data_loading.indexing import ChromaIndexWriter, NumpyIndexWriter
 from brainsoft_code_challenge.tokenizer import count_tokens, get_memory_token_limit, shorten_text  # noqa: E402
+from brainsoft_code_challenge.tools import documentation_search
+from brainsoft_code_challenge.vector_store import VectorStore
 
 client = TestClient(app)
 
@@ -16,6 +30,31 @@ def test_home() -> None:
     assert data["Status"] == "ok"  # noqa: S101
 
 
+def test_ready() -> None:
+    with TestClient(app) as warm_client:  # Runs the lifespan, which starts the warm-up
+        response = warm_client.get("/ready")
+        for _ in range(600):
+            if response.json()["done"]:
+                break
+            time.sleep(0.1)
+            response = warm_client.get("/ready")
+    assert response.status_code == 200  # noqa: S101, PLR2004
+    assert response.json()["ready"] is True  # noqa: S101
+
+
+@pytest.mark.parametrize("backend", VECTOR_STORE_BACKENDS)
+def test_ready_with_empty_index(backend: str, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    vector_store = VectorStore(backend, index_dir=str(tmp_path), embedding_cache_path=None)
+    if backend == "numpy":
+        NumpyIndexWriter(vector_store.profile, vector_store.numpy_index_path, reset=True).finalize()
+    else:
+        ChromaIndexWriter(vector_store.profile, vector_store.chromadb_path, reset=True)
+    monkeypatch.setattr(documentation_search, "vector_store", vector_store)
+    monkeypatch.setattr(warmup, "WARMUP_STEPS", [(name, step) for name, step in warmup.WARMUP_STEPS if name == "indexes"])
+    state = warmup.warm_up(warmup.WarmupState())
+    assert state.to_dict()["ready"] is True  # noqa: S101
+
+
 def test_basic_chat() -> None:
     response = client.post("/chat", json={"user_input": "Who are you?", "temperature": 0.0})
     assert response.status_code == 200  # noqa: S101, PLR2004
@@ -46,6 +85,44 @@ def test_chat_with_history() -> None:
     assert data.keys() == {"input", "output"}  # noqa: S101
 
 
+def test_chat_with_session() -> None:
+    response = client.post("/chat", json={"user_input": "My name is Alice.", "session_id": "pytest-session"})
+    assert response.status_code == 200  # noqa: S101, PLR2004
+    assert response.json()["session_id"] == "pytest-session"  # noqa: S101
+
+    response = client.post("/chat", json={"user_input": "What is my name?", "session_id": "pytest-session", "return_history": True})
+    assert response.status_code == 200  # noqa: S101, PLR2004
+    assert [message["content"] for message in response.json()["history"]][:1] == ["My name is Alice."]  # noqa: S101
+
+    response = client.post("/chat", json={"user_input": "Hi", "session_id": "pytest-session", "history": [{"type": "ai", "content": "Hi!"}]})
+    assert response.status_code == 400  # noqa: S101, PLR2004
+    response = client.post("/chat", json={"user_input": "Hi", "session_id": "../invalid"})
+    assert response.status_code == 400  # noqa: S101, PLR2004
+
+    assert client.delete("/sessions/pytest-session").status_code == 200  # noqa: S101, PLR2004
+    assert client.delete("/sessions/pytest-session").status_code == 404  # noqa: S101, PLR2004
+
+
+def test_chat_stream() -> None:
+    with client.stream("POST", "/chat/stream", json={"user_input": "What is the latest version of the Python SDK?", "return_history": True}) as response:
+        assert response.status_code == 200  # noqa: S101, PLR2004
+        assert response.headers["content-type"].startswith("text/event-stream")  # noqa: S101
+        events = [
+            (event.split("\n")[0].removeprefix("event: "), json.loads(event.split("\n")[1].removeprefix("data: ")))
+            for event in response.read().decode().split("\n\n")
+            if event
+        ]
+    event_types = [event_type for event_type, _ in events]
+    assert "token" in event_types  # noqa: S101
+    assert event_types[-1] == "final"  # noqa: S101
+    final_data = events[-1][1]
+    assert final_data["output"].endswith(events[event_types.index("final") - 1][1]["content"])  # noqa: S101
+    assert final_data["history"][-1] == {"type": "ai", "content": final_data["output"]}  # noqa: S101
+
+    response = client.post("/chat/stream", json={"user_input": "Who are you?", "temperature": 10})
+    assert response.status_code == 400  # noqa: S101, PLR2004
+
+
 def test_chat_with_csv_file() -> None:
     response = client.post("/chat", json={"user_input": "Who are you?", "files": [{"file_name": "test.csv", "content": "QSxCCjEsMgozLDQKMTAsMjAKMzAsNDAK"}]})
     assert response.status_code == 200  # noqa: S101, PLR2004
@@ -87,3 +164,81 @@ def test_chat_with_very_long_history() -> None:
     data = response.json()
     assert data.keys() == {"input", "output", "history"}  # noqa: S101
     assert sum([count_tokens(message["content"]) for message in data["history"]]) <= memory_token_limit  # noqa: S101
+
+
+class FakeMemory:
+    def __init__(self) -> None:
+        self.saved_outputs: list[str] = []
+
+    def load_memory_variables(self, _inputs: dict[str, Any]) -> dict[str, Any]:
+        return {"history": []}
+
+    async def asave_context(self, _inputs: dict[str, Any], outputs: dict[str, str]) -> None:
+        self.saved_outputs.append(outputs["output"])
+
+
+class SlowAgentExecutor:
+    def __init__(self) -> None:
+        self.was_cancelled = False
+
+    async def ainvoke(self, _inputs: dict[str, Any]) -> dict[str, str]:
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            self.was_cancelled = True
+            raise
+        return {"output": "Too late."}
+
+
+class DisconnectedRequest:
+    async def is_disconnected(self) -> bool:
+        return True
+
+
+def test_chat_cancelled_on_disconnect(monkeypatch: pytest.MonkeyPatch) -> None:
+    agent_executor, memory = SlowAgentExecutor(), FakeMemory()
+    turn = api.ChatTurn(agent_executor, memory, {"input": "Who are you?"}, input_was_cut_off=False, return_history=False)  # type: ignore
+    monkeypatch.setattr(api, "__prepare_chat_turn", lambda _: turn)
+    monkeypatch.setattr(api, "CLIENT_DISCONNECT_POLL_INTERVAL_SECONDS", 0.01)
+    payload = api.ChatRequestPayload(user_input="Who are you?")
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(api.get_chat_response(payload, DisconnectedRequest()))  # type: ignore
+    assert exc_info.value.status_code == 499  # noqa: S101, PLR2004
+    assert agent_executor.was_cancelled  # noqa: S101
+    assert memory.saved_outputs == []  # noqa: S101  # The cancelled turn is not saved to the memory
+
+
+class FakeSession:
+    session_id = "pytest-session"
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.lock.acquire()
+
+
+def test_chat_stream_released_on_early_disconnect(monkeypatch: pytest.MonkeyPatch) -> None:
+    agent_executor, session = SlowAgentExecutor(), FakeSession()
+    turn = api.ChatTurn(agent_executor, None, {"input": "Who are you?"}, input_was_cut_off=False, return_history=False, session=session)  # type: ignore
+    monkeypatch.setattr(api, "__prepare_chat_turn", lambda _: turn)
+    events_started = []
+
+    async def stream_chat_events(_turn: api.ChatTurn) -> AsyncIterator[str]:
+        events_started.append(True)
+        yield "event: final\ndata: {}\n\n"
+
+    monkeypatch.setattr(api, "__stream_chat_events", stream_chat_events)
+
+    async def receive() -> dict[str, Any]:
+        return {"type": "http.disconnect"}
+
+    async def send(_message: dict[str, Any]) -> None:
+        await asyncio.sleep(1)  # The client disconnects before the response starts
+
+    async def run_response() -> None:
+        response = await api.stream_chat_response(api.ChatRequestPayload(user_input="Who are you?", session_id="pytest-session"))
+        await response({"type": "http"}, receive, send)
+
+    asyncio.run(run_response())
+    assert events_started == []  # noqa: S101
+    assert not session.lock.locked()  # noqa: S101  # The session is not left busy
+    turn.release()  # Releasing the turn again (e.g. when the event stream ends) has no effect
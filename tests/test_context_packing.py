@@ -0,0 +1,44 @@
+from brainsoft_code_challenge.context_packing import OMISSION_MARKER, ChunkHit, get_mmr_order, pack_documents, rank_by_mmr
+
+
+def test_mmr_order() -> None:
+    query_embedding = [1.0, 0.0, 0.0]
+    embeddings = [[0.9, 0.436, 0.0], [0.9, 0.436, 0.0], [0.8, 0.0, 0.6]]
+    assert get_mmr_order(query_embedding, embeddings, relevance_weight=1.0) == [0, 1, 2]  # noqa: S101
+    # The duplicate of the most relevant embedding is ranked last
+    assert get_mmr_order(query_embedding, embeddings, relevance_weight=0.5) == [0, 2, 1]  # noqa: S101
+
+    ranking = [{"source_url": "a.md", "split_part": 0}, {"source_url": "lexical.md"}, {"source_url": "a.md", "split_part": 1}, {"source_url": "b.md"}]
+    hits = [ChunkHit({"source_url": "a.md", "split_part": 0}, 0.9, embeddings[0]), ChunkHit({"source_url": "a.md", "split_part": 1}, 0.9, embeddings[1])]
+    hits.append(ChunkHit({"source_url": "b.md"}, 0.8, embeddings[2]))
+    reranked = rank_by_mmr(ranking, hits, query_embedding)
+    assert reranked == [ranking[0], ranking[1], ranking[3], ranking[2]]  # noqa: S101
+
+
+def test_pack_documents() -> None:
+    paragraphs = [f"Paragraph {i}. " + "word " * 95 for i in range(10)]  # 122 tokens each
+    content = "".join(paragraphs)
+    long_document = {"source_url": "long.md", "content": content, "n_tokens": len(content) // 4}
+    short_document = {"source_url": "short.md", "content": "A short page.", "n_tokens": 4}
+
+    packed_documents = pack_documents([short_document, long_document], [], token_budget=10000)
+    assert [packed_document.content for packed_document in packed_documents] == ["A short page.", content]  # noqa: S101
+    assert not any(packed_document.is_trimmed for packed_document in packed_documents)  # noqa: S101
+
+    # The long document is trimmed to its best scoring chunks that fit, in document order
+    paragraph_length = len(paragraphs[0])
+    hits = [
+        ChunkHit({"source_url": "long.md", "chunk_start": 7 * paragraph_length, "chunk_end": 8 * paragraph_length}, 0.9),
+        ChunkHit({"source_url": "long.md", "chunk_start": 2 * paragraph_length, "chunk_end": 3 * paragraph_length}, 0.8),
+        ChunkHit({"source_url": "long.md", "chunk_start": 0, "chunk_end": 4 * paragraph_length}, 0.7),
+    ]
+    packed_documents = pack_documents([long_document, short_document], hits, token_budget=400)
+    assert len(packed_documents) == 1  # noqa: S101
+    assert packed_documents[0].is_trimmed  # noqa: S101
+    assert packed_documents[0].content == OMISSION_MARKER.join(["", paragraphs[2], paragraphs[7], ""]).strip("\n")  # noqa: S101
+    assert packed_documents[0].n_tokens <= 400  # noqa: S101, PLR2004
+
+    # Without chunk positions, the beginning of the document is returned
+    packed_documents = pack_documents([long_document], [], token_budget=200)
+    assert packed_documents[0].content.startswith(paragraphs[0])  # noqa: S101
+    assert packed_documents[0].n_tokens <= 200  # noqa: S101, PLR2004
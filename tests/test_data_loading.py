@@ -2,10 +2,19 @@ from brainsoft_code_challenge.utils import load_environment
 
 load_environment()
 
+import io  # noqa: E402
 import json  # noqa: E402
+import os  # noqa: E402
+import tarfile  # noqa: E402
+from collections.abc import Iterator  # noqa: E402
+from pathlib import Path  # noqa: E402
+from typing import Any  # noqa: E402
 
-from brainsoft_code_challenge.data_loading.scraping import scrape_all  # noqa: E402
-from brainsoft_code_challenge.data_loading.splitting import __split_long_document, split_document  # noqa: E402
+import pytest  # noqa: E402
+
+from brainsoft_code_challenge.data_loading.checkpointing import PARTIAL_SUFFIX, checkpoint_stage, iter_jsonl  # noqa: E402
+from brainsoft_code_challenge.data_loading.scraping import get_document_info, get_git_blob_sha, iter_tarball_files, scrape_all  # noqa: E402
+from brainsoft_code_challenge.data_loading.splitting import __split_long_document, iter_split_documents, split_document  # noqa: E402
 
 
 def test_scraping() -> None:
@@ -13,6 +22,25 @@ def test_scraping() -> None:
     assert len(results) > 0  # noqa: S101
 
 
+def test_scraped_files() -> None:
+    with open("data/pytest/scraped_docs.json") as f:
+        data = json.load(f)
+    for document in data:
+        assert get_document_info(document["source_path"]) == {"documentation_url": document["documentation_url"], "type": document["type"]}  # noqa: S101
+    for path in ("documentation/source/404.rst", "documentation/source/rst_source/genai.rst", "examples/__init__.py", "src/genai/client.py"):
+        assert get_document_info(path) is None  # noqa: S101
+    assert get_git_blob_sha(b"hello\n") == "ce013625030ba8dba906f756967f9e9ca394464a"  # noqa: S101
+
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as f:
+        for path in ("README.md", "examples/text/generation.py", "examples/__init__.py"):
+            info = tarfile.TarInfo(f"IBM-ibm-generative-ai-abc1234/{path}")
+            info.size = len(path)
+            f.addfile(info, io.BytesIO(path.encode()))
+    archive.seek(0)
+    assert list(iter_tarball_files(archive)) == [("examples/text/generation.py", b"examples/text/generation.py")]  # noqa: S101
+
+
 def test_splitting() -> None:
     with open("data/pytest/scraped_docs.json") as f:
         data = json.load(f)
@@ -80,3 +108,26 @@ Change"""
     __test_split_long_document(content_b, min_length=1)
     __test_split_long_document(content_b, min_length=50)
     __test_split_long_document(content_b, min_length=100)
+
+
+def test_checkpoint_stage(tmp_path: Path) -> None:
+    with open("data/pytest/scraped_docs.json") as f:
+        data = json.load(f)
+    path = str(tmp_path / "split_docs.jsonl")
+    expected_splits = list(iter_split_documents(data))
+
+    def __run_stage(done_source_paths: set[str], fail_after: int | None = None) -> Iterator[dict[str, Any]]:
+        for i, split in enumerate(iter_split_documents(document for document in data if document["source_path"] not in done_source_paths)):
+            if i == fail_after:
+                raise RuntimeError("Interrupted")
+            yield split
+
+    with pytest.raises(RuntimeError):
+        list(checkpoint_stage(path, lambda done_source_paths: __run_stage(done_source_paths, fail_after=5), lambda split: split["source_path"]))
+    with open(path + PARTIAL_SUFFIX, "a") as f:
+        f.write('{"source_path": "partially written')
+    assert not os.path.exists(path)  # noqa: S101
+
+    assert list(checkpoint_stage(path, __run_stage, lambda split: split["source_path"])) == expected_splits  # noqa: S101
+    assert list(iter_jsonl(path)) == expected_splits  # noqa: S101
+    assert list(checkpoint_stage(path, lambda _: [], lambda split: split["source_path"])) == expected_splits  # noqa: S101
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from brainsoft_code_challenge.data_loading.indexing import build_index
+from brainsoft_code_challenge.data_loading.splitting import iter_split_documents
+from brainsoft_code_challenge.embedders import HashingEmbeddings, LocalEmbeddings, get_embedder
+from brainsoft_code_challenge.embedding_profile import HASHING_EMBEDDING_MODEL, EmbeddingProfile
+from brainsoft_code_challenge.timing import StageTimer
+from brainsoft_code_challenge.tools import documentation_search
+from brainsoft_code_challenge.vector_store import VectorStore
+
+
+def test_hashing_embeddings() -> None:
+    embedder = get_embedder(EmbeddingProfile(model=HASHING_EMBEDDING_MODEL, dimensions=64, backend="hashing"))
+    assert isinstance(embedder, HashingEmbeddings)  # noqa: S101
+    embeddings = np.array(embedder.embed_documents(["Generate text with a model", "generate text", "Tune a model"]))
+    assert embeddings.shape == (3, 64)  # noqa: S101, PLR2004
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0)  # noqa: S101
+    assert embeddings[0] @ embeddings[1] > embeddings[1] @ embeddings[2]  # noqa: S101
+    assert embedder.embed_query("Generate text with a model") == embeddings[0].tolist()  # noqa: S101
+
+
+def test_stage_timer() -> None:
+    timer = StageTimer()
+    for _ in range(3):
+        with timer.measure("stage"):
+            pass
+    percentiles = timer.get_percentiles()
+    assert percentiles["stage"]["n"] == 3  # noqa: S101, PLR2004
+    assert 0 <= percentiles["stage"]["p50"] <= percentiles["stage"]["p99"]  # noqa: S101
+
+
+class FakeSentenceTransformer:
+    def __init__(self) -> None:
+        self.batches: list[tuple[str, list[str]]] = []
+
+    def encode(self, texts: list[str], batch_size: int, convert_to_numpy: bool, normalize_embeddings: bool) -> np.ndarray:
+        assert batch_size == len(texts) and convert_to_numpy and normalize_embeddings  # noqa: S101
+        self.batches.append((threading.current_thread().name, texts))
+        time.sleep(0.05)  # Inference releases the GIL, so the batches overlap
+        return np.array([[float(len(text)), 1.0, 1.0, 1.0] for text in texts])
+
+
+def test_local_embeddings(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    profile = EmbeddingProfile(model=str(tmp_path / "all-MiniLM-L6-v2"), dimensions=2, backend="local")
+    assert profile.name == "local/all-MiniLM-L6-v2:2"  # noqa: S101
+    with pytest.raises(FileNotFoundError):
+        get_embedder(profile)
+
+    (tmp_path / "all-MiniLM-L6-v2").mkdir()
+    embedder = get_embedder(profile)
+    assert isinstance(embedder, LocalEmbeddings)  # noqa: S101
+    embedder = LocalEmbeddings(profile.model, profile.dimensions, batch_size=2, max_workers=3)
+    model = FakeSentenceTransformer()
+    monkeypatch.setattr(embedder, "get_model", lambda: model)
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+    start_time = time.monotonic()
+    embeddings = np.array(embedder.embed_documents(texts))
+    assert time.monotonic() - start_time < 0.12  # noqa: S101, PLR2004  # The three batches run concurrently
+    assert sorted(batch for _, batch in model.batches) == [["a", "bb"], ["ccc", "dddd"], ["eeeee"]]  # noqa: S101
+    assert all(thread_name.startswith("local-embeddings") for thread_name, _ in model.batches)  # noqa: S101
+    assert embeddings.shape == (5, 2)  # noqa: S101, PLR2004  # Shortened to the dimensions of the profile, in the order of the texts
+    assert np.allclose(embeddings[:, 0] / embeddings[:, 1], [len(text) for text in texts])  # noqa: S101
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0)  # noqa: S101
+    assert embedder.embed_documents([]) == []  # noqa: S101
+
+
+@pytest.mark.usefixtures("stub_tokenizer")
+def test_offline_retrieval(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    with open("data/pytest/scraped_docs.json") as f:
+        data = json.load(f)
+    profile = EmbeddingProfile(model=HASHING_EMBEDDING_MODEL, dtype="float32", backend="hashing")
+    vector_store = VectorStore(backend="numpy", profile=profile, index_dir=str(tmp_path), embedding_cache_path=None)
+    build_index(iter_split_documents(data), backends=["numpy"], vector_store=vector_store)
+    assert vector_store.get_numpy_index().metadata["embedding_backend"] == "hashing"  # noqa: S101
+
+    monkeypatch.setattr(documentation_search, "vector_store", vector_store)
+    output = documentation_search.search_documentation.run({"query": "How do I create a prompt template with variables?"})
+    assert output.startswith("Documentation page URL: https://ibm.github.io/ibm-generative-ai/")  # noqa: S101
+    async_output = asyncio.run(documentation_search.search_documentation.ainvoke({"query": "How do I create a prompt template with variables?"}))
+    assert async_output == output  # noqa: S101
+
+
+@pytest.mark.usefixtures("stub_tokenizer")
+def test_batch_search(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    with open("data/pytest/scraped_docs.json") as f:
+        data = json.load(f)
+    profile = EmbeddingProfile(model=HASHING_EMBEDDING_MODEL, dtype="float32", backend="hashing")
+    vector_store = VectorStore(backend="numpy", profile=profile, index_dir=str(tmp_path), embedding_cache_path=None)
+    build_index(iter_split_documents(data), backends=["numpy"], vector_store=vector_store)
+    monkeypatch.setattr(documentation_search, "vector_store", vector_store)
+
+    queries = ["How do I create a prompt template with variables?", "PromptTemplate", "How can I limit the number of parallel requests?"]
+    search = getattr(documentation_search, "__search")
+    for batch_result, query in zip(search(queries, n_results=5), queries, strict=True):  # The batch returns the per-query results
+        result = search([query], n_results=5)[0]
+        assert batch_result.ranking == result.ranking  # noqa: S101
+        assert batch_result.query_embedding == result.query_embedding  # noqa: S101
+        assert [hit.metadata for hit in batch_result.chunk_hits] == [hit.metadata for hit in result.chunk_hits]  # noqa: S101
+        # The scores of a batched vector query may differ in the last bits
+        assert [hit.score for hit in batch_result.chunk_hits] == pytest.approx([hit.score for hit in result.chunk_hits])  # noqa: S101
+
+    output = documentation_search.search_documentation_batch.run({"queries": queries})
+    assert output == asyncio.run(documentation_search.search_documentation_batch.ainvoke({"queries": queries}))  # noqa: S101
+    for query in queries:  # The best document of each query is included
+        best_url = documentation_search.search_documentation.run({"query": query}).split("\n")[0]
+        assert best_url in output  # noqa: S101
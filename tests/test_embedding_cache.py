@@ -0,0 +1,53 @@
+import asyncio
+import threading
+from collections.abc import Sequence
+from pathlib import Path
+
+import pytest
+
+from brainsoft_code_challenge.embedding_cache import EmbeddingCache
+from brainsoft_code_challenge.embedding_profile import HASHING_EMBEDDING_MODEL, EmbeddingProfile
+from brainsoft_code_challenge.vector_store import VectorStore
+
+
+def test_embedding_cache(tmp_path: Path) -> None:
+    path = str(tmp_path / "embedding_cache.sqlite")
+    cache = EmbeddingCache(path, max_entries=2)
+    assert cache.get("query", "model") is None  # noqa: S101
+    cache.put("query", "model", [0.5, 0.25])
+    assert cache.get("  query\n", "model") == [0.5, 0.25]  # noqa: S101
+    assert cache.get("query", "other-model") is None  # noqa: S101
+    assert cache.get_stats() == {"hits": 1, "misses": 2, "hit_rate": 1 / 3}  # noqa: S101
+
+    shared_cache = EmbeddingCache(path, max_entries=2)
+    assert shared_cache.get("query", "model") == [0.5, 0.25]  # noqa: S101
+
+
+def test_embedding_cache_eviction(tmp_path: Path) -> None:
+    cache = EmbeddingCache(str(tmp_path / "embedding_cache.sqlite"), max_entries=2)
+    cache.put("a", "model", [1.0])
+    cache.put("b", "model", [2.0])
+    assert cache.get("a", "model") == [1.0]  # noqa: S101
+    cache.put("c", "model", [3.0])
+    assert cache.get("b", "model") is None  # noqa: S101
+    assert cache.get("a", "model") == [1.0]  # noqa: S101
+    assert cache.get("c", "model") == [3.0]  # noqa: S101
+
+
+def test_async_query_embeddings(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    profile = EmbeddingProfile(model=HASHING_EMBEDDING_MODEL, dtype="float32", backend="hashing")
+    vector_store = VectorStore(profile=profile, index_dir=str(tmp_path), embedding_cache_path=str(tmp_path / "embedding_cache.sqlite"))
+    cache = vector_store.get_embedding_cache()
+    assert cache is not None  # noqa: S101
+    cache_threads = set()
+    for method_name in ("get", "put"):
+        method = getattr(cache, method_name)
+        monkeypatch.setattr(cache, method_name, lambda *args, method=method: cache_threads.add(threading.get_ident()) or method(*args))
+
+    async def embed_queries() -> tuple[list[Sequence[float]], int]:
+        return await vector_store.aembed_queries(["first query", "second query"]), threading.get_ident()
+
+    embeddings, loop_thread = asyncio.run(embed_queries())
+    assert asyncio.run(embed_queries())[0] == embeddings  # noqa: S101
+    assert cache.get_stats()["hits"] == 2  # noqa: S101, PLR2004
+    assert cache_threads and loop_thread not in cache_threads  # noqa: S101  # The SQLite cache is not accessed on the event loop
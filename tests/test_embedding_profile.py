@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from brainsoft_code_challenge.embedding_profile import HASHING_EMBEDDING_MODEL, EmbeddingProfile, EmbeddingProfileMismatchError, truncate_embeddings
+
+
+def test_embedding_profile() -> None:
+    profile = EmbeddingProfile(model="text-embedding-3-large", dimensions=256, dtype="int8")
+    assert profile.name == "text-embedding-3-large:256"  # noqa: S101
+    assert EmbeddingProfile.from_metadata(profile.to_metadata()) == profile  # noqa: S101
+    assert EmbeddingProfile.from_metadata({"hnsw:space": "ip"}).name == "text-embedding-3-large"  # noqa: S101
+
+    profile.check_compatible(EmbeddingProfile(model="text-embedding-3-large", dimensions=256, dtype="float32").to_metadata(), "test")
+    with pytest.raises(EmbeddingProfileMismatchError):
+        profile.check_compatible({}, "test")
+    with pytest.raises(EmbeddingProfileMismatchError):
+        EmbeddingProfile(model="text-embedding-3-large", backend="hashing").check_compatible(profile.to_metadata(), "test")
+
+    # ChromaDB collections created without the inner product space use the L2 distance, which the search would misread
+    profile.check_compatible({"hnsw:space": "ip", **profile.to_metadata()}, "chromadb")
+    with pytest.raises(EmbeddingProfileMismatchError):
+        profile.check_compatible(profile.to_metadata(), "chromadb")
+    with pytest.raises(EmbeddingProfileMismatchError):
+        profile.check_compatible({"hnsw:space": "l2", **profile.to_metadata()}, "chromadb")
+
+
+def test_legacy_hashing_profile() -> None:
+    profile = EmbeddingProfile(model=HASHING_EMBEDDING_MODEL, dimensions=None, dtype="float32", backend="hashing")
+    assert profile.name == "hashing"  # noqa: S101  # As before the backends were recorded, so the chunk ids and baselines stay valid
+    legacy_metadata = {"embedding_model": "hashing", "embedding_dimensions": 0, "embedding_dtype": "float32"}
+    assert EmbeddingProfile.from_metadata(legacy_metadata) == profile  # noqa: S101
+    profile.check_compatible(legacy_metadata, "test")
+
+
+def test_truncate_embeddings() -> None:
+    embeddings = np.array([[3.0, 4.0, 12.0], [0.0, 0.0, 1.0]])
+    assert np.allclose(truncate_embeddings(embeddings, 2), [[0.6, 0.8], [0.0, 0.0]])  # noqa: S101
+    assert np.allclose(np.linalg.norm(truncate_embeddings(embeddings, None), axis=1), 1.0)  # noqa: S101
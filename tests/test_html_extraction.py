@@ -0,0 +1,48 @@
+import glob
+
+import pytest
+
+from brainsoft_code_challenge.html_extraction import IS_LXML_AVAILABLE, decode_body, extract_main_text, is_supported_content_type
+
+PARSERS = [
+    pytest.param(False, id="html.parser"),
+    pytest.param(True, id="lxml", marks=pytest.mark.skipif(not IS_LXML_AVAILABLE, reason="The lxml extra is not installed")),
+]
+
+PAGE = """<html class="menu-open"><head><title>Installation</title><style>p { color: red; }</style></head><body>
+<nav><a href="/">Home</a> <a href="/docs">Documentation, guides and tutorials for everyone</a></nav>
+<div class="sidebar"><p>Related posts: a long list of links to other pages, which should be skipped</p></div>
+<div id="content"><h1>Installing the SDK</h1><p>Install the SDK with pip, which takes care of the dependencies, and import it.<br>Then set the API key.
+<p>Unclosed paragraph, with enough text, commas, and details to be scored as content.</div>
+<footer>Copyright 2024, all rights reserved, by the company that wrote this page.</footer>
+<script>document.write("<p>Not a paragraph</p>");</script></body></html>"""
+
+
+@pytest.mark.parametrize("use_lxml", PARSERS)
+def test_extract_main_text(use_lxml: bool) -> None:
+    assert extract_main_text(PAGE, use_lxml) == (  # noqa: S101
+        "Installing the SDK Install the SDK with pip, which takes care of the dependencies, and import it. Then set the API key."
+        " Unclosed paragraph, with enough text, commas, and details to be scored as content."
+    )
+    # Without a container that holds most of the text, all text except the boilerplate is returned
+    page = "<p>First short paragraph.</p><span>Second</span> &amp; <b>third</b>"
+    assert extract_main_text(page, use_lxml) == "First short paragraph. Second & third"  # noqa: S101
+    assert extract_main_text(PAGE[: PAGE.index("Then set")], use_lxml).endswith("and import it.")  # noqa: S101  # Truncated pages
+
+
+@pytest.mark.skipif(not IS_LXML_AVAILABLE, reason="The lxml extra is not installed")
+@pytest.mark.parametrize("path", sorted(glob.glob("data/benchmark/pages/*.html")))
+def test_parsers_agree(path: str) -> None:
+    with open(path, encoding="utf-8") as f:
+        html = f.read()
+    text = extract_main_text(html, use_lxml=False)
+    assert text  # noqa: S101
+    assert extract_main_text(html, use_lxml=True) == text  # noqa: S101
+
+
+def test_content_types() -> None:
+    assert is_supported_content_type("text/html; charset=utf-8")  # noqa: S101
+    assert is_supported_content_type(None)  # noqa: S101
+    assert not is_supported_content_type("application/pdf")  # noqa: S101
+    assert decode_body("Příliš".encode("cp1250"), "text/html; charset=windows-1250") == "Příliš"  # noqa: S101
+    assert decode_body("Příliš".encode(), "text/html; charset=unknown") == "Příliš"  # noqa: S101
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import httpx
+import pytest
+
+from brainsoft_code_challenge import http_clients
+from brainsoft_code_challenge.config import HTTP_KEEPALIVE_EXPIRY_SECONDS, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS
+from brainsoft_code_challenge.http_clients import (
+    IS_HTTP2_AVAILABLE,
+    AsyncCachingNetworkBackend,
+    CachingNetworkBackend,
+    DnsCache,
+    close_async_http_client,
+    get_async_http_client,
+    get_http_client,
+)
+from brainsoft_code_challenge.llm import RateLimitedChatOpenAI, RateLimitedOpenAIEmbeddings
+from brainsoft_code_challenge.rate_limiting import Priority
+
+
+def test_dns_cache() -> None:
+    lookups = []
+
+    def getaddrinfo(host: str, port: int, **_kwargs: Any) -> list[tuple[Any, ...]]:
+        lookups.append(host)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("192.0.2.1", port)), (socket.AF_INET, socket.SOCK_STREAM, 6, "", ("192.0.2.1", port))]
+
+    dns_cache = DnsCache(ttl_seconds=60, max_entries=1)
+    dns_cache._getaddrinfo = getaddrinfo
+    assert dns_cache.resolve("example.com", 443) == ["192.0.2.1"]  # noqa: S101
+    assert dns_cache.resolve("example.com", 443) == ["192.0.2.1"]  # noqa: S101
+    assert (dns_cache.n_hits, dns_cache.n_misses) == (1, 1)  # noqa: S101
+    dns_cache.resolve("example.org", 443)  # Evicts the least recently used host
+    dns_cache.resolve("example.com", 443)
+    assert len(lookups) == 3  # noqa: S101, PLR2004
+
+    dns_cache.ttl_seconds = 0  # Expired entries are resolved again
+    dns_cache.resolve("example.net", 443)
+    assert dns_cache.get("example.net", 443) is None  # noqa: S101
+    dns_cache.resolve("example.net", 443)
+    assert len(lookups) == 5  # noqa: S101, PLR2004
+
+
+def test_dns_cache_scope(monkeypatch: pytest.MonkeyPatch) -> None:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    dns_cache = DnsCache(ttl_seconds=60, max_entries=10)
+    monkeypatch.setattr(http_clients, "dns_cache", dns_cache)
+    get_http_client.cache_clear()
+    getaddrinfo = socket.getaddrinfo
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://localhost:{server.server_address[1]}/"
+        assert get_http_client().get(url).text == "ok"  # noqa: S101
+
+        async def get() -> httpx.Response:
+            return await get_async_http_client().get(url)
+
+        assert asyncio.run(get()).text == "ok"  # noqa: S101
+        assert (dns_cache.n_misses, dns_cache.n_hits) == (1, 1)  # noqa: S101  # The async client reused the cached addresses
+        assert socket.getaddrinfo is getaddrinfo  # noqa: S101  # The resolver of the rest of the process is untouched
+    finally:
+        server.shutdown()
+        server.server_close()
+        get_http_client().close()
+        get_http_client.cache_clear()
+
+
+def test_caching_transports() -> None:
+    # The shared clients replace the private connection pool of the httpx transports, which a new httpx version may break
+    async def get_client() -> httpx.AsyncClient:
+        return get_async_http_client()
+
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=min(HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS),
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    )
+    transports = [
+        (get_http_client()._transport, httpx.HTTPTransport(http2=IS_HTTP2_AVAILABLE, limits=limits), CachingNetworkBackend),
+        (asyncio.run(get_client())._transport, httpx.AsyncHTTPTransport(http2=IS_HTTP2_AVAILABLE, limits=limits), AsyncCachingNetworkBackend),
+    ]
+    for transport, default_transport, backend_type in transports:
+        pool, default_pool = transport._pool, default_transport._pool  # type: ignore
+        assert type(pool) is type(default_pool) and isinstance(pool._network_backend, backend_type)  # noqa: S101
+        options = ("_max_connections", "_max_keepalive_connections", "_keepalive_expiry", "_http1", "_http2", "_retries", "_local_address", "_uds")
+        assert [getattr(pool, option) for option in options] == [getattr(default_pool, option) for option in options]  # noqa: S101
+
+
+def test_shared_clients() -> None:
+    async def get_clients() -> tuple[httpx.AsyncClient, httpx.AsyncClient]:
+        return get_async_http_client(), get_async_http_client()
+
+    first_client, second_client = asyncio.run(get_clients())
+    assert first_client is second_client  # noqa: S101
+    assert asyncio.run(get_clients())[0] is not first_client  # noqa: S101  # Each event loop has its own async client
+
+    async def close_client() -> tuple[httpx.AsyncClient, httpx.AsyncClient]:
+        client = get_async_http_client()
+        await close_async_http_client()
+        return client, get_async_http_client()
+
+    closed_client, new_client = asyncio.run(close_client())
+    assert closed_client.is_closed and closed_client is not new_client  # noqa: S101
+
+    embedder = RateLimitedOpenAIEmbeddings(openai_api_key="sk-test")
+    background_embedder = embedder.with_priority(Priority.BACKGROUND)
+    assert background_embedder.priority == Priority.BACKGROUND  # noqa: S101
+    assert embedder.client._client._client is background_embedder.client._client._client is get_http_client()  # noqa: S101
+
+
+@pytest.mark.usefixtures("stub_tokenizer")
+def test_client_options() -> None:
+    chat = RateLimitedChatOpenAI(openai_api_key="sk-test", openai_api_base="http://localhost:1/v1", request_timeout=5, max_retries=1)
+    assert (chat.client._client.api_key, str(chat.client._client.base_url)) == ("sk-test", "http://localhost:1/v1/")  # noqa: S101
+    assert (chat.client._client.timeout, chat.client._client.max_retries) == (5, 1)  # noqa: S101
+    assert chat.client._client._client is get_http_client()  # noqa: S101
+    assert (chat.async_client.client_options["timeout"], chat.async_client.client_options["max_retries"]) == (5, 1)  # noqa: S101
+
+    class Handler(BaseHTTPRequestHandler):
+        requests: list[tuple[str, str | None]] = []
+
+        def do_POST(self) -> None:  # noqa: N802
+            self.rfile.read(int(self.headers["Content-Length"]))
+            Handler.requests.append((self.path, self.headers.get("Authorization")))
+            body = json.dumps({"object": "list", "data": [{"object": "embedding", "index": 0, "embedding": [1.0, 0.0]}], "model": "m"}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        embedder = RateLimitedOpenAIEmbeddings(openai_api_key="sk-test", openai_api_base=f"http://127.0.0.1:{server.server_address[1]}/v1")
+        assert asyncio.run(embedder.aembed_query("text")) == [1.0, 0.0]  # noqa: S101
+        assert Handler.requests == [("/v1/embeddings", "Bearer sk-test")]  # noqa: S101  # The async client of the loop has the options of the model
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    own_client = httpx.Client()
+    assert RateLimitedOpenAIEmbeddings(openai_api_key="sk-test", http_client=own_client).client._client._client is own_client  # noqa: S101
@@ -0,0 +1,141 @@
+import json
+import threading
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+
+import pytest
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from brainsoft_code_challenge.data_loading.indexing import Chunk, EmbeddingPipeline, NumpyIndexWriter, chunk_documents, get_moved_metadatas, summarize_update
+from brainsoft_code_challenge.embedding_profile import EmbeddingProfile, EmbeddingProfileMismatchError
+from brainsoft_code_challenge.numpy_index import NumpyVectorIndex
+
+PROFILE = EmbeddingProfile(dtype="float32")
+
+
+class CountingEmbedder:
+    def __init__(self) -> None:
+        self.embedded_texts: list[str] = []
+        self.n_calls = 0
+
+    def embed_documents(self, texts: Sequence[str]) -> list[list[float]]:
+        self.n_calls += 1
+        self.embedded_texts.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def run_pipeline(writer: NumpyIndexWriter, data: Sequence[dict], text_splitter: RecursiveCharacterTextSplitter) -> tuple[EmbeddingPipeline, CountingEmbedder]:
+    embedder = CountingEmbedder()
+    pipeline = EmbeddingPipeline([writer], embedder, text_splitter, len, max_concurrent_requests=2, batch_size=16)  # type: ignore
+    pipeline.run(data)
+    writer.finalize()
+    return pipeline, embedder
+
+
+def test_incremental_indexing(tmp_path: Path) -> None:
+    with open("data/pytest/scraped_docs.json") as f:
+        data = json.load(f)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    chunks = chunk_documents(data, text_splitter)
+    assert chunks.keys() == chunk_documents(data, text_splitter).keys()  # noqa: S101
+
+    path = str(tmp_path / "index.bin")
+    writer = NumpyIndexWriter(PROFILE, path, reset=True)
+    metadatas = {chunk_id: chunk.metadata for chunk_id, chunk in chunks.items()}
+    assert summarize_update(writer.get_existing_metadatas(), metadatas).added == len(chunks)  # noqa: S101
+    pipeline, embedder = run_pipeline(writer, data, text_splitter)
+    assert pipeline.chunk_metadatas.keys() == chunks.keys()  # noqa: S101
+    assert sorted(embedder.embedded_texts) == sorted({chunk.text for chunk in chunks.values()})  # noqa: S101
+    index = NumpyVectorIndex(path)
+    assert sorted(index.ids) == sorted(chunks)  # noqa: S101
+    assert all(embedding[0] == len(chunks[chunk_id].text) for chunk_id, embedding in zip(index.ids, index.get_embeddings(), strict=True))  # noqa: S101
+
+    pipeline, embedder = run_pipeline(NumpyIndexWriter(PROFILE, path), data, text_splitter)
+    assert pipeline.n_embedded_chunks == 0  # noqa: S101
+    assert not embedder.embedded_texts  # noqa: S101
+    with pytest.raises(EmbeddingProfileMismatchError):
+        NumpyIndexWriter(EmbeddingProfile(dimensions=256, dtype="float32"), path)
+
+    changed_data = [dict(document) for document in data[:-1]]
+    changed_data[0]["content"] = "Changed introduction.\n\n" + changed_data[0]["content"][1000:]
+    new_chunks = chunk_documents(changed_data, text_splitter)
+    writer = NumpyIndexWriter(PROFILE, path)
+    summary = summarize_update(writer.get_existing_metadatas(), {chunk_id: chunk.metadata for chunk_id, chunk in new_chunks.items()})
+    assert summary.changed > 0  # noqa: S101
+    assert summary.removed >= len(chunk_documents(data[-1:], text_splitter))  # noqa: S101
+    assert summary.unchanged + summary.changed + summary.added == len(new_chunks)  # noqa: S101
+    assert summary.unchanged + summary.changed + summary.removed == len(chunks)  # noqa: S101
+
+
+def test_duplicate_texts_across_batches(tmp_path: Path) -> None:
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=20, chunk_overlap=0)
+    all_chunked = threading.Event()
+
+    def iter_data() -> Iterator[dict[str, str]]:
+        for i in range(4):
+            yield {"source_url": f"https://example.com/{i}", "source_path": f"{i}.md", "content": f"Shared paragraph.\n\nOwn text {i}."}
+        all_chunked.set()
+
+    class BlockingEmbedder(CountingEmbedder):
+        def embed_documents(self, texts: Sequence[str]) -> list[list[float]]:
+            all_chunked.wait()  # All chunks are queued while the first batch is in flight
+            return super().embed_documents(texts)
+
+    writer = NumpyIndexWriter(PROFILE, str(tmp_path / "index.bin"), reset=True)
+    embedder = BlockingEmbedder()
+    pipeline = EmbeddingPipeline([writer], embedder, text_splitter, len, max_concurrent_requests=2, batch_size=1)  # type: ignore
+    pipeline.run(iter_data())
+    assert pipeline.n_embedded_chunks == 8  # noqa: S101, PLR2004
+    assert sorted(embedder.embedded_texts) == sorted(["Shared paragraph."] + [f"Own text {i}." for i in range(4)])  # noqa: S101
+    assert embedder.n_calls == 5  # noqa: S101, PLR2004  # Batches of only repeated texts don't call the embedder
+    assert not pipeline.text_embeddings and not pipeline.text_references  # noqa: S101  # The embeddings are dropped once upserted
+    writer.finalize()
+    index = NumpyVectorIndex(str(tmp_path / "index.bin"))
+    embeddings = dict(zip(index.ids, index.get_embeddings().tolist(), strict=True))
+    shared_ids = [chunk_id for chunk_id, embedding in embeddings.items() if embedding == [float(len("Shared paragraph.")), 1.0]]
+    assert len(shared_ids) == 4  # noqa: S101, PLR2004
+
+
+def test_numpy_index_writer_update(tmp_path: Path) -> None:
+    path = str(tmp_path / "index.bin")
+    writer = NumpyIndexWriter(PROFILE, path, reset=True)
+    chunks = [Chunk(f"chunk-{i}", f"Text {i}.", {"i": i}) for i in range(5)]
+    writer.upsert(chunks[:3], [[float(i), 1.0] for i in range(3)])
+    writer.upsert(chunks[1:2], [[10.0, 1.0]])  # Replaces the row appended before
+    writer.finalize()
+    index = NumpyVectorIndex(path)
+    embeddings = {"chunk-0": [0.0, 1.0], "chunk-1": [10.0, 1.0], "chunk-2": [2.0, 1.0]}
+    assert dict(zip(index.ids, index.get_embeddings().tolist(), strict=True)) == embeddings  # noqa: S101
+
+    writer = NumpyIndexWriter(PROFILE, path)
+    assert writer.snapshot_rows == {"chunk-0": 0, "chunk-1": 1, "chunk-2": 2}  # noqa: S101  # The snapshot is not loaded into memory
+    writer.delete(["chunk-0"])
+    writer.upsert(chunks[2:], [[20.0, 1.0], [3.0, 1.0], [4.0, 1.0]])
+    writer.update_metadatas({"chunk-1": {"i": 11}})
+    writer.finalize()
+    index = NumpyVectorIndex(path)
+    embeddings = {"chunk-1": [10.0, 1.0], "chunk-2": [20.0, 1.0], "chunk-3": [3.0, 1.0], "chunk-4": [4.0, 1.0]}
+    assert dict(zip(index.ids, index.get_embeddings().tolist(), strict=True)) == embeddings  # noqa: S101
+    metadatas = {"chunk-1": {"i": 11}, "chunk-2": {"i": 2}, "chunk-3": {"i": 3}, "chunk-4": {"i": 4}}
+    assert dict(zip(index.ids, index.metadatas, strict=True)) == metadatas  # noqa: S101
+
+
+def test_moved_chunks(tmp_path: Path) -> None:
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=25, chunk_overlap=0)
+    document = {"source_url": "https://example.com", "source_path": "index.md", "content": "Introduction.\n\nUnchanged paragraph."}
+    path = str(tmp_path / "index.bin")
+    run_pipeline(NumpyIndexWriter(PROFILE, path, reset=True), [document], text_splitter)
+
+    changed_document = {**document, "content": "A longer introduction.\n\nUnchanged paragraph."}
+    writer = NumpyIndexWriter(PROFILE, path)
+    pipeline, embedder = run_pipeline(writer, [changed_document], text_splitter)
+    assert "Unchanged paragraph." not in embedder.embedded_texts  # noqa: S101
+    moved_metadatas = get_moved_metadatas(pipeline.existing_metadatas[writer.name], pipeline.chunk_metadatas)
+    assert len(moved_metadatas) == 1  # noqa: S101
+    writer.update_metadatas(moved_metadatas)
+    writer.finalize()
+
+    index = NumpyVectorIndex(path)
+    metadata = index.metadatas[index.ids.index(next(iter(moved_metadatas)))]
+    content = changed_document["content"]
+    assert content[int(metadata["chunk_start"]) : int(metadata["chunk_end"])] == "Unchanged paragraph."  # noqa: S101
@@ -0,0 +1,41 @@
+import json
+from pathlib import Path
+
+from brainsoft_code_challenge.lexical_index import BM25Index, get_query_identifiers, tokenize
+
+SOURCE_URL_PREFIX = "https://raw.githubusercontent.com/IBM/ibm-generative-ai/main"
+
+
+def test_tokenize() -> None:
+    tokens = tokenize("client = Client(credentials=Credentials.from_env())")
+    assert "credentials.from_env" in tokens  # noqa: S101
+    assert {"credentials", "from_env", "from", "env", "client"} <= set(tokens)  # noqa: S101
+    assert {"localserver", "local", "server"} <= set(tokenize("LocalServer"))  # noqa: S101
+    assert get_query_identifiers("How do I use Credentials.from_env with LocalServer?") == ["credentials.from_env", "localserver"]  # noqa: S101
+    assert get_query_identifiers("how do I stream generated text") == []  # noqa: S101
+
+
+def test_bm25_index(tmp_path: Path) -> None:
+    with open("data/pytest/scraped_docs.json") as f:
+        data = json.load(f)
+    path = str(tmp_path / "lexical_index.json")
+    BM25Index.build(data).save(path)
+    index = BM25Index.load(path)
+
+    results = index.search("LocalServer", n_results=3)
+    assert results[0][0] == {"source_url": f"{SOURCE_URL_PREFIX}/examples/extensions/localserver/local_server.py", "split_part": -1}  # noqa: S101
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)  # noqa: S101
+    assert index.is_confident_match("LocalServer", results)  # noqa: S101
+
+    query = "how do I stream generated text"
+    results = index.search(query, n_results=3)
+    assert len(results) == 3  # noqa: S101, PLR2004
+    assert not index.is_confident_match(query, results)  # noqa: S101
+    assert index.search("nonexistentterm", n_results=3) == []  # noqa: S101
+
+
+def test_bm25_index_from_texts() -> None:
+    index = BM25Index.from_texts(["Install the SDK with pip.", "Generate text with a model.", "Tune a model with your data."])
+    assert [i for i, _ in index.rank("generate text", 3)] == [1]  # noqa: S101
+    assert [i for i, _ in index.rank("model", 3)] == [1, 2]  # noqa: S101
+    assert index.search("model", 3) == [({}, score) for _, score in index.rank("model", 3)]  # noqa: S101
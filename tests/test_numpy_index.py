@@ -0,0 +1,44 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from brainsoft_code_challenge.numpy_index import InvalidSnapshotError, NumpyVectorIndex, write_numpy_index
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_numpy_index_query(tmp_path: Path, dtype: str) -> None:
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(50, 16)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    ids = [f"id{i}" for i in range(len(embeddings))]
+    metadatas = [{"source_url": f"url{i}", "chunk": i} for i in range(len(embeddings))]
+    path = str(tmp_path / "index.bin")
+    write_numpy_index(path, ids, embeddings.tolist(), metadatas, dtype=dtype, metadata={"model": "test"})
+
+    index = NumpyVectorIndex(path)
+    assert len(index) == len(embeddings)  # noqa: S101
+    assert index.metadata == {"model": "test"}  # noqa: S101
+    assert np.allclose(index.get_embeddings(), embeddings, atol=0.01)  # noqa: S101
+
+    result = index.query(embeddings[[3, 7]].tolist(), n_results=5)
+    assert [ids[0] for ids in result["ids"]] == ["id3", "id7"]  # noqa: S101
+    assert result["metadatas"][0][0] == {"source_url": "url3", "chunk": 3}  # noqa: S101
+    assert all(len(ids) == 5 for ids in result["ids"])  # noqa: S101, PLR2004
+    assert result["distances"][0] == sorted(result["distances"][0])  # noqa: S101
+    assert abs(result["distances"][0][0]) < 0.01  # noqa: S101, PLR2004
+
+    exact_scores = embeddings @ embeddings[3]
+    assert set(result["ids"][0]) == {ids[i] for i in np.argsort(-exact_scores)[:5]}  # noqa: S101
+
+
+def test_numpy_index_empty_and_invalid(tmp_path: Path) -> None:
+    path = str(tmp_path / "index.bin")
+    write_numpy_index(path, [], [], [])
+    result = NumpyVectorIndex(path).query([[1.0, 0.0]], n_results=3)
+    assert result == {"ids": [[]], "metadatas": [[]], "distances": [[]]}  # noqa: S101
+
+    with open(path, "wb") as f:
+        f.write(b"not an index")
+    with pytest.raises(InvalidSnapshotError):
+        NumpyVectorIndex(path)
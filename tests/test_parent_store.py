@@ -0,0 +1,19 @@
+import json
+from pathlib import Path
+
+from brainsoft_code_challenge.data_loading.splitting import split_document
+from brainsoft_code_challenge.parent_store import NO_SPLIT_PART, ParentStore, get_parent_key, get_parent_reference
+
+
+def test_parent_store(tmp_path: Path) -> None:
+    with open("data/pytest/scraped_docs.json") as f:
+        data = json.load(f)
+    splits = [split for document in data for split in split_document(document)]
+    store = ParentStore(str(tmp_path / "parent_store.sqlite"))
+    store.write(splits)
+    store.write(splits)  # Rewriting replaces the contents
+
+    chunk_metadatas = [{"chunk": 0, **get_parent_reference(split)} for split in (splits[3], splits[0], splits[-1])]
+    keys = [get_parent_key(metadata) for metadata in chunk_metadatas] + [("missing", NO_SPLIT_PART)]
+    assert store.get_many(keys) == [splits[3], splits[0], splits[-1]]  # noqa: S101
+    assert get_parent_key({"source_url": "url"}) == ("url", NO_SPLIT_PART)  # noqa: S101
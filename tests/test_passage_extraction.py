@@ -0,0 +1,33 @@
+import pytest
+
+from brainsoft_code_challenge.constants import OMISSION_MARKER
+from brainsoft_code_challenge.passage_extraction import extract_passages, split_passages
+from brainsoft_code_challenge.tokenizer import count_tokens
+
+FILLER = " ".join(f"Paragraph {i} describes the gardening tips of the week." for i in range(200))
+ANSWER = "The latest version of the ibm-generative-ai package is 2.2.0, released in February."
+
+
+def test_split_passages() -> None:
+    passages = split_passages(f"{FILLER} {'x' * 50} {'word ' * 300}", passage_length=200)
+    assert all(len(passage) <= 200 for passage in passages)  # noqa: S101, PLR2004
+    assert " ".join(passages) == " ".join(f"{FILLER} {'x' * 50} {'word ' * 300}".split())  # noqa: S101
+
+
+@pytest.mark.usefixtures("stub_tokenizer")
+def test_extract_passages() -> None:
+    extract = extract_passages(f"{FILLER} {ANSWER} {FILLER}", "What is the latest version of ibm-generative-ai?", token_budget=300)
+    assert extract.text.startswith(OMISSION_MARKER.lstrip("\n")) and extract.text.endswith(OMISSION_MARKER.rstrip("\n"))  # noqa: S101
+    assert ANSWER in extract.text  # noqa: S101
+    assert extract.n_tokens == count_tokens(extract.text) <= 300  # noqa: S101, PLR2004
+    assert extract.answers_query  # noqa: S101
+
+    # Without matching passages, the beginning of the page is summarized
+    extract = extract_passages(f"{FILLER} {FILLER}", "latest ibm-generative-ai version", token_budget=300)
+    assert extract.text.startswith("Paragraph 0 ") and extract.text.endswith(OMISSION_MARKER.rstrip("\n"))  # noqa: S101
+    assert not extract.answers_query  # noqa: S101
+
+    # Short pages are kept whole
+    extract = extract_passages(ANSWER, "How to install ibm-generative-ai?")
+    assert extract.text == ANSWER  # noqa: S101
+    assert not extract.answers_query  # noqa: S101
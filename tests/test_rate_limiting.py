@@ -0,0 +1,70 @@
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+from brainsoft_code_challenge.llm import RateLimitedOpenAIEmbeddings, get_admission_timeout
+from brainsoft_code_challenge.rate_limiting import AdmissionRejectedError, Priority, RateLimiter
+
+
+def test_rate_limiter() -> None:
+    rate_limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=6000)
+    start_time = time.monotonic()
+    for _ in range(3):
+        rate_limiter.acquire(2000)
+    assert time.monotonic() - start_time < 0.1  # noqa: S101, PLR2004
+
+    # The token budget is exhausted and refills at 100 tokens per second
+    rate_limiter.acquire(20)
+    assert time.monotonic() - start_time > 0.15  # noqa: S101, PLR2004
+
+
+def test_rate_limiter_priorities() -> None:
+    rate_limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=600, max_queue_size=2)
+    rate_limiter.acquire(600)  # The token budget is exhausted and refills at 10 tokens per second
+    admitted = []
+
+    def __acquire(priority: Priority) -> None:
+        rate_limiter.acquire(2, priority=priority)
+        admitted.append(priority)
+
+    threads = [threading.Thread(target=__acquire, args=(priority,)) for priority in (Priority.BACKGROUND, Priority.INTERACTIVE)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    with pytest.raises(AdmissionRejectedError):  # The queue is full
+        rate_limiter.acquire(1)
+    for thread in threads:
+        thread.join()
+    assert admitted == [Priority.INTERACTIVE, Priority.BACKGROUND]  # noqa: S101
+
+    # Requests that would miss their deadline are rejected immediately
+    start_time = time.monotonic()
+    with pytest.raises(AdmissionRejectedError):
+        asyncio.run(rate_limiter.aacquire(10, timeout=0.5))
+    assert time.monotonic() - start_time < 0.1  # noqa: S101, PLR2004
+    assert rate_limiter.n_waiting == 0  # noqa: S101
+    asyncio.run(rate_limiter.aacquire(10, timeout=1.5))
+
+
+@pytest.mark.usefixtures("stub_tokenizer")
+def test_background_embedder() -> None:
+    requests = []
+
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        data = [{"object": "embedding", "index": 0, "embedding": [0.6, 0.8]}]
+        return httpx.Response(200, json={"object": "list", "data": data, "model": "text-embedding-ada-002", "usage": {"prompt_tokens": 2, "total_tokens": 2}})
+
+    http_client = httpx.Client(transport=httpx.MockTransport(handle_request))
+    embedder = RateLimitedOpenAIEmbeddings(openai_api_key="sk-test", http_client=http_client)
+    background_embedder = embedder.with_priority(Priority.BACKGROUND, is_offline=True)
+    assert background_embedder.priority == Priority.BACKGROUND  # noqa: S101
+    assert get_admission_timeout(Priority.BACKGROUND) is not None  # noqa: S101  # Summarization runs on the request path
+    assert get_admission_timeout(background_embedder.priority, background_embedder.is_offline) is None  # noqa: S101
+    assert embedder.priority == Priority.INTERACTIVE  # noqa: S101
+    assert background_embedder.embed_documents(["some text"]) == [pytest.approx([0.6, 0.8])]  # noqa: S101
+    assert len(requests) == 1  # noqa: S101
@@ -0,0 +1,71 @@
+import os
+from pathlib import Path
+
+import pytest
+from langchain.chains.conversation.memory import ConversationSummaryBufferMemory
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from brainsoft_code_challenge.sessions import InvalidSessionIdError, SessionBusyError, SessionStore
+
+
+def __create_memory(_: str) -> ConversationSummaryBufferMemory:
+    return ConversationSummaryBufferMemory(llm=FakeListChatModel(responses=["summary"]), max_token_limit=1000, return_messages=True, memory_key="chat_history")
+
+
+def test_session_spilling(tmp_path: Path) -> None:
+    store = SessionStore(__create_memory, max_sessions=1, spill_dir=str(tmp_path))
+    session = store.get_or_create("first", "model")
+    session.memory.chat_memory.add_user_message("Hello")
+    session.memory.chat_memory.add_ai_message("Hi! How can I help you?")
+    session.memory.moving_summary_buffer = "The user greeted the assistant."
+
+    store.get_or_create("second", "model")  # The least recently used session is spilled
+    assert os.listdir(tmp_path) == ["first.json"]  # noqa: S101
+    restored_session = store.get_or_create("first", "model")
+    assert restored_session is not session  # noqa: S101
+    assert [message.content for message in restored_session.memory.chat_memory.messages] == ["Hello", "Hi! How can I help you?"]  # noqa: S101
+    assert restored_session.memory.moving_summary_buffer == "The user greeted the assistant."  # noqa: S101
+    assert restored_session.started_at == session.started_at  # noqa: S101
+    assert os.listdir(tmp_path) == ["second.json"]  # noqa: S101
+
+    assert store.delete("second") is True  # noqa: S101
+    assert store.delete("second") is False  # noqa: S101
+    assert os.listdir(tmp_path) == []  # noqa: S101
+
+
+def test_session_locking_and_expiration(tmp_path: Path) -> None:
+    store = SessionStore(__create_memory, ttl_seconds=0, spill_dir=str(tmp_path))
+    session = store.acquire("first", "model")
+    with pytest.raises(SessionBusyError):
+        store.acquire("first", "model")
+    store.get_or_create("second", "model")  # Expired sessions are spilled, unless they are in use
+    assert os.listdir(tmp_path) == []  # noqa: S101
+    session.lock.release()
+    store.get_or_create("third", "model")
+    assert sorted(os.listdir(tmp_path)) == ["first.json", "second.json"]  # noqa: S101
+
+
+def test_invalid_session_id(tmp_path: Path) -> None:
+    store = SessionStore(__create_memory, spill_dir=str(tmp_path))
+    for session_id in ("", "../parent_store", "a" * 65):
+        with pytest.raises(InvalidSessionIdError):
+            store.get_or_create(session_id, "model")
+
+
+def test_spilled_session_purging(tmp_path: Path) -> None:
+    store = SessionStore(__create_memory, spill_dir=str(tmp_path), spill_ttl_seconds=60, spill_purge_interval_seconds=3600)
+
+    def spill_expired_session(session_id: str) -> None:
+        path = tmp_path / f"{session_id}.json"
+        path.write_text("{}")
+        os.utime(path, (0, 0))
+
+    spill_expired_session("first")
+    store.get_or_create("current", "model")
+    assert os.listdir(tmp_path) == []  # noqa: S101
+    spill_expired_session("second")
+    store.get_or_create("current", "model")  # The spill directory is not scanned again within the purge interval
+    assert os.listdir(tmp_path) == ["second.json"]  # noqa: S101
+    store.spill_purge_interval_seconds = 0
+    store.get_or_create("current", "model")
+    assert os.listdir(tmp_path) == []  # noqa: S101
@@ -0,0 +1,12 @@
+import pytest
+
+from brainsoft_code_challenge.config import IMPORT_TIME_BUDGETS_SECONDS
+from brainsoft_code_challenge.constants import LAZILY_IMPORTED_MODULES
+from brainsoft_code_challenge.startup_profiling import get_import_time, get_imported_modules, profile_imports
+
+
+@pytest.mark.parametrize("module", list(IMPORT_TIME_BUDGETS_SECONDS))
+def test_import_time_budget(module: str) -> None:
+    timings = profile_imports(module)
+    assert get_imported_modules(timings, LAZILY_IMPORTED_MODULES) == []  # noqa: S101
+    assert get_import_time(timings, module) <= IMPORT_TIME_BUDGETS_SECONDS[module]  # noqa: S101
@@ -0,0 +1,27 @@
+import time
+
+from brainsoft_code_challenge.web_cache import CachedPage, TtlCache, normalize_search_query
+
+
+def test_ttl_cache() -> None:
+    cache: TtlCache[str] = TtlCache(ttl_seconds=60, max_entries=2)
+    cache.put(normalize_search_query("IBM  Generative AI"), "results")
+    assert cache.get(normalize_search_query(" ibm generative ai\n")) == "results"  # noqa: S101
+    cache.put("b", "b")
+    cache.put("c", "c")  # Evicts the least recently used entry
+    assert cache.get(normalize_search_query("IBM Generative AI")) is None  # noqa: S101
+    assert cache.get_stats()["hit_rate"] == 0.5  # noqa: S101, PLR2004
+
+    cache.ttl_seconds = 0.01
+    cache.put("page", "text")
+    time.sleep(0.02)
+    assert cache.get("page") is None  # noqa: S101
+    assert cache.get_expired("page") == "text"  # noqa: S101
+    cache.refresh("page", "text")
+    assert cache.get_stats()["revalidations"] == 1  # noqa: S101
+
+
+def test_conditional_headers() -> None:
+    assert CachedPage("text").get_conditional_headers() == {}  # noqa: S101
+    page = CachedPage("text", etag='"v1"', last_modified="Wed, 21 Oct 2015 07:28:00 GMT")
+    assert page.get_conditional_headers() == {"If-None-Match": '"v1"', "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT"}  # noqa: S101
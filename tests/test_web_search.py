@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+from collections.abc import Mapping
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from brainsoft_code_challenge.config import WEB_PAGE_TEXT_CACHE_MAX_ENTRIES, WEB_PAGE_TEXT_CACHE_TTL_SECONDS, WEB_SEARCH_SCRAPING_MAX_BYTES
+from brainsoft_code_challenge.tools import web_search
+from brainsoft_code_challenge.web_cache import CachedPage, TtlCache
+
+PAGE_DELAYS_SECONDS = {"https://fast.example.com": 0.0, "https://medium.example.com": 0.1, "https://slow.example.com": 10.0}
+
+
+@pytest.fixture()
+def page_text_cache(monkeypatch: pytest.MonkeyPatch) -> TtlCache[CachedPage]:
+    """
+    Replaces the page text cache of the process with an empty one, so that the tests don't see each other's pages.
+    """
+    cache: TtlCache[CachedPage] = TtlCache(WEB_PAGE_TEXT_CACHE_TTL_SECONDS, WEB_PAGE_TEXT_CACHE_MAX_ENTRIES)
+    monkeypatch.setattr(web_search, "page_text_cache", cache)
+    return cache
+
+
+class FakeSearch:
+    async def aresults(self, _: str) -> dict[str, Any]:
+        return {"organic": [{"link": url} for url in PAGE_DELAYS_SECONDS]}
+
+
+def test_web_search_deadline(monkeypatch: pytest.MonkeyPatch) -> None:
+    cancelled_urls = []
+
+    async def summarize_page(x: Mapping[str, Any]) -> str:
+        try:
+            await asyncio.sleep(PAGE_DELAYS_SECONDS[x["url"]])
+        except asyncio.CancelledError:
+            cancelled_urls.append(x["url"])
+            raise
+        return x["url"]
+
+    async def search() -> list[str]:
+        page_summary_chain = RunnableLambda(lambda x: x, afunc=summarize_page)
+        return [summary async for summary in web_search.astream_web_search("query", page_summary_chain=page_summary_chain, deadline_seconds=0.5)]
+
+    monkeypatch.setattr(web_search, "search", FakeSearch())
+    start_time = time.monotonic()
+    summaries = asyncio.run(search())
+    assert time.monotonic() - start_time < 1  # noqa: S101
+    assert summaries == ["https://fast.example.com", "https://medium.example.com"]  # noqa: S101  # In the order of completion
+    assert cancelled_urls == ["https://slow.example.com"]  # noqa: S101
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    requests: list[str | None] = []
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path == "/large":
+            self.__send_large_page()
+            return
+        if self.path == "/document.pdf":
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.end_headers()
+            self.wfile.write(b"%PDF-1.7")
+            return
+        PageHandler.requests.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = b"<html><body><p>Page text</p></body></html>"
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __send_large_page(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.end_headers()
+        paragraph = b"<p>A paragraph of a very long page, which is not downloaded whole.</p>" * 1000
+        try:
+            for _ in range(100):
+                self.wfile.write(paragraph)
+        except OSError:
+            pass  # The client stopped reading
+
+    def log_message(self, *_: Any) -> None:
+        pass
+
+
+def test_page_text_revalidation(monkeypatch: pytest.MonkeyPatch, page_text_cache: TtlCache[CachedPage]) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/page"
+    scrape_text = getattr(web_search, "__scrape_text")
+    ascrape_text = getattr(web_search, "__ascrape_text")
+    try:
+        assert scrape_text(url) == "Page text"  # noqa: S101
+        assert scrape_text(url) == "Page text"  # noqa: S101  # Served from the cache
+        assert PageHandler.requests == [None]  # noqa: S101
+
+        monkeypatch.setattr(page_text_cache, "ttl_seconds", 0)
+        page_text_cache.put(url, page_text_cache.get_expired(url))  # Expires the page
+        assert asyncio.run(ascrape_text(url)) == "Page text"  # noqa: S101
+        assert PageHandler.requests == [None, '"v1"']  # noqa: S101
+        assert page_text_cache.revalidations == 1  # noqa: S101
+    finally:
+        server.shutdown()
+
+
+@pytest.mark.usefixtures("page_text_cache")
+def test_bounded_scraping() -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    scrape_text = getattr(web_search, "__scrape_text")
+    ascrape_text = getattr(web_search, "__ascrape_text")
+    try:
+        for text in (scrape_text(f"{base_url}/large"), asyncio.run(ascrape_text(f"{base_url}/large"))):
+            assert text.startswith("A paragraph of a very long page")  # noqa: S101
+            assert len(text) < WEB_SEARCH_SCRAPING_MAX_BYTES  # noqa: S101  # The page is 7 MB
+        for text in (scrape_text(f"{base_url}/document.pdf"), asyncio.run(ascrape_text(f"{base_url}/document.pdf"))):
+            assert text == "Failed to retrieve the webpage: Unsupported content type application/pdf"  # noqa: S101
+    finally:
+        server.shutdown()
+
+
+@pytest.mark.usefixtures("stub_tokenizer")
+def test_page_extract_without_summary(page_text_cache: TtlCache[CachedPage]) -> None:
+    url = "https://pypi.org/project/ibm-generative-ai/"
+    page_text = "ibm-generative-ai 2.2.0. The latest version of the IBM Generative AI Python SDK was released in February."
+    page_text_cache.put(url, CachedPage(page_text))
+    result = web_search.page_summary_chain.invoke({"query": "latest version of ibm-generative-ai", "url": url})  # No LLM call is made
+    assert result == f"URL: {url}\nEXTRACT: {page_text}"  # noqa: S101
+
+
+@pytest.mark.usefixtures("stub_tokenizer")
+def test_passages_from_whole_page(page_text_cache: TtlCache[CachedPage]) -> None:
+    url = "https://example.com/long-page"
+    answer = "The latest version of the ibm-generative-ai package is 2.2.0."
+    page_text = " ".join(f"Paragraph {i} describes the gardening tips of the week." for i in range(1000)) + f" {answer}"
+    page_text_cache.put(url, CachedPage(page_text))
+    text = getattr(web_search, "__get_page_text")({"url": url})
+    assert text == page_text  # noqa: S101  # Not truncated before the passages are selected
+    extract = getattr(web_search, "__get_page_extract")({"text": text, "query": "latest version of ibm-generative-ai"})
+    assert answer in extract.text  # noqa: S101